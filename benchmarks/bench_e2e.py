@@ -0,0 +1,117 @@
+"""
+End-to-end turn latency and throughput of the chatbot pipeline against the mock server.
+
+Each turn runs the same steps as `cli.amain`: append the user message,
+truncate, call the provider through the async layer (streaming or not),
+estimate cost and append the reply. With the mock server answering instantly,
+the measured time is this project's own overhead plus loopback HTTP.
+"""
+
+import asyncio
+import contextlib
+import io
+import time
+
+from src.p1_chatbot.async_llm_client import (
+    acall_gemini,
+    acreate_chat_completion,
+    astream_chat_completion,
+    astream_gemini,
+)
+from src.p1_chatbot.cli import truncate_messages
+from src.p1_chatbot.clients import aclose_all
+from src.p1_chatbot.conversation import Conversation
+from src.p1_chatbot.cost import estimate_cost
+
+from .common import summarize_ms
+from .mock_server import MockState
+
+
+MODELS = {"openai": "gpt-4o-mini", "gemini": "gemini-2.5-flash-lite"}
+
+
+async def run_turn(provider: str, conversation: Conversation, user_input: str, stream: bool) -> tuple[float, float | None]:
+    """Run one pipeline turn; return (turn seconds, time-to-first-token seconds)."""
+    model = MODELS[provider]
+    start = time.perf_counter()
+    first_token_at = None
+
+    def on_token(_: str) -> None:
+        nonlocal first_token_at
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+
+    conversation.append("user", user_input)
+    truncate_messages(conversation)
+    messages = conversation.messages
+    if provider == "openai":
+        if stream:
+            result = await astream_chat_completion(messages, model=model, temperature=0.1, max_tokens=500, on_token=on_token)
+        else:
+            result = await acreate_chat_completion(messages, model=model, temperature=0.1, max_tokens=500)
+    else:
+        if stream:
+            result = await astream_gemini(None, model, messages, on_token, temperature=0.1)
+        else:
+            result = await acall_gemini(None, model, messages, temperature=0.1)
+    estimate_cost(model, result.prompt_tokens or 0, result.completion_tokens or 0, result.cached_tokens)
+    conversation.append("assistant" if provider == "openai" else "model", result.text)
+    elapsed = time.perf_counter() - start
+    return elapsed, (first_token_at - start) if first_token_at is not None else None
+
+
+def new_conversation(provider: str) -> Conversation:
+    conversation = Conversation(MODELS[provider])
+    conversation.append("system" if provider == "openai" else "user", "You are a helpful assistant.")
+    conversation.pinned = 1
+    return conversation
+
+
+async def bench_sequential(provider: str, stream: bool, turns: int) -> dict[str, float]:
+    conversation = new_conversation(provider)
+    await run_turn(provider, conversation, "warm up", stream)
+    latencies, ttfts = [], []
+    for i in range(turns):
+        elapsed, ttft = await run_turn(provider, conversation, f"question {i} about tokens and latency", stream)
+        latencies.append(elapsed)
+        if ttft is not None:
+            ttfts.append(ttft)
+    results = summarize_ms(latencies)
+    if ttfts:
+        results.update({f"ttft_{k}": v for k, v in summarize_ms(ttfts).items()})
+    return results
+
+
+async def bench_throughput(provider: str, stream: bool, conversations: int, turns: int) -> dict[str, float]:
+    async def chat() -> list[float]:
+        conversation = new_conversation(provider)
+        return [(await run_turn(provider, conversation, f"question {i}", stream))[0] for i in range(turns)]
+
+    start = time.perf_counter()
+    per_chat = await asyncio.gather(*[chat() for _ in range(conversations)])
+    elapsed = time.perf_counter() - start
+    latencies = [latency for chat_latencies in per_chat for latency in chat_latencies]
+    results = summarize_ms(latencies)
+    results["turns_per_sec"] = round(len(latencies) / elapsed, 2)
+    return results
+
+
+async def _run(state: MockState, turns: int, conversations: int) -> dict[str, dict[str, float]]:
+    results = {}
+    for provider in ("openai", "gemini"):
+        for stream in (False, True):
+            mode = "stream" if stream else "json"
+            results[f"turn_latency[{provider},{mode}]"] = await bench_sequential(provider, stream, turns)
+            results[f"throughput[{provider},{mode},{conversations}_chats]"] = await bench_throughput(
+                provider, stream, conversations, max(1, turns // 10)
+            )
+    state.config.rate_limit_every = 10
+    results["turn_latency[openai,json,429_every_10]"] = await bench_sequential("openai", False, turns)
+    state.config.rate_limit_every = 0
+    await aclose_all()
+    return results
+
+
+def run(state: MockState, turns: int = 200, conversations: int = 50) -> dict[str, dict[str, float]]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(_run(state, turns, conversations))
@@ -0,0 +1,154 @@
+"""
+Chatbot pipeline throughput replayed from a cassette, without network or mock server.
+
+Records one conversation per provider and mode against the mock server into a
+cassette (see `src.p1_chatbot.cassette`), then replays it through the same
+pipeline turns as `bench_e2e` from many concurrent conversations. Every replayed
+conversation sends the recorded requests, so each one is an exact match and
+the run is deterministic. With no replay delays the measured time is the
+project's own per-turn cost through the SDKs and httpx, minus the sockets.
+
+Run on its own, it can also replay a cassette recorded from real traffic
+(`P1_CASSETTE_MODE=record`) at its original speed or faster; requests that
+were not recorded are answered by the next exchange for the same endpoint.
+
+Usage:
+    python -m benchmarks.bench_replay --conversations 50 --turns 10
+    python -m benchmarks.bench_replay --cassette prod.jsonl.gz --speed 1 --conversations 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+MODES = [(provider, stream) for provider in ("openai", "gemini") for stream in (False, True)]
+
+
+async def record(path: str, turns: int) -> None:
+    """Record `turns` turns of one conversation per provider and mode into `path`."""
+    from src.p1_chatbot.cassette import Cassette, install
+    from src.p1_chatbot.clients import aclose_all
+
+    from .bench_e2e import new_conversation, run_turn
+
+    install(Cassette(path, "record"))
+    try:
+        for provider, stream in MODES:
+            conversation = new_conversation(provider)
+            for i in range(turns):
+                await run_turn(provider, conversation, f"question {i}", stream)
+    finally:
+        await aclose_all()
+        install(None)
+
+
+async def replay(path: str, provider: str, stream: bool, conversations: int, turns: int, speed: float) -> dict[str, float]:
+    """Replay `conversations` concurrent copies of the recorded conversation; latency summary plus turns/sec."""
+    from src.p1_chatbot.cassette import Cassette, install
+    from src.p1_chatbot.clients import aclose_all
+
+    from .bench_e2e import new_conversation, run_turn
+    from .common import summarize_ms
+
+    cassette = Cassette(path, "replay", speed=speed)
+    install(cassette)
+
+    async def chat() -> list[float]:
+        conversation = new_conversation(provider)
+        return [(await run_turn(provider, conversation, f"question {i}", stream))[0] for i in range(turns)]
+
+    try:
+        await chat()  # warm up: clients, tokenizer, caches
+        start = time.perf_counter()
+        per_chat = await asyncio.gather(*[chat() for _ in range(conversations)])
+        elapsed = time.perf_counter() - start
+    finally:
+        await aclose_all()
+        install(None)
+    latencies = [latency for chat_latencies in per_chat for latency in chat_latencies]
+    results = summarize_ms(latencies)
+    results["turns_per_sec"] = round(len(latencies) / elapsed, 2)
+    results["misses"] = cassette.misses
+    return results
+
+
+async def _run(turns: int, conversations: int) -> dict[str, dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.jsonl")
+        await record(path, turns)
+        for provider, stream in MODES:
+            mode = "stream" if stream else "json"
+            results[f"replay_throughput[{provider},{mode},{conversations}_chats]"] = await replay(
+                path, provider, stream, conversations, turns, speed=0
+            )
+    return results
+
+
+def measure(turns: int = 10, conversations: int = 50) -> dict[str, dict[str, float]]:
+    """Record against the already running mock server, then replay; results keyed like `bench_e2e`."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(_run(turns, conversations))
+
+
+def run(turns: int = 10, conversations: int = 50) -> dict[str, dict[str, float]]:
+    """`measure` in a child process with its own mock server and client-side rate limiting off."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "replay.json")
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_replay", "--turns", str(turns), "--conversations", str(conversations), "--output", path],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a cassette through the chatbot pipeline with many concurrent conversations.")
+    parser.add_argument("--cassette", help="Cassette to replay (default: record one against the mock server)")
+    parser.add_argument("--provider", choices=["openai", "gemini"], help="Provider the cassette was recorded from (with --cassette)")
+    parser.add_argument("--stream", action="store_true", help="Streamed requests (with --cassette)")
+    parser.add_argument("--speed", type=float, default=0.0, help="Replay timing factor: 1 as recorded, 0 no delays (with --cassette)")
+    parser.add_argument("--conversations", type=int, default=50, help="Concurrent conversations")
+    parser.add_argument("--turns", type=int, default=10, help="Turns per conversation")
+    parser.add_argument("--output", help="Also write the results as a benchmark result file")
+    args = parser.parse_args()
+
+    # Replayed quota headers would otherwise pace a load test like live traffic.
+    os.environ.setdefault("P1_RATE_LIMIT", "false")
+    os.environ.setdefault("P1_MAX_IN_FLIGHT", str(max(16, args.conversations)))
+    os.environ.setdefault("OPENAI_API_KEY", "replay-key")
+    os.environ.setdefault("GEMINI_API_KEY", "replay-key")
+    if args.cassette:
+        if args.provider is None:
+            parser.error("--provider is required with --cassette")
+        mode = "stream" if args.stream else "json"
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = asyncio.run(replay(args.cassette, args.provider, args.stream, args.conversations, args.turns, args.speed))
+        results = {f"replay_throughput[{args.provider},{mode},{args.conversations}_chats,speed_{args.speed:g}]": summary}
+    else:
+        from .mock_server import MockConfig, start_mock_server
+        server, _ = start_mock_server(MockConfig())
+        base = f"http://127.0.0.1:{server.server_port}"
+        os.environ["OPENAI_BASE_URL"] = f"{base}/v1"
+        os.environ["GEMINI_BASE_URL"] = f"{base}/"
+        results = measure(args.turns, args.conversations)
+        server.shutdown()
+    print(json.dumps(results, indent=2))
+    if args.output:
+        from .common import write_results
+        write_results(args.output, results)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Microbenchmarks for token counting, truncation and request serialization over
+long synthetic histories, and the memory a history message takes.
+"""
+
+import contextlib
+import io
+import random
+import tracemalloc
+
+from src.p1_chatbot.cli import truncate_messages
+from src.p1_chatbot.conversation import Conversation
+from src.p1_chatbot.llm_client import to_openai_message
+from src.p1_chatbot.memory import MemoryIndex
+from src.p1_chatbot.messages import Message, wire_messages
+from src.p1_chatbot.tokens import count_tokens, count_tokens_bulk
+
+from .common import summarize_ms, time_calls
+
+
+WORDS = (
+    "the model token context window prompt cache latency budget user assistant "
+    "summary history request response stream provider retry cost estimate"
+).split()
+
+
+def synthetic_history(turns: int, words_per_message: int = 60, seed: int = 0) -> list[dict[str, str]]:
+    """A system prompt followed by `turns` user/assistant pairs of random words."""
+    rng = random.Random(seed)
+
+    def text() -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(words_per_message))
+
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for _ in range(turns):
+        messages.append({"role": "user", "content": text()})
+        messages.append({"role": "assistant", "content": text()})
+    return messages
+
+
+def bench_count_tokens(model: str, turns: int, repeat: int) -> dict[str, float]:
+    messages = synthetic_history(turns)
+    return summarize_ms(time_calls(lambda: count_tokens(messages, model), repeat))
+
+
+def bench_count_tokens_bulk(model: str, conversations: int, repeat: int) -> dict[str, float]:
+    """Bulk API over many short conversations, against the per-conversation loop above."""
+    corpus = [synthetic_history(3, seed=seed) for seed in range(conversations)]
+    return summarize_ms(time_calls(lambda: count_tokens_bulk(corpus, model), repeat))
+
+
+def bench_conversation_append(model: str, turns: int, repeat: int) -> dict[str, float]:
+    messages = synthetic_history(turns)
+
+    def build() -> None:
+        conversation = Conversation(model)
+        for message in messages:
+            conversation.append(message["role"], message["content"])
+
+    return summarize_ms(time_calls(build, repeat))
+
+
+def bench_truncate(model: str, turns: int, repeat: int) -> dict[str, float]:
+    """Steady-state turns: append a user message, truncate, append the reply."""
+    messages = synthetic_history(turns)
+    conversation = Conversation(model)
+    conversation.append(messages[0]["role"], messages[0]["content"])
+    conversation.pinned = 1
+    replies = iter(messages[1:] * (repeat // turns + 2))
+
+    def turn() -> None:
+        user = next(replies)
+        conversation.append("user", user["content"])
+        truncate_messages(conversation)
+        conversation.append("assistant", next(replies)["content"])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return summarize_ms(time_calls(turn, repeat))
+
+
+def bench_message_memory(turns: int) -> dict[str, float]:
+    """Bytes per message of a history held as dicts vs `Message`s (content strings excluded)."""
+    messages = synthetic_history(turns)
+
+    def allocated(build) -> float:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        history = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del history
+        return size / len(messages)
+
+    return {
+        "dict_bytes_per_message": allocated(lambda: [{"role": m["role"], "content": m["content"]} for m in messages]),
+        "message_bytes_per_message": allocated(lambda: [Message(m["role"], m["content"]) for m in messages]),
+    }
+
+
+def bench_serialize(provider: str, turns: int, repeat: int, as_messages: bool) -> dict[str, float]:
+    """Building one request payload from the history, as the provider calls do before each request."""
+    history = synthetic_history(turns)
+    if as_messages:
+        history = [Message(m["role"], m["content"]) for m in history]
+    if provider == "openai":
+        return summarize_ms(time_calls(lambda: [to_openai_message(m) for m in history], repeat))
+    return summarize_ms(time_calls(lambda: wire_messages("gemini", history), repeat))
+
+
+def bench_memory_search(model: str, turns: int, repeat: int) -> dict[str, float]:
+    """Top-k recall search over `turns` stored turns."""
+    history = synthetic_history(turns)
+    memory = MemoryIndex(model)
+    for i in range(1, len(history), 2):
+        memory.add(Message("user", history[i]["content"]), Message("assistant", history[i + 1]["content"]))
+    query = synthetic_history(1, words_per_message=15, seed=1)[1]["content"]
+    return summarize_ms(time_calls(lambda: memory.search(query, 4), repeat))
+
+
+def run(model: str = "gpt-4o-mini", repeat: int = 50) -> dict[str, dict[str, float]]:
+    results = {}
+    for turns in (100, 1000):
+        results[f"count_tokens[{turns}_turns]"] = bench_count_tokens(model, turns, repeat)
+        results[f"conversation_append[{turns}_turns]"] = bench_conversation_append(model, turns, max(5, repeat // 10))
+    results["count_tokens_bulk[1000_conversations]"] = bench_count_tokens_bulk(model, 1000, max(5, repeat // 10))
+    results["truncate_turn[steady_state]"] = bench_truncate(model, 500, repeat * 20)
+    results["memory_search[10000_turns]"] = bench_memory_search(model, 10000, repeat * 4)
+    results["message_memory[1000_turns]"] = bench_message_memory(1000)
+    for provider in ("openai", "gemini"):
+        for as_messages in (False, True):
+            kind = "messages" if as_messages else "dicts"
+            results[f"serialize_{provider}[1000_turns,{kind}]"] = bench_serialize(provider, 1000, repeat, as_messages)
+    return results
@@ -0,0 +1,54 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+Metrics ending in `_per_sec` are higher-is-better; every other metric is a
+latency where lower is better. Exits with status 1 if any metric regressed by
+more than the threshold, so it can gate CI.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(old: dict, new: dict, threshold_pct: float) -> list[str]:
+    """Print a side-by-side table and return the regressed metric names."""
+    regressions = []
+    print(f"{'benchmark / metric':60} {old['commit']:>12} {new['commit']:>12} {'change':>9}")
+    for name in sorted(set(old["results"]) & set(new["results"])):
+        for metric in sorted(set(old["results"][name]) & set(new["results"][name])):
+            before, after = old["results"][name][metric], new["results"][name][metric]
+            if not before:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if metric.endswith("_per_sec") else change
+            flag = " !" if worse > threshold_pct else ""
+            if flag:
+                regressions.append(f"{name}.{metric}")
+            print(f"{name + ' / ' + metric:60} {before:12.4f} {after:12.4f} {change:+8.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    regressions = compare(load(args.baseline), load(args.candidate), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold}%: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Local stand-in for the OpenAI chat-completions and Gemini interactions APIs.
+
+Speaks just enough of both wire formats for the p1_chatbot clients: JSON and
+SSE-streamed responses with usage, plus configurable latency and 429
+injection. Point OPENAI_BASE_URL / GEMINI_BASE_URL at it to run the chatbot,
+the benchmarks or the batch tools fully offline.
+
+Usage:
+    python -m benchmarks.mock_server --port 8765 --latency-ms 200 --token-latency-ms 10
+"""
+
+import argparse
+import json
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@dataclass
+class MockConfig:
+    """Behaviour of the mock server (all delays in milliseconds)."""
+    latency_ms: float = 0.0
+    token_latency_ms: float = 0.0
+    completion_tokens: int = 20
+    rate_limit_every: int = 0
+    retry_after_s: float = 0.05
+    cached_tokens: int = 0
+
+
+class MockState:
+    """Request counters shared by the handler threads."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.requests = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def next_request(self) -> bool:
+        """Count a request; return True if it should be answered with a 429."""
+        with self._lock:
+            self.requests += 1
+            every = self.config.rate_limit_every
+            if every and self.requests % every == 0:
+                self.rate_limited += 1
+                return True
+            return False
+
+
+def _prompt_tokens(body: dict) -> int:
+    """Rough whitespace token count of the request, enough for usage numbers."""
+    if "messages" in body:
+        texts = [m.get("content") or "" for m in body["messages"]]
+    else:
+        raw = body.get("input", "")
+        texts = [t.get("content", "") for t in raw] if isinstance(raw, list) else [str(raw)]
+    return sum(len(str(t).split()) + 3 for t in texts) + 3
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        config = self.state.config
+        if self.state.next_request():
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"Retry-After": str(config.retry_after_s), "x-ratelimit-remaining-requests": "0"},
+            )
+            return
+        if config.latency_ms:
+            time.sleep(config.latency_ms / 1000)
+        prompt_tokens = _prompt_tokens(body)
+        words = ["tok"] * config.completion_tokens
+        if self.path.endswith("/chat/completions"):
+            self._openai(body, prompt_tokens, words)
+        elif self.path.endswith("/interactions"):
+            self._gemini(body, prompt_tokens, words)
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def _openai(self, body: dict, prompt_tokens: int, words: list[str]) -> None:
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+            "prompt_tokens_details": {"cached_tokens": min(self.state.config.cached_tokens, prompt_tokens)},
+        }
+        base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": body.get("model", "mock")}
+        if not body.get("stream"):
+            self._send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": " ".join(words)}}],
+                "usage": usage,
+            })
+            return
+        self._start_stream()
+        for i, word in enumerate(words):
+            text = word if i == 0 else " " + word
+            self._send_event({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": text}}]})
+        self._send_event({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._end_stream()
+
+    def _gemini(self, body: dict, prompt_tokens: int, words: list[str]) -> None:
+        usage = {
+            "total_input_tokens": prompt_tokens,
+            "total_output_tokens": len(words),
+            "total_cached_tokens": min(self.state.config.cached_tokens, prompt_tokens),
+        }
+        interaction = {"id": "interaction-mock", "status": "completed", "usage": usage}
+        if not body.get("stream"):
+            self._send_json(200, {**interaction, "outputs": [{"type": "text", "text": " ".join(words)}]})
+            return
+        self._start_stream()
+        self._send_event({"event_type": "interaction.start", "interaction": {"id": "interaction-mock", "status": "in_progress"}})
+        for i, word in enumerate(words):
+            text = word if i == 0 else " " + word
+            self._send_event({"event_type": "content.delta", "index": 0, "delta": {"type": "text", "text": text}})
+        self._send_event({"event_type": "interaction.complete", "interaction": interaction})
+        self._end_stream()
+
+    def _send_json(self, status: int, payload: dict, headers: dict[str, str] | None = None) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _send_event(self, payload: dict) -> None:
+        if self.state.config.token_latency_ms:
+            time.sleep(self.state.config.token_latency_ms / 1000)
+        self._send_chunk(f"data: {json.dumps(payload)}\n\n".encode())
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def start_mock_server(config: MockConfig | None = None, host: str = "127.0.0.1", port: int = 0) -> tuple[ThreadingHTTPServer, MockState]:
+    """
+    Start the mock server on a daemon thread.
+
+    Args:
+        config: Latency / streaming / rate-limit behaviour
+        host: Interface to bind
+        port: Port to bind (0 picks a free one)
+
+    Returns:
+        (server, state); the base URL is http://host:server.server_port
+    """
+    state = MockState(config or MockConfig())
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the OpenAI and Gemini APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay before the first byte")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="Delay between streamed tokens")
+    parser.add_argument("--completion-tokens", type=int, default=20)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with a 429")
+    parser.add_argument("--cached-tokens", type=int, default=0, help="Prompt tokens reported as cached")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        token_latency_ms=args.token_latency_ms,
+        completion_tokens=args.completion_tokens,
+        rate_limit_every=args.rate_limit_every,
+        cached_tokens=args.cached_tokens,
+    )
+    server, _ = start_mock_server(config, args.host, args.port)
+    base = f"http://{args.host}:{server.server_port}"
+    print(f"Mock server listening on {base}")
+    print(f"  OPENAI_BASE_URL={base}/v1")
+    print(f"  GEMINI_BASE_URL={base}/")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Run the benchmark suite offline and write machine-readable results.
+
+Starts the local mock server, points the provider clients at it through
+OPENAI_BASE_URL / GEMINI_BASE_URL, then runs the token microbenchmarks, the
+end-to-end pipeline benchmarks and the cassette replay throughput benchmark. Compare two result files with
+`python -m benchmarks.compare old.json new.json`.
+
+Usage:
+    python -m benchmarks.run --output bench_results.json
+"""
+
+import argparse
+import json
+import os
+
+from .mock_server import MockConfig, start_mock_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the p1_chatbot benchmark suite offline.")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--suite", choices=["all", "tokens", "e2e", "replay"], default="all")
+    parser.add_argument("--turns", type=int, default=200, help="Turns per sequential e2e benchmark")
+    parser.add_argument("--conversations", type=int, default=50, help="Concurrent chats in the throughput benchmark")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mock provider latency (0 isolates our overhead)")
+    args = parser.parse_args()
+
+    server, state = start_mock_server(MockConfig(latency_ms=args.latency_ms))
+    base = f"http://127.0.0.1:{server.server_port}"
+    # Must be set before src.p1_chatbot.config is imported.
+    os.environ["OPENAI_BASE_URL"] = f"{base}/v1"
+    os.environ["GEMINI_BASE_URL"] = f"{base}/"
+    os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+    os.environ.setdefault("GEMINI_API_KEY", "mock-key")
+
+    results: dict[str, dict[str, float]] = {}
+    if args.suite in ("all", "tokens"):
+        from . import bench_tokens
+        results.update(bench_tokens.run())
+    if args.suite in ("all", "e2e"):
+        from . import bench_e2e
+        results.update(bench_e2e.run(state, args.turns, args.conversations))
+    if args.suite in ("all", "replay"):
+        from . import bench_replay
+        results.update(bench_replay.run(max(1, args.turns // 20), args.conversations))
+    server.shutdown()
+
+    from .common import write_results
+    write_results(args.output, results)
+    print(json.dumps(results, indent=2))
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
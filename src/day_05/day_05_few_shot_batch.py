@@ -0,0 +1,243 @@
+"""
+Batch few-shot review classifier for Day 5.
+Labels every review in a JSONL or CSV file as Positive or Negative and appends
+the results to a JSONL output file as they complete.
+
+Runs many requests concurrently through the p1_chatbot async provider layer.
+Reviews already present in the output file are skipped, so an interrupted run
+resumes where it stopped. With --pack N, N reviews share one prompt (and one
+copy of the few-shot prefix); any review whose label cannot be parsed back out
+is retried on its own, concurrently with the group's other retries.
+--concurrency bounds the provider requests in flight, retries included.
+
+Usage:
+    python -m src.day_05.day_05_few_shot_batch reviews.jsonl --output labels.jsonl --concurrency 32 --pack 20
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import time
+from typing import Iterator
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.day_05.day_05_few_shot import FEW_SHOT_EXAMPLES, GEMINI_FEW_SHOT_PREFIX, gemini_prompt, openai_messages
+from src.p1_chatbot.async_llm_client import acall_gemini, acreate_chat_completion
+from src.p1_chatbot.cache import ResponseCache
+from src.p1_chatbot.cost import estimate_cost
+
+PROVIDER = os.getenv("FEW_SHOT_PROVIDER", "openai")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+
+PACKED_INSTRUCTIONS = (
+    "Label each numbered review below as Positive or Negative. "
+    "Answer with exactly one line per review in the form '<number>: <label>' and nothing else.\n\n"
+)
+PACKED_LABEL_PATTERN = re.compile(r"^\s*(\d+)\s*[:.)\-]\s*(positive|negative)\b", re.IGNORECASE | re.MULTILINE)
+# Output tokens allowed per review in a packed prompt ("12: Negative" plus newline)
+PACKED_TOKENS_PER_REVIEW = 6
+
+
+def read_reviews(path: str, id_field: str, text_field: str) -> Iterator[tuple[str, str]]:
+    """Yield (id, text) pairs from a JSONL or CSV file without loading it all."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                yield str(row[id_field]), row[text_field]
+        else:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield str(row[id_field]), row[text_field]
+
+
+def completed_ids(path: str) -> set[str]:
+    """Return the ids already written to the output file (the resume checkpoint)."""
+    done: set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError):
+                continue  # a line cut short by an interrupted run
+    return done
+
+
+def normalize_label(text: str) -> str | None:
+    text = text.strip().lower()
+    if text.startswith("pos"):
+        return "Positive"
+    if text.startswith("neg"):
+        return "Negative"
+    return None
+
+
+def packed_prompt(reviews: list[tuple[str, str]]) -> str:
+    numbered = "\n".join(f"{i}. {text}" for i, (_, text) in enumerate(reviews, start=1))
+    return PACKED_INSTRUCTIONS + numbered
+
+
+class BatchStats:
+    """Running totals used for the throughput and cost report."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.reviews = 0
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.started = time.perf_counter()
+
+    def add_usage(self, prompt_tokens: int | None, completion_tokens: int | None) -> None:
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.reviews / elapsed if elapsed > 0 else 0.0
+        try:
+            cost = estimate_cost(self.model, self.prompt_tokens, self.completion_tokens)
+            per_1k = f"{cost / self.reviews * 1000:.6f}" if self.reviews else "n/a"
+        except ValueError:
+            cost, per_1k = 0.0, "n/a"
+        return (
+            f"[batch] reviews={self.reviews} requests={self.requests} elapsed_s={elapsed:.1f} "
+            f"reviews_per_sec={rate:.1f} prompt_tokens={self.prompt_tokens} "
+            f"completion_tokens={self.completion_tokens} usd={cost:.6f} usd_per_1k_reviews={per_1k}"
+        )
+
+
+class BatchClassifier:
+    """Classifies reviews with at most `concurrency` requests in flight and appends results to a JSONL file."""
+
+    def __init__(self, provider: str, output_path: str, concurrency: int, pack: int, cache: ResponseCache | None = None):
+        self.provider = provider
+        self.cache = cache
+        self.model = OPENAI_MODEL if provider == "openai" else GEMINI_MODEL
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.pack = pack
+        self.stats = BatchStats(self.model)
+        self._in_flight = asyncio.Semaphore(concurrency)
+
+    async def _complete(self, messages: list[dict[str, str]], max_tokens: int) -> str:
+        if self.cache is not None:
+            cached = self.cache.lookup(self.provider, self.model, messages, temperature=0.1, max_tokens=max_tokens)
+            if cached is not None:
+                return cached[0]
+        async with self._in_flight:
+            if self.provider == "openai":
+                result = await acreate_chat_completion(
+                    messages, model=self.model, temperature=0.1, max_tokens=max_tokens
+                )
+            else:
+                result = await acall_gemini(
+                    None, self.model, messages, max_tokens=max_tokens, temperature=0.1
+                )
+        if not result.coalesced:
+            self.stats.add_usage(result.prompt_tokens, result.completion_tokens)
+        if self.cache is not None:
+            self.cache.store(self.provider, self.model, messages, result, temperature=0.1, max_tokens=max_tokens)
+        return result.text
+
+    async def classify_one(self, text: str) -> str | None:
+        if self.provider == "openai":
+            answer = await self._complete(openai_messages(text), max_tokens=1)
+        else:
+            answer = await self._complete([{"role": "user", "content": gemini_prompt(text)}], max_tokens=5)
+        return normalize_label(answer)
+
+    async def classify_packed(self, reviews: list[tuple[str, str]]) -> dict[str, str | None]:
+        prompt = packed_prompt(reviews)
+        if self.provider == "openai":
+            messages = FEW_SHOT_EXAMPLES + [{"role": "user", "content": prompt}]
+        else:
+            messages = [{"role": "user", "content": GEMINI_FEW_SHOT_PREFIX + prompt}]
+        answer = await self._complete(messages, max_tokens=PACKED_TOKENS_PER_REVIEW * len(reviews))
+        labels: dict[str, str | None] = {}
+        for match in PACKED_LABEL_PATTERN.finditer(answer):
+            index = int(match.group(1)) - 1
+            if 0 <= index < len(reviews):
+                labels[reviews[index][0]] = normalize_label(match.group(2))
+        retry = [(review_id, text) for review_id, text in reviews if labels.get(review_id) is None]
+        if retry:
+            retried = await asyncio.gather(*(self.classify_one(text) for _, text in retry))
+            labels.update(zip((review_id for review_id, _ in retry), retried))
+        return labels
+
+    async def _worker(self, queue: asyncio.Queue, out) -> None:
+        while True:
+            group = await queue.get()
+            try:
+                if group is None:
+                    return
+                if len(group) == 1:
+                    labels = {group[0][0]: await self.classify_one(group[0][1])}
+                else:
+                    labels = await self.classify_packed(group)
+                for review_id, label in labels.items():
+                    if label is None:
+                        continue  # left out of the checkpoint so a rerun retries it
+                    out.write(json.dumps({"id": review_id, "label": label}) + "\n")
+                    self.stats.reviews += 1
+                out.flush()
+            except Exception as e:
+                print(f"[ERROR] {len(group)} review(s) failed and will be retried on the next run: {e}")
+            finally:
+                queue.task_done()
+
+    async def run(self, reviews: Iterator[tuple[str, str]]) -> BatchStats:
+        done = completed_ids(self.output_path)
+        if done:
+            print(f"[batch] resuming, {len(done)} reviews already labeled")
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        with open(self.output_path, "a", encoding="utf-8") as out:
+            workers = [asyncio.create_task(self._worker(queue, out)) for _ in range(self.concurrency)]
+            group: list[tuple[str, str]] = []
+            for review_id, text in reviews:
+                if review_id in done:
+                    continue
+                group.append((review_id, text))
+                if len(group) >= self.pack:
+                    await queue.put(group)
+                    group = []
+            if group:
+                await queue.put(group)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Label a file of reviews as Positive or Negative.")
+    parser.add_argument("input", help="Reviews as .jsonl or .csv")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to (also the resume checkpoint)")
+    parser.add_argument("--provider", default=PROVIDER, choices=["openai", "gemini"])
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once (also capped by P1_MAX_IN_FLIGHT)")
+    parser.add_argument("--pack", type=int, default=1, help="Reviews per prompt (1 disables packing)")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--no-cache", action="store_true", help="Skip the response cache")
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else ResponseCache()
+    classifier = BatchClassifier(args.provider, args.output, args.concurrency, max(1, args.pack), cache)
+    reviews = read_reviews(args.input, args.id_field, args.text_field)
+    stats = asyncio.run(classifier.run(reviews))
+    print(stats.report())
+    if cache is not None:
+        print(cache.report())
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Prompt-strategy evaluation for Day 5.
+Runs every question of a question set through every prompt strategy of
+`day_05_reasoning_compare` on every provider/model, scores the answers against
+the expected ones, and prints accuracy, latency percentiles, tokens and USD per
+(model, strategy) cell.
+
+The grid runs concurrently through the p1_chatbot async provider layer. One
+JSON line per answered (question, strategy, model) is appended to the output
+file as it completes, so an interrupted run resumes where it stopped and the
+matrix is always computed from everything on disk. Failed requests are left
+out of the file and retried on the next run.
+
+Question set: JSONL with 'id', 'question' and 'answer' per line. Numeric
+answers are compared as numbers (the last number of the reply, or of its
+'Answer:' line); other answers must appear in the reply, ignoring case and
+punctuation.
+
+Usage:
+    python -m src.day_05.day_05_reasoning_eval questions.jsonl --output eval.jsonl --concurrency 16 --target-accuracy 0.9
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from typing import Iterator
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.day_05.day_05_reasoning_compare import QUESTION, STRATEGIES, strategy_prompt
+from src.p1_chatbot.async_llm_client import acall_gemini, acreate_chat_completion
+from src.p1_chatbot.cost import estimate_cost
+from src.p1_chatbot.llm_client import available_providers
+
+TEMPERATURE = 0.1
+NUMBER_PATTERN = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+ANSWER_LINE_PATTERN = re.compile(r"^\s*\**\s*(?:final\s+)?answer\s*\**\s*[:=]\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+Cell = tuple[str, str, str]  # (question id, strategy, "provider:model")
+
+
+def read_questions(path: str) -> Iterator[dict]:
+    """Yield question dicts ('id', 'question', 'answer') from a JSONL file."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                yield {"id": str(row["id"]), "question": row["question"], "answer": str(row["answer"])}
+
+
+def read_results(path: str) -> list[dict]:
+    """Return the result rows already written to the output file."""
+    rows: list[dict] = []
+    if not os.path.exists(path):
+        return rows
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+    return rows
+
+
+def _number(text: str) -> float | None:
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def final_answer(reply: str) -> str:
+    """The reply's last 'Answer:' line if it has one, else the whole reply."""
+    lines = ANSWER_LINE_PATTERN.findall(reply)
+    return lines[-1] if lines else reply
+
+
+def score(reply: str, expected: str) -> bool:
+    """Whether the reply gives the expected answer."""
+    answer = final_answer(reply)
+    expected_number = _number(expected.strip().lstrip("$"))
+    if expected_number is not None:
+        numbers = NUMBER_PATTERN.findall(answer)
+        if not numbers:
+            return False
+        got = _number(numbers[-1])
+        return got is not None and math.isclose(got, expected_number, rel_tol=1e-6, abs_tol=1e-9)
+    return _normalize(expected) in _normalize(answer)
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def summarize(rows: list[dict]) -> list[dict]:
+    """One summary per (model, strategy): accuracy, latency p50/p95, mean tokens, USD."""
+    cells: dict[tuple[str, str], list[dict]] = {}
+    for row in rows:
+        cells.setdefault((row["model"], row["strategy"]), []).append(row)
+    summaries = []
+    for (model, strategy), group in sorted(cells.items()):
+        latencies = [row["latency_ms"] for row in group]
+        correct = sum(row["correct"] for row in group)
+        usd = sum(row["usd"] for row in group)
+        summaries.append({
+            "model": model,
+            "strategy": strategy,
+            "questions": len(group),
+            "accuracy": correct / len(group),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "prompt_tokens": sum(row["prompt_tokens"] for row in group) / len(group),
+            "completion_tokens": sum(row["completion_tokens"] for row in group) / len(group),
+            "usd": usd,
+            "usd_per_correct": usd / correct if correct else None,
+        })
+    return summaries
+
+
+def render_matrix(summaries: list[dict]) -> str:
+    lines = [
+        f"{'model':32} {'strategy':16} {'n':>5} {'acc':>6} {'p50_ms':>8} {'p95_ms':>8} "
+        f"{'in_tok':>7} {'out_tok':>7} {'usd':>10} {'usd/correct':>11}"
+    ]
+    for s in summaries:
+        per_correct = f"{s['usd_per_correct']:.6f}" if s["usd_per_correct"] is not None else "n/a"
+        lines.append(
+            f"{s['model']:32} {s['strategy']:16} {s['questions']:5} {s['accuracy']:6.1%} {s['p50_ms']:8.0f} "
+            f"{s['p95_ms']:8.0f} {s['prompt_tokens']:7.0f} {s['completion_tokens']:7.0f} {s['usd']:10.6f} {per_correct:>11}"
+        )
+    return "\n".join(lines)
+
+
+def pick(summaries: list[dict], target: float) -> tuple[dict | None, dict | None]:
+    """Cheapest and fastest (p95) cells whose accuracy meets `target`."""
+    passing = [s for s in summaries if s["accuracy"] >= target]
+    if not passing:
+        return None, None
+    cheapest = min(passing, key=lambda s: (s["usd"] / s["questions"], s["p95_ms"]))
+    fastest = min(passing, key=lambda s: (s["p95_ms"], s["usd"] / s["questions"]))
+    return cheapest, fastest
+
+
+class StrategyEval:
+    """Runs the questions x strategies x models grid with bounded concurrency and appends results to a JSONL file."""
+
+    def __init__(self, models: list[tuple[str, str]], strategies: list[str], output_path: str, concurrency: int):
+        self.models = models
+        self.strategies = strategies
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.answered = 0
+        self.failed = 0
+
+    async def _ask(self, question: dict, strategy: str, provider: str, model: str) -> dict | None:
+        messages = [{"role": "user", "content": strategy_prompt(strategy, question["question"])}]
+        max_tokens = STRATEGIES[strategy][1]
+        start = time.perf_counter()
+        if provider == "openai":
+            result = await acreate_chat_completion(messages, model=model, temperature=TEMPERATURE, max_tokens=max_tokens)
+        else:
+            result = await acall_gemini(None, model, messages, max_tokens=max_tokens, temperature=TEMPERATURE)
+        latency = time.perf_counter() - start
+        if not result.text and result.prompt_tokens is None:
+            return None  # the provider call failed; its error was already printed
+        prompt_tokens = result.prompt_tokens or 0
+        completion_tokens = result.completion_tokens or 0
+        try:
+            usd = estimate_cost(model, prompt_tokens, completion_tokens, result.cached_tokens)
+        except ValueError:
+            usd = 0.0
+        return {
+            "id": question["id"],
+            "strategy": strategy,
+            "model": f"{provider}:{model}",
+            "correct": score(result.text, question["answer"]),
+            "latency_ms": round(latency * 1000, 1),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "usd": usd,
+            "expected": question["answer"],
+            "reply": result.text,
+        }
+
+    async def _worker(self, queue: asyncio.Queue, out) -> None:
+        while True:
+            job = await queue.get()
+            try:
+                if job is None:
+                    return
+                row = await self._ask(*job)
+                if row is None:
+                    self.failed += 1
+                    continue
+                out.write(json.dumps(row) + "\n")
+                out.flush()
+                self.answered += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[ERROR] {job[0]['id']} / {job[1]} / {job[2]}:{job[3]} failed and will be retried on the next run: {e}")
+            finally:
+                queue.task_done()
+
+    async def run(self, questions: Iterator[dict]) -> None:
+        done: set[Cell] = {(row["id"], row["strategy"], row["model"]) for row in read_results(self.output_path)}
+        if done:
+            print(f"[eval] resuming, {len(done)} answers already recorded")
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        with open(self.output_path, "a", encoding="utf-8") as out:
+            workers = [asyncio.create_task(self._worker(queue, out)) for _ in range(self.concurrency)]
+            for question in questions:
+                for strategy in self.strategies:
+                    for provider, model in self.models:
+                        if (question["id"], strategy, f"{provider}:{model}") not in done:
+                            await queue.put((question, strategy, provider, model))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+
+def parse_model(value: str) -> tuple[str, str]:
+    provider, _, model = value.partition(":")
+    if provider not in ("openai", "gemini") or not model:
+        raise argparse.ArgumentTypeError("expected openai:<model> or gemini:<model>")
+    return provider, model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score prompt strategies across providers on a question set.")
+    parser.add_argument("questions", nargs="?", help="Question set JSONL ('id', 'question', 'answer'); default: the Day 5 example question")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to (also the resume checkpoint)")
+    parser.add_argument("--models", nargs="+", type=parse_model, help="provider:model pairs (default: every provider with an API key)")
+    parser.add_argument("--strategies", nargs="+", choices=sorted(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once (also capped by P1_MAX_IN_FLIGHT)")
+    parser.add_argument("--target-accuracy", type=float, default=0.9, help="Accuracy the recommended strategy must reach")
+    parser.add_argument("--matrix", help="Also write the per-(model, strategy) summary to this JSON file")
+    args = parser.parse_args()
+
+    models = args.models or available_providers()
+    if not models:
+        parser.error("no provider available: set OPENAI_API_KEY and/or GEMINI_API_KEY, or pass --models")
+    if args.questions:
+        questions = read_questions(args.questions)
+    else:
+        questions = iter([{"id": "coffee_shop", "question": QUESTION, "answer": "22"}])
+
+    evaluation = StrategyEval(models, args.strategies, args.output, max(1, args.concurrency))
+    started = time.perf_counter()
+    asyncio.run(evaluation.run(questions))
+    print(f"[eval] answered={evaluation.answered} failed={evaluation.failed} elapsed_s={time.perf_counter() - started:.1f}")
+
+    wanted = {f"{provider}:{model}" for provider, model in models}
+    rows = [row for row in read_results(args.output) if row["model"] in wanted and row["strategy"] in args.strategies]
+    summaries = summarize(rows)
+    print(render_matrix(summaries))
+    cheapest, fastest = pick(summaries, args.target_accuracy)
+    if cheapest is None:
+        print(f"[eval] no strategy reached {args.target_accuracy:.0%} accuracy")
+    else:
+        print(f"[eval] cheapest at >= {args.target_accuracy:.0%}: {cheapest['model']} {cheapest['strategy']} (usd={cheapest['usd']:.6f})")
+        print(f"[eval] fastest at >= {args.target_accuracy:.0%}: {fastest['model']} {fastest['strategy']} (p95_ms={fastest['p95_ms']:.0f})")
+    if args.matrix:
+        with open(args.matrix, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
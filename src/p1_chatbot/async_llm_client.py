@@ -0,0 +1,318 @@
+"""
+Asyncio provider layer for OpenAI and Gemini.
+
+Async equivalents of the calls in `llm_client`, built on the SDKs' async
+clients from the shared registry in `clients`. Every upstream request goes
+through one semaphore per event loop (`P1_MAX_IN_FLIGHT`), and retries back off
+with `asyncio.sleep`, so a single loop can drive many conversations at once.
+Requests first wait for RPM/TPM quota in `ratelimit`, and retries use jittered
+backoff that honors the server's Retry-After.
+Request serialization, network wait, time-to-first-token and backoff sleeps are
+recorded in `metrics.METRICS`. Identical concurrent non-streaming calls share
+one upstream request through `singleflight`. Inside a turn deadline (see
+`deadline`), each request's SDK timeout is the time left and a retry whose
+backoff would run past the deadline raises `DeadlineExceeded` instead.
+Auth errors and errors that outlast the retries are raised for both providers,
+never returned as an empty reply.
+"""
+
+import asyncio
+import time
+import weakref
+from typing import Callable
+
+from .clients import get_async_openai_client, get_gemini_client
+from .config import OPENAI_API_KEY, P1_MAX_IN_FLIGHT, RESERVED_OUTPUT_TOKENS
+from .deadline import check_backoff, timeout_option
+from .llm_client import ChatResult, gemini_cached_tokens, openai_cached_tokens, to_openai_message
+from .messages import wire_messages
+from .metrics import METRICS
+from .ratelimit import alimited, backoff_delay, error_retry_after
+from .singleflight import SINGLE_FLIGHT, request_key
+from .tokens import count_tokens
+
+
+RETRIES = 5
+
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def get_limiter() -> asyncio.Semaphore:
+    """Return the in-flight request semaphore shared by all calls on the running loop."""
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = asyncio.Semaphore(P1_MAX_IN_FLIGHT)
+        _limiters[loop] = limiter
+    return limiter
+
+
+def _openai_retryable_errors() -> tuple[type[Exception], ...]:
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+
+def _gemini_retryable_errors() -> tuple[type[Exception], ...]:
+    from google.genai import _interactions
+    return (
+        _interactions.RateLimitError,
+        _interactions.APIConnectionError,
+        _interactions.InternalServerError,
+    )
+
+
+async def _backoff(provider: str, attempt: int, error: Exception) -> None:
+    delay = backoff_delay(attempt, error_retry_after(error))
+    check_backoff(delay)
+    print(f"[Network/API Error] {error}. Retrying in {delay:.1f}s... ({RETRIES - attempt} retries left)")
+    METRICS.inc("p1_retries_total", provider=provider)
+    with METRICS.span("backoff", provider=provider):
+        await asyncio.sleep(delay)
+
+
+def _estimated_result(messages: list[dict[str, str]], model: str, assistant_text: str) -> ChatResult:
+    prompt_tokens = count_tokens(messages, model)
+    completion_tokens = count_tokens([
+        {"role": "assistant", "content": assistant_text}
+    ], model)
+    return ChatResult(assistant_text, prompt_tokens, completion_tokens)
+
+
+async def acreate_chat_completion(messages: list[dict[str, str]], *, model: str, temperature: float, max_tokens: int) -> ChatResult:
+    """
+    Async OpenAI chat completion with bounded concurrency and retries.
+
+    Concurrent identical calls share one request (see `singleflight`).
+
+    Args:
+        messages: Message history to send
+        model: OpenAI model name
+        temperature: Sampling temperature
+        max_tokens: Max completion tokens
+
+    Returns:
+        ChatResult(assistant_text, prompt_tokens, completion_tokens, cached_tokens, coalesced)
+    """
+    return await SINGLE_FLIGHT.ado(
+        request_key("openai", model, temperature, max_tokens, messages),
+        lambda: _acreate_chat_completion(messages, model=model, temperature=temperature, max_tokens=max_tokens),
+    )
+
+
+async def _acreate_chat_completion(messages: list[dict[str, str]], *, model: str, temperature: float, max_tokens: int) -> ChatResult:
+    if not OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY not set. Please add it to your .env file.")
+    import openai
+    client = get_async_openai_client()
+    with METRICS.span("serialize"):
+        openai_messages = [to_openai_message(m) for m in messages]
+    retryable = _openai_retryable_errors()
+    for attempt in range(1, RETRIES + 1):
+        try:
+            async with alimited("openai", model, messages, max_tokens) as reservation, get_limiter():
+                METRICS.inc("p1_requests_total", provider="openai", model=model)
+                with METRICS.span("network", provider="openai"):
+                    completion = await client.chat.completions.create(
+                        model=model,
+                        messages=openai_messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        **timeout_option(),
+                    )
+            assistant_text = completion.choices[0].message.content or ""
+            if completion.usage is not None:
+                usage = completion.usage
+                reservation.settle(usage.prompt_tokens, usage.completion_tokens)
+                return ChatResult(assistant_text, usage.prompt_tokens, usage.completion_tokens, openai_cached_tokens(usage))
+            return _estimated_result(messages, model, assistant_text)
+        except openai.AuthenticationError as e:
+            METRICS.error("openai", e)
+            raise
+        except retryable as e:
+            METRICS.error("openai", e)
+            if attempt == RETRIES:
+                raise
+            await _backoff("openai", attempt, e)
+
+
+async def astream_chat_completion(messages: list[dict[str, str]], *, model: str, temperature: float, max_tokens: int, on_token: Callable[[str], None]) -> ChatResult:
+    """
+    Async streaming OpenAI chat completion.
+
+    Calls on_token with each text delta and takes usage from the final chunk.
+    Retries only while nothing has been streamed yet.
+
+    Returns:
+        ChatResult(assistant_text, prompt_tokens, completion_tokens, cached_tokens)
+    """
+    if not OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY not set. Please add it to your .env file.")
+    import openai
+    client = get_async_openai_client()
+    with METRICS.span("serialize"):
+        openai_messages = [to_openai_message(m) for m in messages]
+    retryable = _openai_retryable_errors()
+    for attempt in range(1, RETRIES + 1):
+        parts: list[str] = []
+        try:
+            prompt_tokens = completion_tokens = None
+            cached_tokens = 0
+            async with alimited("openai", model, messages, max_tokens) as reservation, get_limiter():
+                METRICS.inc("p1_requests_total", provider="openai", model=model)
+                with METRICS.span("network", provider="openai"):
+                    start = time.perf_counter()
+                    stream = await client.chat.completions.create(
+                        model=model,
+                        messages=openai_messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        **timeout_option(),
+                    )
+                    async for chunk in stream:
+                        if chunk.choices:
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                if not parts:
+                                    METRICS.observe("ttft", time.perf_counter() - start, provider="openai")
+                                parts.append(delta)
+                                on_token(delta)
+                        if chunk.usage is not None:
+                            prompt_tokens = chunk.usage.prompt_tokens
+                            completion_tokens = chunk.usage.completion_tokens
+                            cached_tokens = openai_cached_tokens(chunk.usage)
+            assistant_text = "".join(parts)
+            if prompt_tokens is None:
+                return _estimated_result(messages, model, assistant_text)
+            reservation.settle(prompt_tokens, completion_tokens)
+            return ChatResult(assistant_text, prompt_tokens, completion_tokens, cached_tokens)
+        except openai.AuthenticationError as e:
+            METRICS.error("openai", e)
+            raise
+        except retryable as e:
+            METRICS.error("openai", e)
+            if parts or attempt == RETRIES:
+                raise
+            await _backoff("openai", attempt, e)
+
+
+async def acall_gemini(client, model: str, messages: list[dict[str, str]], *, max_tokens: int = RESERVED_OUTPUT_TOKENS, temperature: float | None = None) -> ChatResult:
+    """
+    Async Gemini interaction with bounded concurrency and retries.
+
+    Concurrent identical calls share one request (see `singleflight`).
+
+    Args:
+        client: google-genai client (default: the shared registry client)
+        model: Gemini model name
+        messages: Message history to send
+        max_tokens: Max output tokens (default: RESERVED_OUTPUT_TOKENS)
+        temperature: Sampling temperature (default: the model's)
+
+    Returns:
+        ChatResult(assistant_text, prompt_tokens, completion_tokens, cached_tokens, coalesced)
+    """
+    return await SINGLE_FLIGHT.ado(
+        request_key("gemini", model, temperature, max_tokens, messages),
+        lambda: _acall_gemini(client, model, messages, max_tokens=max_tokens, temperature=temperature),
+    )
+
+
+async def _acall_gemini(client, model: str, messages: list[dict[str, str]], *, max_tokens: int, temperature: float | None) -> ChatResult:
+    client = client or get_gemini_client()
+    generation_config: dict = {"max_output_tokens": max_tokens}
+    if temperature is not None:
+        generation_config["temperature"] = temperature
+    with METRICS.span("serialize"):
+        gemini_input = wire_messages("gemini", messages)
+    retryable = _gemini_retryable_errors()
+    for attempt in range(1, RETRIES + 1):
+        try:
+            async with alimited("gemini", model, messages, max_tokens) as reservation, get_limiter():
+                METRICS.inc("p1_requests_total", provider="gemini", model=model)
+                with METRICS.span("network", provider="gemini"):
+                    interaction = await client.aio.interactions.create(
+                        model=model,
+                        input=gemini_input,
+                        generation_config=generation_config,
+                        **timeout_option(),
+                    )
+            break
+        except retryable as e:
+            METRICS.error("gemini", e)
+            if attempt == RETRIES:
+                raise
+            await _backoff("gemini", attempt, e)
+    assistant_text = ""
+    for output in interaction.outputs or []:
+        if hasattr(output, "text"):
+            assistant_text = output.text
+    usage = interaction.usage
+    if usage is not None and usage.total_input_tokens is not None:
+        reservation.settle(usage.total_input_tokens, usage.total_output_tokens)
+        return ChatResult(assistant_text, usage.total_input_tokens, usage.total_output_tokens or 0, gemini_cached_tokens(usage))
+    return _estimated_result(messages, model, assistant_text)
+
+
+async def astream_gemini(client, model: str, messages: list[dict[str, str]], on_token: Callable[[str], None], *, max_tokens: int = RESERVED_OUTPUT_TOKENS, temperature: float | None = None) -> ChatResult:
+    """
+    Async streaming Gemini interaction, calling on_token with each text delta.
+
+    Retries only while nothing has been streamed yet. max_tokens and
+    temperature behave as in `acall_gemini`.
+
+    Returns:
+        ChatResult(assistant_text, prompt_tokens, completion_tokens, cached_tokens)
+    """
+    client = client or get_gemini_client()
+    generation_config: dict = {"max_output_tokens": max_tokens}
+    if temperature is not None:
+        generation_config["temperature"] = temperature
+    with METRICS.span("serialize"):
+        gemini_input = wire_messages("gemini", messages)
+    retryable = _gemini_retryable_errors()
+    for attempt in range(1, RETRIES + 1):
+        parts: list[str] = []
+        usage = None
+        try:
+            async with alimited("gemini", model, messages, max_tokens) as reservation, get_limiter():
+                METRICS.inc("p1_requests_total", provider="gemini", model=model)
+                with METRICS.span("network", provider="gemini"):
+                    start = time.perf_counter()
+                    stream = await client.aio.interactions.create(
+                        model=model,
+                        input=gemini_input,
+                        generation_config=generation_config,
+                        stream=True,
+                        **timeout_option(),
+                    )
+                    async for event in stream:
+                        event_type = getattr(event, "event_type", None)
+                        if event_type == "content.delta":
+                            text = getattr(event.delta, "text", None)
+                            if text:
+                                if not parts:
+                                    METRICS.observe("ttft", time.perf_counter() - start, provider="gemini")
+                                parts.append(text)
+                                on_token(text)
+                        elif event_type == "interaction.complete" and event.interaction is not None:
+                            usage = event.interaction.usage
+                        elif event_type == "error":
+                            raise RuntimeError(getattr(event.error, "message", None) or "Gemini stream error")
+            break
+        except retryable as e:
+            METRICS.error("gemini", e)
+            if parts or attempt == RETRIES:
+                raise
+            await _backoff("gemini", attempt, e)
+    assistant_text = "".join(parts)
+    if usage is not None and usage.total_input_tokens is not None:
+        reservation.settle(usage.total_input_tokens, usage.total_output_tokens)
+        return ChatResult(assistant_text, usage.total_input_tokens, usage.total_output_tokens or 0, gemini_cached_tokens(usage))
+    return _estimated_result(messages, model, assistant_text)
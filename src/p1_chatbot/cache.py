@@ -0,0 +1,192 @@
+"""
+Response cache for low-temperature completions.
+
+Requests are keyed on a hash of provider, model, temperature, max_tokens and
+the message list (content trimmed at both ends only: indentation and line
+breaks inside a prompt change the answer, so they are part of the key).
+Lookups go to an in-memory LRU first, then to an on-disk SQLite table with a
+TTL and a size cap, so identical prompts (classifier runs, repeated questions)
+are answered without a provider call, across runs.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .config import (
+    P1_CACHE_MAX_ENTRIES,
+    P1_CACHE_MAX_TEMPERATURE,
+    P1_CACHE_MEMORY_ENTRIES,
+    P1_CACHE_PATH,
+    P1_CACHE_TTL_SECONDS,
+)
+from .cost import estimate_cost
+
+
+CachedResponse = tuple[str, int, int]
+
+
+def normalize_messages(messages: list[dict[str, str]]) -> list[tuple[str, str]]:
+    """Reduce messages to (role, content) pairs with leading/trailing whitespace removed."""
+    return [(m["role"], m["content"].strip()) for m in messages]
+
+
+def make_cache_key(provider: str, model: str, temperature: float | None, max_tokens: int | None, messages: list[dict[str, str]]) -> str:
+    """
+    Hash everything that determines a completion into a cache key.
+
+    Args:
+        provider: 'openai' or 'gemini'
+        model: Model name
+        temperature: Sampling temperature
+        max_tokens: Max completion tokens
+        messages: Message history that would be sent
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps(
+        [provider, model, temperature, max_tokens, normalize_messages(messages)],
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier (memory LRU + SQLite) cache of completions.
+
+    Attributes:
+        hits: Lookups answered from either tier
+        misses: Lookups that needed a provider call
+        saved_usd: Estimated cost of the provider calls avoided by hits
+    """
+
+    def __init__(
+        self,
+        path: str = P1_CACHE_PATH,
+        *,
+        memory_entries: int = P1_CACHE_MEMORY_ENTRIES,
+        max_entries: int = P1_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = P1_CACHE_TTL_SECONDS,
+        max_temperature: float = P1_CACHE_MAX_TEMPERATURE,
+    ):
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+        self.saved_usd = 0.0
+        self._memory: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, prompt_tokens INTEGER NOT NULL, "
+            "completion_tokens INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+
+    def cacheable(self, temperature: float | None) -> bool:
+        """Only near-deterministic requests are worth replaying."""
+        return temperature is not None and temperature <= self.max_temperature
+
+    def lookup(self, provider: str, model: str, messages: list[dict[str, str]], *, temperature: float | None, max_tokens: int | None) -> CachedResponse | None:
+        """
+        Return a cached (assistant_text, prompt_tokens, completion_tokens) or None.
+
+        Requests above the temperature cap are never looked up or counted.
+        """
+        if not self.cacheable(temperature):
+            return None
+        key = make_cache_key(provider, model, temperature, max_tokens, messages)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                response = entry[1]
+            else:
+                if entry is not None:
+                    del self._memory[key]
+                response = None
+                row = self._disk_get(key, now)
+                if row is not None:
+                    # Keeps the stored creation time, so the TTL still counts from the provider call.
+                    response, created = row
+                    self._remember(key, response, created)
+            if response is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            try:
+                self.saved_usd += estimate_cost(model, response[1], response[2])
+            except ValueError:
+                pass
+        return response
+
+    def store(self, provider: str, model: str, messages: list[dict[str, str]], response: tuple, *, temperature: float | None, max_tokens: int | None) -> None:
+        """
+        Cache a successful response; empty or usage-less results are skipped.
+
+        `response` starts with (assistant_text, prompt_tokens, completion_tokens);
+        anything after that (such as prompt-cache counts) is not stored.
+        """
+        text, prompt_tokens, completion_tokens = response[:3]
+        if not self.cacheable(temperature) or not text or prompt_tokens is None or completion_tokens is None:
+            return
+        key = make_cache_key(provider, model, temperature, max_tokens, messages)
+        now = time.time()
+        cached = (text, prompt_tokens, completion_tokens)
+        with self._lock:
+            self._remember(key, cached, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, text, prompt_tokens, completion_tokens, now, now),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _remember(self, key: str, response: CachedResponse, created: float) -> None:
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> tuple[CachedResponse, float] | None:
+        """The live (response, created) row for `key`, dropping it if the TTL has passed."""
+        row = self._db.execute(
+            "SELECT text, prompt_tokens, completion_tokens, created FROM responses WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        if now - row[3] > self.ttl_seconds:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        return (row[0], row[1], row[2]), row[3]
+
+    def _evict(self, now: float) -> None:
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def report(self) -> str:
+        """One-line summary of this session's cache effectiveness."""
+        return f"[cache] hits={self.hits} misses={self.misses} saved_usd={self.saved_usd:.6f}"
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,137 @@
+"""
+Fit the tokens-per-byte ratios behind `tokens.estimate_message_tokens`.
+
+Two sources of ground truth:
+- Turn traces (`P1_TRACE_PATH`): every turn records the prompt's byte length
+  next to the prompt tokens the provider reported, so this measures the real
+  tokenizer, including Gemini's.
+- A corpus of messages (JSONL with a 'messages' list or a 'text' field per
+  line), counted exactly with tiktoken for an OpenAI model.
+
+For each model the mean ratio is total tokens over total bytes, and the bounds
+are the lowest/highest per-sample ratio widened by `BOUND_MARGIN`. Results are
+merged into the calibration file the estimator reads.
+
+Usage:
+    python -m src.p1_chatbot.calibrate --traces traces.jsonl
+    python -m src.p1_chatbot.calibrate --corpus prompts.jsonl --model gpt-4o-mini
+"""
+
+import argparse
+import json
+import os
+import time
+
+from .config import P1_TOKEN_CALIBRATION_PATH
+from .tokens import (
+    TOKENS_PER_MESSAGE,
+    TOKENS_PER_REPLY,
+    calibration_for,
+    count_message_tokens,
+    model_family,
+)
+
+
+# Samples shorter than this say more about the overhead than about the ratio.
+MIN_SAMPLE_BYTES = 64
+MIN_SAMPLES = 5
+# Safety margin on the measured spread: the bounds decide budgets without
+# tokenizing, so they must also hold for messages the samples did not cover.
+BOUND_MARGIN = 0.25
+
+Sample = tuple[int, int]  # (bytes, tokens excluding per-message overhead)
+
+
+def trace_samples(path: str) -> dict[str, list[Sample]]:
+    """Per-model (prompt bytes, provider prompt tokens) from a trace JSONL file."""
+    samples: dict[str, list[Sample]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            trace = json.loads(line)
+            if trace.get("cache_hit") or not trace.get("prompt_bytes") or not trace.get("prompt_tokens"):
+                continue
+            model = trace.get("backend", "").partition(":")[2] or trace.get("model")
+            tokens = trace["prompt_tokens"] - TOKENS_PER_MESSAGE * trace["prompt_messages"] - TOKENS_PER_REPLY
+            samples.setdefault(model, []).append((trace["prompt_bytes"], tokens))
+    return samples
+
+
+def corpus_samples(path: str, model: str) -> dict[str, list[Sample]]:
+    """(message bytes, tiktoken tokens) for every message in a JSONL corpus."""
+    samples: list[Sample] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            messages = row.get("messages") or [{"role": "user", "content": row.get("text", "")}]
+            for message in messages:
+                num_bytes = len(f"{message.get('role', '')}{message.get('content', '')}".encode("utf-8"))
+                samples.append((num_bytes, count_message_tokens(message, model) - TOKENS_PER_MESSAGE))
+    return {model: samples}
+
+
+def fit(samples: list[Sample]) -> dict | None:
+    """Mean ratio and widened min/max bounds, or None with too few usable samples."""
+    usable = [(b, t) for b, t in samples if b >= MIN_SAMPLE_BYTES and t > 0]
+    if len(usable) < MIN_SAMPLES:
+        return None
+    ratios = [t / b for b, t in usable]
+    return {
+        "mean": sum(t for _, t in usable) / sum(b for b, _ in usable),
+        "low": min(ratios) * (1 - BOUND_MARGIN),
+        "high": min(1.0, max(ratios) * (1 + BOUND_MARGIN)),
+        "samples": len(usable),
+        "updated": time.time(),
+    }
+
+
+def mean_abs_error(samples: list[Sample], ratio: float) -> float:
+    """Mean absolute relative error of `bytes * ratio` as a token estimate."""
+    usable = [(b, t) for b, t in samples if b >= MIN_SAMPLE_BYTES and t > 0]
+    return sum(abs(b * ratio - t) / t for b, t in usable) / len(usable)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit per-model tokens-per-byte ratios for the token estimator.")
+    parser.add_argument("--traces", nargs="*", default=[], help="Turn trace JSONL files (P1_TRACE_PATH)")
+    parser.add_argument("--corpus", help="JSONL corpus to count exactly with tiktoken")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Model the corpus is counted for")
+    parser.add_argument("--output", default=P1_TOKEN_CALIBRATION_PATH, help="Calibration file to update")
+    args = parser.parse_args()
+    if not args.traces and not args.corpus:
+        parser.error("give --traces and/or --corpus")
+
+    samples: dict[str, list[Sample]] = {}
+    for path in args.traces:
+        for model, rows in trace_samples(path).items():
+            samples.setdefault(model, []).extend(rows)
+    if args.corpus:
+        for model, rows in corpus_samples(args.corpus, args.model).items():
+            samples.setdefault(model, []).extend(rows)
+
+    calibration = {}
+    if os.path.exists(args.output):
+        with open(args.output, encoding="utf-8") as f:
+            calibration = json.load(f)
+    print(f"{'model':28} {'family':7} {'samples':>7} {'mean':>6} {'low':>6} {'high':>6} {'err_before':>10} {'err_after':>9}")
+    for model, rows in sorted(samples.items()):
+        entry = fit(rows)
+        if entry is None:
+            print(f"{model:28} skipped: fewer than {MIN_SAMPLES} samples of {MIN_SAMPLE_BYTES}+ bytes")
+            continue
+        before = mean_abs_error(rows, calibration_for(model)[0])
+        after = mean_abs_error(rows, entry["mean"])
+        print(
+            f"{model:28} {model_family(model):7} {entry['samples']:7} {entry['mean']:6.3f} {entry['low']:6.3f} "
+            f"{entry['high']:6.3f} {before:10.1%} {after:9.1%}"
+        )
+        calibration[model] = entry
+
+    tmp = f"{args.output}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=2)
+    os.replace(tmp, args.output)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
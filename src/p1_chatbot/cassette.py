@@ -0,0 +1,451 @@
+"""
+Record/replay transport for provider traffic.
+
+With `P1_CASSETTE` set, every pooled HTTP client from `clients` gets an httpx
+transport that either records the provider exchanges it carries or replays
+them from that file instead of calling the network. It sits below both SDKs,
+so every call path (sync or async, JSON or streamed, OpenAI or Gemini) is
+covered without touching `llm_client`.
+
+A cassette is JSONL (gzip-compressed when the path ends in `.gz`), one
+exchange per line: a hash of the request (method, path, canonical JSON body;
+API keys and prompts are not stored), the model, the response status and the
+headers the chatbot reads (content type, Retry-After, x-ratelimit-*), the
+time to the response headers, the body as timed chunks, and the usage the
+provider reported. Compressed response encodings are turned off while
+recording so bodies are stored as sent.
+
+Replay answers a request with the next recorded exchange for the same hash,
+cycling through them, so retries after a recorded 429 replay as they
+happened. Without an exact match the next exchange for the same endpoint
+answers (`P1_CASSETTE_STRICT` makes that a 404 instead). `P1_CASSETTE_SPEED`
+scales the recorded timing: 1 replays at the original speed, 10 ten times
+faster, 0 without any delay. Concurrency comes from the caller (and the async
+layer's `P1_MAX_IN_FLIGHT`), as against a live endpoint.
+
+Usage:
+    P1_CASSETTE=prod.jsonl.gz P1_CASSETTE_MODE=record python -m src.p1_chatbot.cli
+    P1_CASSETTE=prod.jsonl.gz P1_CASSETTE_SPEED=0 python -m src.p1_chatbot.cli
+    python -m src.p1_chatbot.cassette prod.jsonl.gz
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import AsyncIterator, Iterator
+
+import httpx
+
+from .config import P1_CASSETTE, P1_CASSETTE_MODE, P1_CASSETTE_SPEED, P1_CASSETTE_STRICT
+from .metrics import METRICS
+
+
+# Response headers worth replaying (exact names, or prefixes ending in '-')
+KEPT_HEADERS = ("content-type", "retry-after", "x-ratelimit-")
+# Body chunks arriving closer together than this are stored as one
+COALESCE_MS = 1.0
+
+_installed: "Cassette | None" = None
+_install_lock = threading.Lock()
+
+
+def request_key(method: str, path: str, body: bytes) -> str:
+    """Hash identifying a request: method, path and body (JSON bodies canonicalized)."""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        pass
+    return hashlib.sha256(f"{method} {path}\n".encode("utf-8") + body).hexdigest()[:32]
+
+
+def _request_fields(request: httpx.Request) -> tuple[str, str | None, bool]:
+    body = request.read()
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = {}
+    if not isinstance(payload, dict):
+        payload = {}
+    return request_key(request.method, request.url.path, body), payload.get("model"), bool(payload.get("stream"))
+
+
+def _kept_headers(headers: httpx.Headers) -> dict[str, str]:
+    return {
+        name: value for name, value in headers.items()
+        if any(name == kept or (kept.endswith("-") and name.startswith(kept)) for kept in KEPT_HEADERS)
+    }
+
+
+def _usage(payload: dict) -> dict[str, int] | None:
+    """Usage of an OpenAI completion/chunk or a Gemini interaction/event, if it carries one."""
+    if payload.get("usage"):
+        usage = payload["usage"]
+        if "total_input_tokens" in usage:
+            return {"prompt_tokens": usage.get("total_input_tokens") or 0, "completion_tokens": usage.get("total_output_tokens") or 0}
+        return {"prompt_tokens": usage.get("prompt_tokens") or 0, "completion_tokens": usage.get("completion_tokens") or 0}
+    interaction = payload.get("interaction")
+    if isinstance(interaction, dict):
+        return _usage(interaction)
+    return None
+
+
+def body_usage(body: str) -> dict[str, int] | None:
+    """Usage reported in a JSON or SSE response body (the last one for a stream)."""
+    try:
+        return _usage(json.loads(body))
+    except ValueError:
+        pass
+    for line in reversed(body.splitlines()):
+        if line.startswith("data:"):
+            try:
+                usage = _usage(json.loads(line[5:]))
+            except (ValueError, AttributeError):
+                continue
+            if usage is not None:
+                return usage
+    return None
+
+
+def read_cassette(path: str) -> list[dict]:
+    """Exchanges stored in a cassette file, in recording order."""
+    exchanges: list[dict] = []
+    if not os.path.exists(path):
+        return exchanges
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    exchanges.append(json.loads(line))
+                except ValueError:
+                    continue  # a line cut short by an interrupted recording
+        except EOFError:
+            pass  # a gzip member cut short the same way
+    return exchanges
+
+
+class _Tape:
+    """One exchange being recorded while its response body streams through."""
+
+    def __init__(self, cassette: "Cassette", request: httpx.Request, response: httpx.Response, started: float):
+        key, model, stream = _request_fields(request)
+        self.cassette = cassette
+        self.headers_at = time.perf_counter()
+        self.exchange = {
+            "key": key,
+            "method": request.method,
+            "path": request.url.path,
+            "model": model,
+            "stream": stream,
+            "status": response.status_code,
+            "headers": _kept_headers(response.headers),
+            "ttfb_ms": round((self.headers_at - started) * 1000, 2),
+        }
+        self.chunks: list[list] = []
+        self.done = False
+
+    def add(self, chunk: bytes) -> None:
+        offset = round((time.perf_counter() - self.headers_at) * 1000, 2)
+        text = chunk.decode("utf-8", "surrogateescape")
+        if self.chunks and offset - self.chunks[-1][0] < COALESCE_MS:
+            self.chunks[-1][1] += text
+        else:
+            self.chunks.append([offset, text])
+
+    def finish(self) -> None:
+        if self.done:
+            return
+        self.done = True
+        body = "".join(text for _, text in self.chunks)
+        self.cassette.append({**self.exchange, "chunks": self.chunks, "usage": body_usage(body), "ts": round(time.time(), 3)})
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, inner: httpx.SyncByteStream, tape: _Tape):
+        self.inner = inner
+        self.tape = tape
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.inner:
+            self.tape.add(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self.inner.close()
+        finally:
+            self.tape.finish()
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, tape: _Tape):
+        self.inner = inner
+        self.tape = tape
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.inner:
+            self.tape.add(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.inner.aclose()
+        finally:
+            self.tape.finish()
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, chunks: list[list], speed: float):
+        self.chunks = chunks
+        self.speed = speed
+
+    def __iter__(self) -> Iterator[bytes]:
+        start = time.perf_counter()
+        for offset_ms, text in self.chunks:
+            if self.speed > 0:
+                wait = offset_ms / 1000 / self.speed - (time.perf_counter() - start)
+                if wait > 0:
+                    time.sleep(wait)
+            yield text.encode("utf-8", "surrogateescape")
+
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: list[list], speed: float):
+        self.chunks = chunks
+        self.speed = speed
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        start = time.perf_counter()
+        for offset_ms, text in self.chunks:
+            if self.speed > 0:
+                wait = offset_ms / 1000 / self.speed - (time.perf_counter() - start)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            yield text.encode("utf-8", "surrogateescape")
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Passes requests to `inner` and records each POST exchange into the cassette."""
+
+    def __init__(self, cassette: "Cassette", inner: httpx.BaseTransport):
+        self.cassette = cassette
+        self.inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST":
+            return self.inner.handle_request(request)
+        request.headers["Accept-Encoding"] = "identity"
+        started = time.perf_counter()
+        response = self.inner.handle_request(request)
+        response.stream = _RecordingStream(response.stream, _Tape(self.cassette, request, response, started))
+        return response
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of `RecordingTransport`."""
+
+    def __init__(self, cassette: "Cassette", inner: httpx.AsyncBaseTransport):
+        self.cassette = cassette
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST":
+            return await self.inner.handle_async_request(request)
+        request.headers["Accept-Encoding"] = "identity"
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        response.stream = _AsyncRecordingStream(response.stream, _Tape(self.cassette, request, response, started))
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """Answers every request from the cassette; nothing reaches the network."""
+
+    def __init__(self, cassette: "Cassette"):
+        self.cassette = cassette
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        exchange = self.cassette.match(request)
+        if exchange is None:
+            return self.cassette.miss_response(request)
+        delay = self.cassette.delay(exchange["ttfb_ms"])
+        if delay:
+            time.sleep(delay)
+        return httpx.Response(exchange["status"], headers=exchange["headers"], stream=_ReplayStream(exchange["chunks"], self.cassette.speed))
+
+
+class AsyncReplayTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of `ReplayTransport`."""
+
+    def __init__(self, cassette: "Cassette"):
+        self.cassette = cassette
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        exchange = self.cassette.match(request)
+        if exchange is None:
+            return self.cassette.miss_response(request)
+        delay = self.cassette.delay(exchange["ttfb_ms"])
+        if delay:
+            await asyncio.sleep(delay)
+        return httpx.Response(exchange["status"], headers=exchange["headers"], stream=_AsyncReplayStream(exchange["chunks"], self.cassette.speed))
+
+
+class Cassette:
+    """
+    A cassette file opened for recording or replay.
+
+    Attributes:
+        path: Cassette file (JSONL, gzip when it ends in '.gz')
+        mode: 'record' or 'replay'
+        speed: Replay timing factor (1 as recorded, 0 no delays)
+        strict: Replay only exact request matches
+        recorded: Exchanges written in this process
+        replayed: Requests answered from the cassette
+        misses: Requests with no exact match
+    """
+
+    def __init__(self, path: str, mode: str = "replay", speed: float = P1_CASSETTE_SPEED, strict: bool = P1_CASSETTE_STRICT):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Cassette mode must be 'record' or 'replay', not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.strict = strict
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._by_key: dict[str, list[dict]] = {}
+        self._by_route: dict[tuple[str, str, bool], list[dict]] = {}
+        self._cursors: Counter = Counter()
+        if mode == "replay":
+            exchanges = read_cassette(path)
+            if not exchanges:
+                raise ValueError(f"No recorded exchanges in {path}")
+            for exchange in exchanges:
+                self._by_key.setdefault(exchange["key"], []).append(exchange)
+                self._by_route.setdefault((exchange["method"], exchange["path"], exchange["stream"]), []).append(exchange)
+
+    def transport(self, inner: httpx.BaseTransport) -> httpx.BaseTransport:
+        """Transport for a sync client; `inner` carries the real requests while recording."""
+        return RecordingTransport(self, inner) if self.mode == "record" else ReplayTransport(self)
+
+    def async_transport(self, inner: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+        """Async counterpart of `transport`."""
+        return AsyncRecordingTransport(self, inner) if self.mode == "record" else AsyncReplayTransport(self)
+
+    def append(self, exchange: dict) -> None:
+        """Write one exchange (a gzip member of its own for '.gz', so a crash loses at most that line)."""
+        line = json.dumps(exchange, separators=(",", ":")) + "\n"
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with self._lock:
+            with opener(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+            self.recorded += 1
+        METRICS.inc("p1_cassette_recorded_total")
+
+    def match(self, request: httpx.Request) -> dict | None:
+        """The exchange that answers `request`, or None."""
+        if request.method != "POST":
+            return None
+        key, _, stream = _request_fields(request)
+        with self._lock:
+            group = self._by_key.get(key)
+            if group is None:
+                self.misses += 1
+                METRICS.inc("p1_cassette_misses_total")
+                route = (request.method, request.url.path, stream)
+                group = None if self.strict else self._by_route.get(route)
+                if not group:
+                    return None
+                key = route
+            index = self._cursors[key]
+            self._cursors[key] += 1
+            self.replayed += 1
+        METRICS.inc("p1_cassette_replayed_total")
+        return group[index % len(group)]
+
+    def miss_response(self, request: httpx.Request) -> httpx.Response:
+        message = f"No recorded exchange for {request.method} {request.url.path} in {self.path}"
+        return httpx.Response(404, json={"error": {"message": message, "type": "cassette_miss"}})
+
+    def delay(self, ms: float) -> float:
+        """Seconds to wait for a recorded duration at the replay speed."""
+        return ms / 1000 / self.speed if self.speed > 0 else 0.0
+
+    def report(self) -> str:
+        if self.mode == "record":
+            return f"[cassette] recorded={self.recorded} path={self.path}"
+        return f"[cassette] replayed={self.replayed} misses={self.misses} speed={self.speed:g} path={self.path}"
+
+
+def install(cassette: "Cassette | None") -> None:
+    """
+    Use `cassette` for HTTP clients created from now on (None: back to the network).
+
+    Clients already in the `clients` registry keep their transport; close them
+    first (`clients.aclose_all`) to switch.
+    """
+    global _installed
+    with _install_lock:
+        _installed = cassette
+
+
+def get_cassette() -> "Cassette | None":
+    """The installed cassette, opened from `P1_CASSETTE` on first use; None if there is none."""
+    global _installed
+    with _install_lock:
+        if _installed is None and P1_CASSETTE:
+            _installed = Cassette(P1_CASSETTE, P1_CASSETTE_MODE)
+        return _installed
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def summarize(exchanges: list[dict]) -> str:
+    """Per-endpoint counts, status codes, latency percentiles and tokens of a cassette."""
+    lines = [f"{len(exchanges)} exchanges"]
+    routes: dict[tuple[str, str, bool], list[dict]] = {}
+    for exchange in exchanges:
+        routes.setdefault((exchange["path"], exchange.get("model") or "?", exchange["stream"]), []).append(exchange)
+    for (path, model, stream), group in sorted(routes.items()):
+        ttfb = [e["ttfb_ms"] for e in group]
+        total = [e["ttfb_ms"] + (e["chunks"][-1][0] if e["chunks"] else 0.0) for e in group]
+        statuses = Counter(e["status"] for e in group)
+        usages = [e["usage"] for e in group if e.get("usage")]
+        lines.append(
+            f"{path} {model} {'stream' if stream else 'json'}: n={len(group)} "
+            f"status={','.join(f'{s}x{n}' for s, n in sorted(statuses.items()))} "
+            f"ttfb_p50_ms={_percentile(ttfb, 50):.0f} ttfb_p95_ms={_percentile(ttfb, 95):.0f} "
+            f"total_p50_ms={_percentile(total, 50):.0f} total_p95_ms={_percentile(total, 95):.0f} "
+            f"prompt_tokens={sum(u['prompt_tokens'] for u in usages)} completion_tokens={sum(u['completion_tokens'] for u in usages)}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a recorded cassette of provider exchanges.")
+    parser.add_argument("path", help="Cassette file (JSONL, or .gz)")
+    args = parser.parse_args()
+    print(summarize(read_cassette(args.path)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+# Imported first so the startup profile clock covers every other import
+from .startup import PROFILE, initialize
 # Import system prompt
 from .prompts import DEFAULT_SYSTEM_PROMPT
 """
@@ -5,28 +7,48 @@ CLI entrypoint for the P1 Chatbot.
 
 This module provides an interactive chat interface that supports both OpenAI and Gemini.
 It maintains conversation history and allows continuous interaction until the user exits.
+The prompt appears before any provider SDK or tokenizer is loaded; see `startup`.
 """
 
-import os
+import argparse
+import asyncio
+import signal
+import sys
+import time
 import warnings
-from .tokens import count_tokens
+from concurrent.futures import Future
+from typing import Awaitable, TypeVar
+from .cache import ResponseCache
+from .compaction import Compactor
+from .metrics import METRICS, export as export_metrics, serve_from_config as serve_metrics
+from .conversation import Conversation
 from .config import (
-    EXERCISE_MAX_CONTEXT_TOKENS,
-    RESERVED_OUTPUT_TOKENS,
-    TRUNCATE_THRESHOLD_TOKENS,
-    GEMINI_MODEL,
-    OPENAI_MODEL,
-    GEMINI_API_KEY,
-    OPENAI_API_KEY,
     P1_MODEL,
     P1_TEMPERATURE,
-    P1_MAX_TOKENS
+    P1_STREAM,
+    P1_CACHE,
+    P1_SUMMARY,
+    P1_SUMMARY_MODEL,
+    P1_STARTUP_BUDGET_MS,
+    P1_ROUTER,
+    P1_SESSIONS,
+    P1_MEMORY,
+    P1_TURN_TIMEOUT_SECONDS,
+    P1_CASSETTE
 )
 
 
 
 # Import LLM client logic from llm_client.py
-from .llm_client import get_llm_client, call_openai, call_gemini, create_chat_completion
+from .clients import aclose_all, awarm_up
+from .deadline import turn_deadline
+from .llm_client import ChatResult, available_providers, select_provider
+from .memory import MemoryIndex
+from .models import ContextBudget, output_limit
+from .router import Backend, RouteResult, Router
+from .sessions import Session, SessionStore
+
+T = TypeVar("T")
 
 
 def format_message(role: str, content: str) -> str:
@@ -35,45 +57,214 @@ def format_message(role: str, content: str) -> str:
     return f'{color}{role.capitalize()}: {content}\033[0m'
 
 
-def truncate_messages(messages: list[dict[str, str]], model: str) -> list[dict[str, str]]:
+async def stream_reply(router: Router, messages: list[dict[str, str]]) -> RouteResult:
+    """
+    Stream the assistant reply to the terminal as tokens arrive.
+    
+    Prints time-to-first-token and generation speed once the stream ends.
+    
+    Args:
+        router: Router that picks (and if needed hedges) the backend
+        messages: Message history to send, in OpenAI roles
+    
+    Returns:
+        RouteResult for the streamed reply
+    """
+    start = time.perf_counter()
+    first_token_at = None
+
+    def on_token(text: str) -> None:
+        nonlocal first_token_at
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+            sys.stdout.write("\033[92mAssistant: ")
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    route = await router.complete(messages, temperature=P1_TEMPERATURE, on_token=on_token)
+    result = route.result
+    end = time.perf_counter()
+
+    if first_token_at is None:
+        print(format_message('assistant', result.text))
+        return route
+    sys.stdout.write("\033[0m\n")
+    if route.deadline_exceeded:
+        print(f"[deadline] reply cut off at the {P1_TURN_TIMEOUT_SECONDS:g}s turn deadline; keeping the partial text")
+        return route
+    completion_tokens = result.completion_tokens or 0
+    generation_seconds = end - first_token_at
+    tokens_per_sec = completion_tokens / generation_seconds if generation_seconds > 0 else 0.0
+    print(f"[latency] ttft_ms={(first_token_at - start) * 1000:.0f} total_ms={(end - start) * 1000:.0f} tokens_per_sec={tokens_per_sec:.1f}")
+    return route
+
+
+async def interruptible(request: Awaitable[T]) -> T:
+    """
+    Await `request` as its own task, so Ctrl-C cancels it instead of ending the chat.
+
+    Raises:
+        asyncio.CancelledError: If Ctrl-C interrupted the request
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(request)
+    previous = signal.getsignal(signal.SIGINT)
+    try:
+        loop.add_signal_handler(signal.SIGINT, task.cancel)
+    except (NotImplementedError, RuntimeError):
+        return await task  # no loop signal handlers on this platform: Ctrl-C ends the chat as before
+    try:
+        return await task
+    finally:
+        loop.remove_signal_handler(signal.SIGINT)
+        signal.signal(signal.SIGINT, previous)
+
+
+def truncate_messages(conversation: Conversation, budget: ContextBudget | None = None) -> list[dict[str, str]]:
     """
     Truncate messages to fit within the context window budget.
     
-    Removes oldest user+assistant pairs until we're under the threshold.
+    Once the history no longer fits, the oldest unpinned messages are dropped
+    in one chunk until the history is down to the budget's target, always
+    ending on a user/assistant boundary. The pinned system prompt stays first
+    and the prompt prefix only changes on the turns that trigger truncation,
+    so provider-side prompt caching keeps hitting in between.
+    Uses the per-message token counts cached by the conversation, so no
+    message is re-tokenized while truncating; estimated counts are only made
+    exact when a decision is within their error margin.
     
     Args:
-        messages: Current message history
-        model: Model name for token counting
+        conversation: Current message history, truncated in place
+        budget: Window and output reservation of the session (default: the
+            model's window with the full max output reserved)
     
     Returns:
-        Truncated message list
+        The evicted messages, oldest first (empty if nothing was dropped)
     """
-    while messages:
-        input_tokens = count_tokens(messages, model)
-        
-        if input_tokens + RESERVED_OUTPUT_TOKENS <= EXERCISE_MAX_CONTEXT_TOKENS:
-            break
-        
-        if input_tokens <= TRUNCATE_THRESHOLD_TOKENS:
-            break
+    if budget is None:
+        budget = ContextBudget(conversation.model)
+    evicted: list[dict[str, str]] = []
+    if conversation.fits(budget.limit):
+        return evicted
+    if conversation.fits(budget.threshold):
+        return evicted
+    input_tokens = conversation.token_count
 
-        if len(messages) >= 2:
+    first = conversation.pinned
+    # Keep the newest message (the pending user turn) whatever its size.
+    while len(conversation) - first > 1 and (
+        not conversation.fits(budget.target)
+        or conversation[first].get("role") != "user"
+    ):
+        evicted.append(conversation.pop(first))
 
-            if messages[0].get("role") == "user" and messages[1].get("role") == "assistant":
-                messages.pop(0) 
-                messages.pop(0)  
-                print("[context] Truncated oldest messages to fit token budget.")
-            else:
-                messages.pop(0)
-                print("[context] Truncated oldest messages to fit token budget.")
-        else:
-            messages.pop(0)
-            print("[context] Truncated oldest messages to fit token budget.")
+    if evicted:
+        print(f"[context] Truncated {len(evicted)} oldest messages to fit token budget ({input_tokens} -> {conversation.token_count} tokens).")
+    return evicted
+
+
+def new_conversation(model: str) -> Conversation:
+    """
+    Start a history with the system prompt pinned.
+    
+    The history is kept in OpenAI roles whichever backend answers; the router
+    maps them for Gemini.
+    """
+    conversation = Conversation(model)
+    conversation.append("system", DEFAULT_SYSTEM_PROMPT)
+    conversation.pinned = 1
+    return conversation
+
+
+def load_conversation(session: Session | None, model: str, budget: ContextBudget | None = None) -> Conversation:
+    """Resume the saved session's history (seeding `budget` with its reply lengths), or start a new one."""
+    if session is not None and session.meta["messages"]:
+        if budget is None:
+            return session.load(model)
+        conversation = session.load(model, budget.threshold)
+        budget.seed(conversation)
+        return conversation
+    return new_conversation(model)
+
+
+def load_memory(session: Session | None, model: str) -> MemoryIndex | None:
+    """The recall index (None unless P1_MEMORY), holding every turn of a resumed session."""
+    if not P1_MEMORY:
+        return None
+    memory = MemoryIndex(model)
+    if session is not None and session.meta["messages"]:
+        memory.add_records(session.records())
+    return memory
+
+
+def build_router(providers: list[tuple[str, str]], readies: dict[str, Future]) -> Router:
+    """
+    Create a router over the usable providers, the first one preferred.
     
-    return messages
+    Args:
+        providers: (provider, model) pairs from `available_providers`
+        readies: Background startup future per provider
+    
+    Returns:
+        Router with one backend per provider
+    """
+    backends = []
+    for provider, model in providers:
+        if provider == "openai":
+            backends.append(Backend("openai", P1_MODEL, output_limit(P1_MODEL), readies[provider]))
+        else:
+            backends.append(Backend("gemini", model, output_limit(model), readies[provider]))
+    return Router(backends)
+
+
+async def warm_connection(provider: str, ready: Future) -> None:
+    """Warm the async connection pool once the background startup has built the client."""
+    try:
+        await asyncio.wrap_future(ready)
+    except Exception:
+        return  # reported when the first turn waits on the same future
+    with PROFILE.phase("warm connection"):
+        await awarm_up(provider)
 
 
 def main():
+    """Run the chatbot loop on a single event loop."""
+    PROFILE.record("import cli modules", PROFILE.started, time.perf_counter())
+    parser = argparse.ArgumentParser(description="Chat with OpenAI or Gemini from the terminal.")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Start up as usual, wait for the background init, print a timing breakdown and exit "
+             "(status 1 if the prompt took longer than P1_STARTUP_BUDGET_MS)",
+    )
+    parser.add_argument("--sessions", action="store_true", help="List saved sessions and exit")
+    parser.add_argument(
+        "--resume", nargs="?", const="last", metavar="ID",
+        help="Continue a saved session (default: the most recent one)",
+    )
+    parser.add_argument("--fork", metavar="ID", help="Continue a copy of a saved session, leaving the original as it is")
+    parser.add_argument(
+        "--compare", nargs="*", metavar="MODEL",
+        help="Send every turn to several models at once and show the replies side by side "
+             "(provider:model or registry names; default: one per provider with an API key)",
+    )
+    args = parser.parse_args()
+    if args.sessions:
+        print(SessionStore().report())
+        return
+    warnings.filterwarnings("ignore", message="Interactions usage is experimental and may change in future versions.")
+    if args.compare is not None:
+        from .compare import acompare
+        asyncio.run(acompare(args.compare))
+        return
+    asyncio.run(amain(profile_startup=args.profile_startup, resume=args.resume, fork=args.fork))
+    if args.profile_startup:
+        prompt_ms = PROFILE.offset_ms("prompt shown")
+        if prompt_ms is None or prompt_ms > P1_STARTUP_BUDGET_MS:
+            sys.exit(1)
+
+
+async def amain(profile_startup: bool = False, resume: str | None = None, fork: str | None = None):
     """
     Main chatbot loop.
     
@@ -83,27 +274,78 @@ def main():
     - Ignores empty input
     - Maintains conversation history
     - Calls LLM API with full message history
+    - Gives each reply P1_TURN_TIMEOUT_SECONDS; Ctrl-C cancels the request in flight
+    
+    Input is read on a worker thread, so the event loop keeps running
+    background work (such as warming the connection pool) while the user types.
+    
+    Completed turns are appended to the session log, so the conversation can
+    be resumed or forked later.
+    
+    Args:
+        profile_startup: Stop after startup and print the `--profile-startup` report
+        resume: Id (or 'last') of a saved session to continue
+        fork: Id of a saved session to continue as a copy
     """
-    with warnings.catch_warnings():
-        warnings.filterwarnings("ignore", message="Interactions usage is experimental and may change in future versions.")
+    try:
+        with PROFILE.phase("select provider"):
+            provider, model = select_provider()
+            providers = available_providers(warn=False) if P1_ROUTER else [(provider, model)]
+    except Exception as e:
+        print(f"Error initializing LLM client: {e}")
+        return
+    session = None
+    if resume or fork:
         try:
-            provider, client, model = get_llm_client()
-            print(f"Using {provider.upper()} ({model})")
-            print("Type 'quit', 'exit', or '/quit' to end the conversation.\n")
-        except Exception as e:
-            print(f"Error initializing LLM client: {e}")
+            session = SessionStore().fork(fork) if fork else SessionStore().get(resume)
+        except (KeyError, OSError) as e:
+            print(f"Error opening session: {e}")
             return
+    # SDK import, client construction and tokenizer load run while the user types.
+    readies = {p: initialize(p, m, preload_encoding=p == provider) for p, m in providers}
+    ready = readies[provider]
+    warm_tasks = [asyncio.create_task(warm_connection(p, readies[p])) for p, _ in providers]
+    router = build_router(providers, readies)
 
-    # Set up message history with system prompt in correct role
-    if provider == "gemini":
-        messages = [{"role": "user", "content": DEFAULT_SYSTEM_PROMPT}]
-    else:
-        messages = [{"role": "system", "content": DEFAULT_SYSTEM_PROMPT}]
+    conversation: Conversation | None = None
+    memory: MemoryIndex | None = None
+    # Output reservation adapts to this session's reply lengths.
+    budget = ContextBudget(model)
     total_cost = 0.0
+    total_prompt_tokens = 0
+    total_cached_tokens = 0
     from .cost import estimate_cost
+    response_cache = ResponseCache() if P1_CACHE else None
+    request_model = router.backends[0].model
+    if session is None and P1_SESSIONS:
+        session = SessionStore().new(model)
+    unsaved_evictions = 0
+    compactor = Compactor(provider, P1_SUMMARY_MODEL or request_model) if P1_SUMMARY else None
+    serve_metrics()
+
+    print(f"Using {provider.upper()} ({model})")
+    for backend in router.backends[1:]:
+        print(f"Fallback: {backend.provider.upper()} ({backend.model}), hedged after p{router.hedge_percentile:.0f} latency")
+    if session is not None and session.meta["messages"]:
+        print(f"Resuming session {session.id} ({session.meta['messages']} messages, ${session.meta['usd']:.6f}): {session.meta['title']}")
+    print("Type 'quit', 'exit', or '/quit' to end the conversation.\n")
+    PROFILE.mark("prompt shown")
+
+    if profile_startup:
+        try:
+            await asyncio.wrap_future(ready)
+            await asyncio.to_thread(new_conversation, model)
+            await asyncio.gather(*warm_tasks)
+        except Exception as e:
+            print(f"Error initializing LLM client: {e}")
+        print(PROFILE.report(P1_STARTUP_BUDGET_MS))
+        if response_cache is not None:
+            response_cache.close()
+        await aclose_all()
+        return
 
     while True:
-        user_input = input("You: ").strip()
+        user_input = (await asyncio.to_thread(input, "You: ")).strip()
 
         if user_input.lower() in ["quit", "exit", "/quit"]:
             print("Goodbye!")
@@ -112,46 +354,168 @@ def main():
         if not user_input:
             continue
 
-        messages.append({"role": "user", "content": user_input})
+        if conversation is None:
+            # First turn: wait for whatever background startup work is left,
+            # off the event loop.
+            try:
+                await asyncio.wrap_future(ready)
+                conversation = await asyncio.to_thread(load_conversation, session, model, budget)
+                memory = await asyncio.to_thread(load_memory, session, model)
+                if compactor is not None:
+                    compactor.adopt(conversation)
+            except Exception as e:
+                print(f"Error initializing LLM client: {e}")
+                return
 
-        if client is None:
-            print("LLM client is not initialized. Please check your configuration.")
-            return
+        with METRICS.trace(provider=provider, model=request_model) as trace:
+            with METRICS.span("count_tokens"):
+                conversation.append("user", user_input)
+            evicted = []
+            replied = False
+            try:
+                with METRICS.span("truncate"):
+                    evicted = truncate_messages(conversation, budget)
+                unsaved_evictions += len(evicted)
+                # A copy: a background summary fold may rewrite the history mid-turn.
+                messages = list(conversation.messages)
 
-        try:
-            messages = truncate_messages(messages, model)
+                input_tokens_estimate = conversation.token_count
+                if memory is not None:
+                    with METRICS.span("recall"):
+                        recall = memory.recall(conversation)
+                    messages = recall.messages
+                    input_tokens_estimate = recall.tokens
+                    print(f"[memory] recalled {recall.recalled_turns} of {len(memory)} earlier turns ({conversation.token_count} tokens in the full history)")
+                print(f"Tokens (estimated input): {input_tokens_estimate}")
 
-            input_tokens_estimate = count_tokens(messages, model)
-            print(f"Tokens (estimated input): {input_tokens_estimate}")
+                # Lookups use the backend the request goes to first; a reply is
+                # stored under the backend that actually produced it.
+                primary = router.primary
+                cached = None
+                route = None
+                if response_cache is not None:
+                    with METRICS.span("cache_lookup"):
+                        cached = response_cache.lookup(
+                            primary.provider, primary.model, messages, temperature=P1_TEMPERATURE, max_tokens=primary.max_tokens
+                        )
+                    METRICS.inc("p1_cache_lookups_total", result="hit" if cached is not None else "miss")
 
-            if provider == "openai":
-                assistant_text, prompt_tokens, completion_tokens = create_chat_completion(
-                    messages,
-                    model=P1_MODEL,
-                    temperature=P1_TEMPERATURE,
-                    max_tokens=P1_MAX_TOKENS
-                )
-            else:
-                assistant_text, prompt_tokens, completion_tokens = call_gemini(client, model, messages)
+                if cached is not None:
+                    result = ChatResult(*cached)
+                    print(format_message('assistant', result.text))
+                elif P1_STREAM:
+                    with turn_deadline():
+                        route = await interruptible(stream_reply(router, messages))
+                    result = route.result
+                else:
+                    with turn_deadline():
+                        route = await interruptible(router.complete(messages, temperature=P1_TEMPERATURE))
+                    result = route.result
+                if route is not None and not result.text and result.prompt_tokens is None:
+                    raise RuntimeError("The provider returned no reply")
+                if route is not None and not P1_STREAM:
+                    print(format_message('assistant', result.text))
+                assistant_text = result.text
+                if route is not None and (route.hedged or route.failed_over or route.backend is not primary):
+                    print(f"[route] backend={route.backend.name} hedged={route.hedged} failed_over={route.failed_over}")
 
-            print(format_message('assistant', assistant_text))
+                if cached is None and response_cache is not None:
+                    answered = route.backend
+                    with METRICS.span("cache_store"):
+                        response_cache.store(
+                            answered.provider, answered.model, messages, result,
+                            temperature=P1_TEMPERATURE, max_tokens=answered.max_tokens
+                        )
 
-            safe_prompt_tokens = prompt_tokens if prompt_tokens is not None else 0
-            safe_completion_tokens = completion_tokens if completion_tokens is not None else 0
-            turn_cost = estimate_cost(model, safe_prompt_tokens, safe_completion_tokens)
-            total_cost += turn_cost
-            print(f"[usage] prompt_tokens={safe_prompt_tokens} completion_tokens={safe_completion_tokens}")
-            print(f"[cost]  turn_usd={turn_cost:.6f} total_usd={total_cost:.6f}")
+                safe_prompt_tokens = result.prompt_tokens if result.prompt_tokens is not None else 0
+                safe_completion_tokens = result.completion_tokens if result.completion_tokens is not None else 0
+                # A coalesced reply was paid for by the request it joined.
+                billed = cached is None and not result.coalesced
+                with METRICS.span("cost"):
+                    turn_cost = 0.0 if not billed else estimate_cost(
+                        route.backend.model, safe_prompt_tokens, safe_completion_tokens, result.cached_tokens
+                    )
+                total_cost += turn_cost
+                if cached is None:
+                    budget.observe(result.completion_tokens)
+                if billed:
+                    total_prompt_tokens += safe_prompt_tokens
+                    total_cached_tokens += result.cached_tokens
+                    METRICS.inc("p1_tokens_total", safe_prompt_tokens, kind="prompt")
+                    METRICS.inc("p1_tokens_total", result.cached_tokens, kind="cached")
+                    METRICS.inc("p1_tokens_total", safe_completion_tokens, kind="completion")
+                    METRICS.inc("p1_cost_usd_total", turn_cost, model=route.backend.model)
+                trace.attrs.update(
+                    backend=route.backend.name if route is not None else "cache",
+                    # Raw material for `calibrate`: what the provider counted for how many bytes.
+                    prompt_messages=len(messages),
+                    prompt_bytes=sum(len(f"{m['role']}{m['content']}".encode("utf-8")) for m in messages),
+                    prompt_tokens=safe_prompt_tokens,
+                    cached_tokens=result.cached_tokens,
+                    completion_tokens=safe_completion_tokens,
+                    usd=round(turn_cost, 8),
+                    cache_hit=cached is not None,
+                    coalesced=result.coalesced,
+                    deadline_exceeded=route is not None and route.deadline_exceeded,
+                    output_reserve=budget.reserve,
+                )
+                hit_rate = total_cached_tokens / total_prompt_tokens if total_prompt_tokens else 0.0
+                print(f"[usage] prompt_tokens={safe_prompt_tokens} cached_tokens={result.cached_tokens} completion_tokens={safe_completion_tokens} prompt_cache_hit_rate={hit_rate:.0%}")
+                print(f"[cost]  turn_usd={turn_cost:.6f} total_usd={total_cost:.6f}")
+                if cached is not None:
+                    print(response_cache.report())
 
+                with METRICS.span("count_tokens"):
+                    conversation.append("assistant", assistant_text)
+                replied = True
+                if memory is not None:
+                    memory.add(conversation[-2], conversation[-1])
+                if session is not None:
+                    with METRICS.span("session_write"):
+                        session.record_turn(conversation, unsaved_evictions, turn_cost)
+                    unsaved_evictions = 0
 
-            if provider == "gemini":
-                messages.append({"role": "model", "content": assistant_text})
-            else:
-                messages.append({"role": "assistant", "content": assistant_text})
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                # Ctrl-C during the request: drop the unanswered message and keep chatting.
+                trace.attrs["error"] = "Interrupted"
+                print("\033[0m\n[interrupted] request cancelled; the message was not added to the history")
+                conversation.pop()
+            except Exception as e:
+                METRICS.error(provider, e)
+                trace.attrs["error"] = type(e).__name__
+                if replied:
+                    # The reply is already in the history; only saving it failed.
+                    print(f"Error saving the turn: {e}")
+                else:
+                    print(f"Error calling LLM API: {e}")
+                    conversation.pop()
+            finally:
+                # Truncated messages are gone from the history whether or not the turn succeeded.
+                if compactor is not None:
+                    compactor.schedule(conversation, evicted)
+        export_metrics()
 
-        except Exception as e:
-            print(f"Error calling LLM API: {e}")
-            messages.pop()
+    if compactor is not None:
+        await compactor.drain()
+        print(compactor.report())
+    if session is not None and session.meta["messages"]:
+        if conversation is not None:
+            session.sync_summary(conversation)
+        print(f"[session] {session.id} saved ({session.meta['messages']} messages); continue with --resume {session.id}")
+    if response_cache is not None:
+        print(response_cache.report())
+        response_cache.close()
+    if len(router.backends) > 1:
+        print(router.report())
+    if P1_CASSETTE:
+        from .cassette import get_cassette
+        print(get_cassette().report())
+    for warm_task in warm_tasks:
+        warm_task.cancel()
+    export_metrics()
+    await aclose_all()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,248 @@
+"""
+Provider client registry.
+
+Creating an SDK client per request means a fresh TCP+TLS handshake on every
+turn. This module keeps one long-lived client per (provider, api_key), each
+backed by an httpx connection pool with keep-alive, and shares it across turns,
+threads and every call path in `llm_client`. With `P1_CASSETTE` set, the
+clients record to or replay from a cassette instead (see `cassette`).
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING
+
+from .config import (
+    GEMINI_API_KEY,
+    GEMINI_BASE_URL,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    P1_HTTP_KEEPALIVE_SECONDS,
+    P1_HTTP_MAX_CONNECTIONS,
+    P1_HTTP_TIMEOUT_SECONDS,
+)
+from .metrics import METRICS
+from .ratelimit import observe_response
+
+# httpx and the provider SDKs are imported when the first client is built,
+# which the CLI does on a background thread at startup.
+if TYPE_CHECKING:
+    import httpx
+
+
+_clients: dict[tuple[str, str], object] = {}
+_http_clients: dict[tuple[str, str], httpx.Client] = {}
+_async_http_clients: dict[tuple[str, str], httpx.AsyncClient] = {}
+_lock = threading.Lock()
+
+
+def _pool_options() -> dict:
+    import httpx
+    return {
+        "limits": httpx.Limits(
+            max_connections=P1_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=P1_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=P1_HTTP_KEEPALIVE_SECONDS,
+        ),
+        "timeout": httpx.Timeout(P1_HTTP_TIMEOUT_SECONDS, connect=5.0),
+        "follow_redirects": True,
+    }
+
+
+def _count_response(response: httpx.Response) -> None:
+    # Also sees the SDKs' own internal retries (e.g. 429s honoured via Retry-After).
+    METRICS.inc("p1_http_responses_total", host=response.request.url.host, status=response.status_code)
+    observe_response(response.status_code, response.headers)
+
+
+async def _acount_response(response: httpx.Response) -> None:
+    _count_response(response)
+
+
+def _new_http_client() -> httpx.Client:
+    """Build an httpx client with a keep-alive pool sized for the chatbot."""
+    import httpx
+    from .cassette import get_cassette
+    options = _pool_options()
+    cassette = get_cassette()
+    if cassette is not None:
+        options["transport"] = cassette.transport(httpx.HTTPTransport(limits=options["limits"]))
+    return httpx.Client(**options, event_hooks={"response": [_count_response]})
+
+
+def _new_async_http_client() -> httpx.AsyncClient:
+    """Async counterpart of `_new_http_client`."""
+    import httpx
+    from .cassette import get_cassette
+    options = _pool_options()
+    cassette = get_cassette()
+    if cassette is not None:
+        options["transport"] = cassette.async_transport(httpx.AsyncHTTPTransport(limits=options["limits"]))
+    return httpx.AsyncClient(**options, event_hooks={"response": [_acount_response]})
+
+
+def get_openai_client(api_key: str | None = None):
+    """
+    Return the shared OpenAI client for an API key, creating it on first use.
+
+    Args:
+        api_key: OpenAI API key (default: OPENAI_API_KEY)
+
+    Returns:
+        An `openai.OpenAI` instance reused across calls
+    """
+    api_key = api_key or OPENAI_API_KEY
+    key = ("openai", api_key or "")
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            from openai import OpenAI
+            http_client = _new_http_client()
+            client = OpenAI(api_key=api_key, base_url=OPENAI_BASE_URL, http_client=http_client)
+            _http_clients[key] = http_client
+            _clients[key] = client
+    return client
+
+
+def get_gemini_client(api_key: str | None = None):
+    """
+    Return the shared google-genai client for an API key, creating it on first use.
+
+    Args:
+        api_key: Gemini API key (default: GEMINI_API_KEY)
+
+    Returns:
+        A `google.genai.Client` instance reused across calls
+    """
+    api_key = api_key or GEMINI_API_KEY
+    key = ("gemini", api_key or "")
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            from google import genai
+            from google.genai import types
+            http_client = _new_http_client()
+            async_http_client = _new_async_http_client()
+            client = genai.Client(
+                api_key=api_key,
+                http_options=types.HttpOptions(
+                    base_url=GEMINI_BASE_URL,
+                    httpx_client=http_client,
+                    httpx_async_client=async_http_client,
+                ),
+            )
+            _http_clients[key] = http_client
+            _async_http_clients[key] = async_http_client
+            _clients[key] = client
+    return client
+
+
+def get_async_openai_client(api_key: str | None = None):
+    """
+    Return the shared AsyncOpenAI client for an API key, creating it on first use.
+
+    The underlying connection pool belongs to the event loop that first uses it,
+    so drive all async calls from one long-lived loop.
+
+    Args:
+        api_key: OpenAI API key (default: OPENAI_API_KEY)
+
+    Returns:
+        An `openai.AsyncOpenAI` instance reused across calls
+    """
+    api_key = api_key or OPENAI_API_KEY
+    key = ("openai-async", api_key or "")
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            from openai import AsyncOpenAI
+            async_http_client = _new_async_http_client()
+            client = AsyncOpenAI(api_key=api_key, base_url=OPENAI_BASE_URL, http_client=async_http_client)
+            _async_http_clients[key] = async_http_client
+            _clients[key] = client
+    return client
+
+
+def _base_url(provider: str, client) -> str:
+    if provider == "openai":
+        return str(client.base_url)
+    return GEMINI_BASE_URL
+
+
+def warm_up(provider: str, api_key: str | None = None) -> threading.Thread:
+    """
+    Open a pooled connection to the provider on a background thread.
+
+    The request only establishes TCP+TLS; its response (usually 404) is ignored.
+    The connection then stays in the keep-alive pool for the first real turn.
+
+    Args:
+        provider: 'openai' or 'gemini'
+        api_key: API key identifying the client to warm
+
+    Returns:
+        The started daemon thread
+    """
+    if provider == "openai":
+        client = get_openai_client(api_key)
+        key = ("openai", api_key or OPENAI_API_KEY or "")
+    else:
+        client = get_gemini_client(api_key)
+        key = ("gemini", api_key or GEMINI_API_KEY or "")
+    import httpx
+    http_client = _http_clients[key]
+    url = _base_url(provider, client)
+
+    def _warm() -> None:
+        try:
+            http_client.head(url)
+        except httpx.HTTPError:
+            pass
+
+    thread = threading.Thread(target=_warm, name=f"warm-{provider}", daemon=True)
+    thread.start()
+    return thread
+
+
+async def awarm_up(provider: str, api_key: str | None = None) -> None:
+    """
+    Open a pooled connection for the async client of a provider.
+
+    Run it as a task on the loop that will serve the requests; like `warm_up`,
+    the response is ignored.
+
+    Args:
+        provider: 'openai' or 'gemini'
+        api_key: API key identifying the client to warm
+    """
+    if provider == "openai":
+        client = get_async_openai_client(api_key)
+        key = ("openai-async", api_key or OPENAI_API_KEY or "")
+    else:
+        client = get_gemini_client(api_key)
+        key = ("gemini", api_key or GEMINI_API_KEY or "")
+    import httpx
+    try:
+        await _async_http_clients[key].head(_base_url(provider, client))
+    except httpx.HTTPError:
+        pass
+
+
+def close_all() -> None:
+    """Close every pooled sync HTTP connection and forget the cached clients."""
+    with _lock:
+        for http_client in _http_clients.values():
+            http_client.close()
+        _http_clients.clear()
+        _async_http_clients.clear()
+        _clients.clear()
+
+
+async def aclose_all() -> None:
+    """Close every pooled async HTTP connection, then the sync ones."""
+    with _lock:
+        async_http_clients = list(_async_http_clients.values())
+    for async_http_client in async_http_clients:
+        await async_http_client.aclose()
+    close_all()
@@ -0,0 +1,132 @@
+"""
+Rolling summary of truncated conversation turns.
+
+Instead of forgetting the turns that truncation drops, the compactor folds them
+into a running summary kept right after the system prompt. Each update sends
+only the current summary plus the newly evicted turns to a cheap model, so the
+summary grows incrementally instead of being regenerated. Updates run as
+background tasks after the reply has been shown, off the critical path.
+"""
+
+import asyncio
+from typing import Callable
+
+from .async_llm_client import acall_gemini, acreate_chat_completion
+from .config import P1_SUMMARY_MAX_TOKENS
+from .conversation import Conversation
+from .cost import estimate_cost
+
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Update the current summary with the new messages below. Keep every fact, name, number, "
+    "preference and decision the user may refer to later; drop pleasantries. "
+    "Reply with the updated summary only, in at most {max_words} words."
+)
+
+
+def _format_turns(messages: list[dict[str, str]]) -> str:
+    return "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+
+
+class Compactor:
+    """
+    Folds evicted messages into a conversation's running summary in the background.
+
+    Attributes:
+        summary: Current summary text ('' until the first fold completes)
+        calls: Number of summary requests made
+        cost_usd: Estimated cost of those requests
+        on_summary: Called after each fold replaces the conversation's summary
+    """
+
+    def __init__(self, provider: str, model: str, max_tokens: int = P1_SUMMARY_MAX_TOKENS):
+        self.provider = provider
+        self.model = model
+        self.max_tokens = max_tokens
+        self.summary = ""
+        self.calls = 0
+        self.cost_usd = 0.0
+        self.on_summary: Callable[[], None] | None = None
+        self._pending: list[dict[str, str]] = []
+        self._lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def busy(self) -> bool:
+        """Whether a fold is queued or running."""
+        return bool(self._tasks)
+
+    def adopt(self, conversation: Conversation) -> None:
+        """Continue from the summary already pinned in `conversation` (a resumed session)."""
+        if conversation.has_summary:
+            self.summary = conversation[conversation.pinned - 1]["content"].removeprefix(SUMMARY_PREFIX)
+
+    def schedule(self, conversation: Conversation, evicted: list[dict[str, str]]) -> None:
+        """
+        Queue evicted messages and start a background fold on the running loop.
+
+        Folds run one at a time; evictions that arrive while one is running are
+        picked up by the next.
+        """
+        if not evicted:
+            return
+        self._pending.extend(evicted)
+        task = asyncio.create_task(self._fold(conversation))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, conversation: Conversation) -> None:
+        async with self._lock:
+            if not self._pending:
+                return
+            evicted, self._pending = self._pending, []
+            instructions = SUMMARY_INSTRUCTIONS.format(max_words=int(self.max_tokens * 0.75))
+            prompt = (
+                f"Current summary:\n{self.summary or '(empty)'}\n\n"
+                f"New messages:\n{_format_turns(evicted)}"
+            )
+            try:
+                if self.provider == "openai":
+                    result = await acreate_chat_completion(
+                        [{"role": "system", "content": instructions}, {"role": "user", "content": prompt}],
+                        model=self.model,
+                        temperature=0.0,
+                        max_tokens=self.max_tokens,
+                    )
+                else:
+                    result = await acall_gemini(
+                        None,
+                        self.model,
+                        [{"role": "user", "content": f"{instructions}\n\n{prompt}"}],
+                        max_tokens=self.max_tokens,
+                        temperature=0.0,
+                    )
+            except Exception:
+                result = None
+            if result is None or not result.text.strip():
+                # Keep the turns so the next fold retries them.
+                self._pending = evicted + self._pending
+                return
+            self.calls += 1
+            if not result.coalesced:
+                try:
+                    self.cost_usd += estimate_cost(
+                        self.model, result.prompt_tokens or 0, result.completion_tokens or 0, result.cached_tokens
+                    )
+                except ValueError:
+                    pass
+            self.summary = result.text.strip()
+            conversation.set_summary("system", SUMMARY_PREFIX + self.summary)
+            if self.on_summary is not None:
+                self.on_summary()
+
+    async def drain(self) -> None:
+        """Wait for any in-flight folds (used on exit)."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def report(self) -> str:
+        return f"[summary] calls={self.calls} usd={self.cost_usd:.6f}"
@@ -0,0 +1,346 @@
+"""
+Side-by-side compare mode for the CLI.
+
+`python -m src.p1_chatbot.cli --compare [MODEL ...]` sends every user turn to
+several models at once (default: one per provider with an API key). Each
+model is a lane with its own history, context budget and truncation, so it
+sees exactly what a single-model chat with it would. The lanes run
+concurrently on one event loop, so a turn takes as long as its slowest model.
+On a terminal the replies stream side by side, each into its own column
+(the live view shows the latest lines that fit the screen); once all are in,
+the full columns are printed with each model's time-to-first-token, total
+latency, tokens and cost. When stdout is not a terminal, each reply is
+printed as soon as its model finishes instead.
+
+Every lane's turn is also recorded as a metrics trace (with `compare` set), so
+`P1_TRACE_PATH` collects per-model latency and cost on your own prompts.
+Compare mode neither saves sessions nor uses the response cache: every reply
+is a fresh request.
+"""
+
+import asyncio
+import shutil
+import sys
+import textwrap
+import time
+from itertools import zip_longest
+from typing import Callable, NamedTuple
+
+from .cli import interruptible, new_conversation, truncate_messages
+from .clients import aclose_all
+from .config import P1_MODEL, P1_STREAM, P1_TEMPERATURE
+from .conversation import Conversation
+from .cost import estimate_cost, has_pricing
+from .deadline import remaining, turn_deadline
+from .llm_client import ChatResult, available_providers
+from .metrics import METRICS, export as export_metrics
+from .models import ContextBudget, get_model, output_limit
+from .router import Backend
+from .startup import initialize
+
+COLUMN_GAP = 3
+MIN_COLUMN_WIDTH = 24
+# Seconds between redraws of the live columns
+REDRAW_INTERVAL = 0.05
+
+
+class LaneReply(NamedTuple):
+    """One model's answer to a turn (text is empty and error set if it failed)."""
+    text: str
+    ttft: float | None
+    seconds: float
+    prompt_tokens: int
+    completion_tokens: int
+    usd: float
+    error: str | None = None
+    cut_off: bool = False
+
+
+class Lane:
+    """
+    One model in compare mode.
+
+    Attributes:
+        backend: Provider/model the lane's requests go to
+        budget: The lane's context window and output reservation
+        conversation: The lane's own history (set on the first turn)
+        state: Progress of the current turn, shown in the column header
+        parts: Text streamed so far in the current turn
+    """
+
+    def __init__(self, provider: str, model: str, ready):
+        self.backend = Backend(provider, model, output_limit(model), ready)
+        self.budget = ContextBudget(model)
+        self.conversation: Conversation | None = None
+        self.state = "waiting"
+        self.parts: list[str] = []
+        self.turns = 0
+        self.errors = 0
+        self.usd = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies: list[float] = []
+
+    @property
+    def name(self) -> str:
+        return self.backend.name
+
+    async def ask(self, user_input: str, on_progress: Callable[[], None]) -> LaneReply:
+        """Run one turn on this lane's history; errors are returned, not raised."""
+        provider, model = self.backend.provider, self.backend.model
+        conversation = self.conversation
+        parts = self.parts = []
+        self.state = "waiting"
+        start = time.perf_counter()
+        first_token_at = None
+
+        def on_token(text: str) -> None:
+            nonlocal first_token_at
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(text)
+            self.state = "streaming"
+            on_progress()
+
+        with METRICS.trace(provider=provider, model=model, compare=True) as trace:
+            conversation.append("user", user_input)
+            cut_off = False
+            try:
+                with METRICS.span("truncate"):
+                    truncate_messages(conversation, self.budget)
+                with turn_deadline():
+                    try:
+                        async with asyncio.timeout(remaining()):
+                            result = await self.backend.call(conversation.messages, on_token if P1_STREAM else None, P1_TEMPERATURE)
+                    except TimeoutError:
+                        METRICS.inc("p1_deadline_exceeded_total", outcome="partial" if parts else "none")
+                        if not parts:
+                            raise
+                        result, cut_off = ChatResult("".join(parts), None, None), True
+                if not result.text and result.prompt_tokens is None:
+                    raise RuntimeError("no reply")
+            except asyncio.CancelledError:
+                conversation.pop()
+                raise
+            except Exception as e:
+                METRICS.error(provider, e)
+                trace.attrs["error"] = type(e).__name__
+                conversation.pop()
+                self.errors += 1
+                self.state = "failed"
+                on_progress()
+                return LaneReply("", None, time.perf_counter() - start, 0, 0, 0.0, f"{type(e).__name__}: {e}" if str(e) else type(e).__name__)
+            seconds = time.perf_counter() - start
+            prompt_tokens = result.prompt_tokens or 0
+            completion_tokens = result.completion_tokens or 0
+            usd = 0.0
+            if has_pricing(model) and not result.coalesced:
+                usd = estimate_cost(model, prompt_tokens, completion_tokens, result.cached_tokens)
+            conversation.append("assistant", result.text)
+            self.budget.observe(result.completion_tokens)
+            self.turns += 1
+            self.usd += usd
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.latencies.append(seconds)
+            self.state = f"done {seconds * 1000:.0f} ms"
+            on_progress()
+            ttft = first_token_at - start if first_token_at is not None else None
+            trace.attrs.update(
+                backend=self.name,
+                prompt_tokens=prompt_tokens,
+                cached_tokens=result.cached_tokens,
+                completion_tokens=completion_tokens,
+                usd=round(usd, 8),
+                ttft_ms=round(ttft * 1000, 1) if ttft is not None else None,
+                deadline_exceeded=cut_off,
+            )
+        return LaneReply(result.text, ttft, seconds, prompt_tokens, completion_tokens, usd, cut_off=cut_off)
+
+    def report(self) -> str:
+        mean_ms = sum(self.latencies) / len(self.latencies) * 1000 if self.latencies else 0.0
+        max_ms = max(self.latencies) * 1000 if self.latencies else 0.0
+        return (
+            f"{self.name:40} turns={self.turns} errors={self.errors} mean_ms={mean_ms:.0f} max_ms={max_ms:.0f} "
+            f"prompt_tokens={self.prompt_tokens} completion_tokens={self.completion_tokens} usd={self.usd:.6f}"
+        )
+
+
+def parse_model(value: str) -> tuple[str, str]:
+    """
+    (provider, model) for 'provider:model', or for a bare model name in the registry.
+
+    Raises:
+        ValueError: If the provider is unknown or cannot be inferred
+    """
+    provider, sep, model = value.partition(":")
+    if not sep:
+        spec = get_model(value)
+        if spec is None:
+            raise ValueError(f"Unknown model {value!r}; use provider:model")
+        return spec.provider, value
+    if provider not in ("openai", "gemini") or not model:
+        raise ValueError(f"Expected openai:<model> or gemini:<model>, not {value!r}")
+    return provider, model
+
+
+def render_columns(columns: list[tuple[str, str]], width: int) -> str:
+    """Lay out (header, text) pairs as side-by-side columns wrapped to fit `width`."""
+    column_width = max(MIN_COLUMN_WIDTH, (width - COLUMN_GAP * (len(columns) - 1)) // len(columns))
+    cells = []
+    for header, text in columns:
+        lines = [header[:column_width], "-" * min(column_width, len(header))]
+        for paragraph in text.splitlines() or [""]:
+            lines.extend(textwrap.wrap(paragraph, column_width) or [""])
+        cells.append(lines)
+    gap = " " * COLUMN_GAP
+    return "\n".join(gap.join(cell.ljust(column_width) for cell in row).rstrip() for row in zip_longest(*cells, fillvalue=""))
+
+
+def render_stats(lanes: list[Lane], replies: list[LaneReply]) -> str:
+    lines = [f"{'model':40} {'ttft_ms':>8} {'total_ms':>9} {'in_tok':>7} {'out_tok':>8} {'usd':>10}"]
+    for lane, reply in zip(lanes, replies):
+        if reply.error is not None:
+            lines.append(f"{lane.name:40} failed after {reply.seconds * 1000:.0f} ms: {reply.error}")
+            continue
+        ttft = f"{reply.ttft * 1000:.0f}" if reply.ttft is not None else "n/a"
+        note = "  (cut off at the turn deadline)" if reply.cut_off else ""
+        lines.append(
+            f"{lane.name:40} {ttft:>8} {reply.seconds * 1000:9.0f} {reply.prompt_tokens:7} "
+            f"{reply.completion_tokens:8} {reply.usd:10.6f}{note}"
+        )
+    return "\n".join(lines)
+
+
+class LiveView:
+    """
+    Per-lane columns redrawn in place while the replies stream (on a terminal).
+
+    At most every REDRAW_INTERVAL, the region drawn last time is cleared and
+    the columns are drawn again, keeping only their latest lines that fit on
+    the screen. Without a terminal nothing is redrawn; `finished` prints each
+    reply once its lane is done.
+    """
+
+    def __init__(self, lanes: list[Lane]):
+        self.lanes = lanes
+        self.live = sys.stdout.isatty()
+        size = shutil.get_terminal_size()
+        self.width, self.height = size.columns, size.lines
+        self.drawn_lines = 0
+        self.drawn_at = 0.0
+
+    def columns(self) -> list[tuple[str, str]]:
+        return [(f"{lane.name} [{lane.state}]", "".join(lane.parts)) for lane in self.lanes]
+
+    def draw(self, force: bool = False) -> None:
+        if not self.live:
+            return
+        now = time.perf_counter()
+        if not force and now - self.drawn_at < REDRAW_INTERVAL:
+            return
+        self.drawn_at = now
+        lines = render_columns(self.columns(), self.width).splitlines()
+        if len(lines) > self.height - 2:
+            lines = lines[:2] + lines[-(self.height - 4):]
+        self.clear()
+        sys.stdout.write("".join(line[:self.width - 1] + "\n" for line in lines))
+        sys.stdout.flush()
+        self.drawn_lines = len(lines)
+
+    def clear(self) -> None:
+        """Erase the live region (cursor back to its first line)."""
+        if self.drawn_lines:
+            sys.stdout.write(f"\033[{self.drawn_lines}F\033[J")
+            self.drawn_lines = 0
+
+    def finished(self, lane: Lane, reply: LaneReply) -> None:
+        if self.live:
+            self.draw(force=True)
+            return
+        print(f"{lane.name} ({reply.seconds * 1000:.0f} ms):")
+        print(reply.text if reply.error is None else f"[error] {reply.error}")
+        print()
+
+
+async def acompare(models: list[str]) -> None:
+    """
+    Chat with several models at once, one lane per model.
+
+    Args:
+        models: 'provider:model' (or registry model) names; empty for one per available provider
+    """
+    usable = available_providers()
+    try:
+        if models:
+            specs = [parse_model(m) for m in models]
+        else:
+            specs = [(p, P1_MODEL if p == "openai" else m) for p, m in usable]
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    missing = sorted({p for p, _ in specs} - {p for p, _ in usable})
+    if missing:
+        print(f"Error: no API key (or SDK) for {', '.join(missing)}")
+        return
+    if len(specs) < 2:
+        print("Compare mode needs at least two models: set both API keys or name the models, e.g. --compare gpt-4o-mini gpt-4.1-nano")
+        return
+
+    readies = {}
+    for provider, model in specs:
+        if provider not in readies:
+            readies[provider] = initialize(provider, model)
+    lanes = [Lane(provider, model, readies[provider]) for provider, model in specs]
+    print("Comparing " + " | ".join(lane.name for lane in lanes))
+    print("Type 'quit', 'exit', or '/quit' to end the conversation.\n")
+
+    while True:
+        user_input = (await asyncio.to_thread(input, "You: ")).strip()
+        if user_input.lower() in ["quit", "exit", "/quit"]:
+            print("Goodbye!")
+            break
+        if not user_input:
+            continue
+        if lanes[0].conversation is None:
+            try:
+                for ready in readies.values():
+                    await asyncio.wrap_future(ready)
+                for lane in lanes:
+                    lane.conversation = await asyncio.to_thread(new_conversation, lane.backend.model)
+            except Exception as e:
+                print(f"Error initializing LLM client: {e}")
+                return
+
+        view = LiveView(lanes)
+
+        async def ask(lane: Lane) -> LaneReply:
+            reply = await lane.ask(user_input, view.draw)
+            view.finished(lane, reply)
+            return reply
+
+        start = time.perf_counter()
+        try:
+            replies = await interruptible(asyncio.gather(*(ask(lane) for lane in lanes)))
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
+            view.clear()
+            print("[interrupted] requests cancelled; the message was not added to any history")
+            continue
+        wall = time.perf_counter() - start
+        if view.live:
+            # The live view may only have shown the end of long replies.
+            view.clear()
+            columns = [(lane.name, reply.text if reply.error is None else f"[error] {reply.error}") for lane, reply in zip(lanes, replies)]
+            print(render_columns(columns, view.width))
+            print()
+        print(render_stats(lanes, replies))
+        slowest = max(zip(lanes, replies), key=lambda pair: pair[1].seconds)[0]
+        print(f"[compare] wall_ms={wall * 1000:.0f} slowest={slowest.name} turn_usd={sum(r.usd for r in replies):.6f}\n")
+        export_metrics()
+
+    for lane in lanes:
+        print(lane.report())
+    export_metrics()
+    await aclose_all()
@@ -7,12 +7,108 @@ load_dotenv()
 P1_MODEL = os.getenv("P1_MODEL", "gpt-4o-mini")
 P1_TEMPERATURE = float(os.getenv("P1_TEMPERATURE", "0.1"))
 P1_MAX_TOKENS = int(os.getenv("P1_MAX_TOKENS", "500"))
-EXERCISE_MAX_CONTEXT_TOKENS = 4096
+P1_STREAM = os.getenv("P1_STREAM", "true").lower() in ("1", "true", "yes")
+# Context budget of the exercise; each model's window from the registry is
+# capped at this (0 uses the full window)
+EXERCISE_MAX_CONTEXT_TOKENS = int(os.getenv("P1_MAX_CONTEXT_TOKENS", "4096"))
 RESERVED_OUTPUT_TOKENS = 500
+# Truncation triggers this far below the window minus the output reservation
+TRUNCATE_MARGIN_TOKENS = 96
 TRUNCATE_THRESHOLD_TOKENS = 3500
 
+# Model registry overrides/additions (context window, output limit, tokenizer, prices)
+P1_MODELS_PATH = os.getenv("P1_MODELS_PATH", ".p1_models.json")
+# Completion-length percentile the per-session output reservation follows
+P1_OUTPUT_PERCENTILE = float(os.getenv("P1_OUTPUT_PERCENTILE", "95"))
+
+# Per-model tokens-per-byte ratios fitted by `python -m src.p1_chatbot.calibrate`
+P1_TOKEN_CALIBRATION_PATH = os.getenv("P1_TOKEN_CALIBRATION_PATH", ".p1_token_calibration.json")
+
+# Rolling summary of truncated turns, kept right after the system prompt.
+# Off by default: every fold is an extra (billed) request to P1_SUMMARY_MODEL.
+P1_SUMMARY = os.getenv("P1_SUMMARY", "false").lower() in ("1", "true", "yes")
+P1_SUMMARY_MODEL = os.getenv("P1_SUMMARY_MODEL", "")
+P1_SUMMARY_MAX_TOKENS = int(os.getenv("P1_SUMMARY_MAX_TOKENS", "400"))
+
+# Send the most relevant earlier turns plus the latest messages instead of the
+# whole retained history
+P1_MEMORY = os.getenv("P1_MEMORY", "false").lower() in ("1", "true", "yes")
+P1_MEMORY_BUDGET_TOKENS = int(os.getenv("P1_MEMORY_BUDGET_TOKENS", "1500"))
+P1_MEMORY_TOP_K = int(os.getenv("P1_MEMORY_TOP_K", "4"))
+P1_MEMORY_RECENT_MESSAGES = int(os.getenv("P1_MEMORY_RECENT_MESSAGES", "4"))
+P1_MEMORY_DIM = int(os.getenv("P1_MEMORY_DIM", "512"))
+
+# Pooled HTTP connections shared by every provider call
+P1_HTTP_MAX_CONNECTIONS = int(os.getenv("P1_HTTP_MAX_CONNECTIONS", "20"))
+P1_HTTP_KEEPALIVE_SECONDS = float(os.getenv("P1_HTTP_KEEPALIVE_SECONDS", "120"))
+P1_HTTP_TIMEOUT_SECONDS = float(os.getenv("P1_HTTP_TIMEOUT_SECONDS", "60"))
+# Upper bound on concurrent upstream requests from the async provider layer
+P1_MAX_IN_FLIGHT = int(os.getenv("P1_MAX_IN_FLIGHT", "16"))
+# Wall-clock budget for one turn: request time plus retry backoff across every
+# attempt and backend (0 disables)
+P1_TURN_TIMEOUT_SECONDS = float(os.getenv("P1_TURN_TIMEOUT_SECONDS", "60"))
+
+# Record provider exchanges to, or replay them from, a cassette file (see `cassette`)
+P1_CASSETTE = os.getenv("P1_CASSETTE", "")
+P1_CASSETTE_MODE = os.getenv("P1_CASSETTE_MODE", "replay").lower()
+# Replay timing: 1 as recorded, 10 ten times faster, 0 without delays
+P1_CASSETTE_SPEED = float(os.getenv("P1_CASSETTE_SPEED", "1"))
+# Answer only exact request matches (otherwise the next exchange for the endpoint)
+P1_CASSETTE_STRICT = os.getenv("P1_CASSETTE_STRICT", "false").lower() in ("1", "true", "yes")
+
+# Client-side rate limiting (per provider/model; refined from x-ratelimit-* headers)
+P1_RATE_LIMIT = os.getenv("P1_RATE_LIMIT", "true").lower() in ("1", "true", "yes")
+P1_OPENAI_RPM = float(os.getenv("P1_OPENAI_RPM", "500"))
+P1_OPENAI_TPM = float(os.getenv("P1_OPENAI_TPM", "200000"))
+P1_GEMINI_RPM = float(os.getenv("P1_GEMINI_RPM", "4000"))
+P1_GEMINI_TPM = float(os.getenv("P1_GEMINI_TPM", "4000000"))
+
+# Identical concurrent non-streaming completions share one upstream request
+P1_SINGLE_FLIGHT = os.getenv("P1_SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+
+# Routing across both providers when both keys are set: hedge slow requests,
+# fail over on errors
+P1_ROUTER = os.getenv("P1_ROUTER", "true").lower() in ("1", "true", "yes")
+P1_HEDGE = os.getenv("P1_HEDGE", "true").lower() in ("1", "true", "yes")
+P1_HEDGE_PERCENTILE = float(os.getenv("P1_HEDGE_PERCENTILE", "95"))
+P1_HEDGE_MIN_MS = float(os.getenv("P1_HEDGE_MIN_MS", "300"))
+P1_HEDGE_DEFAULT_MS = float(os.getenv("P1_HEDGE_DEFAULT_MS", "2000"))
+P1_FAILOVER_ERRORS = int(os.getenv("P1_FAILOVER_ERRORS", "3"))
+P1_FAILOVER_COOLDOWN_SECONDS = float(os.getenv("P1_FAILOVER_COOLDOWN_SECONDS", "60"))
+
+# Response cache (memory LRU in front of a SQLite file)
+P1_CACHE = os.getenv("P1_CACHE", "true").lower() in ("1", "true", "yes")
+P1_CACHE_PATH = os.getenv("P1_CACHE_PATH", ".p1_cache.sqlite3")
+P1_CACHE_TTL_SECONDS = float(os.getenv("P1_CACHE_TTL_SECONDS", "86400"))
+P1_CACHE_MAX_ENTRIES = int(os.getenv("P1_CACHE_MAX_ENTRIES", "10000"))
+P1_CACHE_MEMORY_ENTRIES = int(os.getenv("P1_CACHE_MEMORY_ENTRIES", "256"))
+P1_CACHE_MAX_TEMPERATURE = float(os.getenv("P1_CACHE_MAX_TEMPERATURE", "0.2"))
+
+# Persistent sessions: one append-only JSONL log (+ small JSON index) per session
+P1_SESSIONS = os.getenv("P1_SESSIONS", "true").lower() in ("1", "true", "yes")
+P1_SESSION_DIR = os.getenv("P1_SESSION_DIR", ".p1_sessions")
+
+# HTTP/SSE server mode: many sessions per process, idle ones evicted to disk
+P1_SERVER_HOST = os.getenv("P1_SERVER_HOST", "127.0.0.1")
+P1_SERVER_PORT = int(os.getenv("P1_SERVER_PORT", "8080"))
+P1_SERVER_MEMORY_MB = float(os.getenv("P1_SERVER_MEMORY_MB", "256"))
+P1_SERVER_MAX_PENDING = int(os.getenv("P1_SERVER_MAX_PENDING", "64"))
+
+# Hot-path metrics: stage latency histograms and counters, optional exports
+P1_METRICS = os.getenv("P1_METRICS", "true").lower() in ("1", "true", "yes")
+P1_TRACE_PATH = os.getenv("P1_TRACE_PATH", "")
+P1_METRICS_PATH = os.getenv("P1_METRICS_PATH", "")
+P1_METRICS_PORT = int(os.getenv("P1_METRICS_PORT", "0"))
+
+# Target for the time from launch until the "You:" prompt (checked by --profile-startup)
+P1_STARTUP_BUDGET_MS = float(os.getenv("P1_STARTUP_BUDGET_MS", "250"))
+
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Provider endpoints (point these at a local stand-in server for offline runs)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/")
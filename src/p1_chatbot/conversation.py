@@ -0,0 +1,168 @@
+"""
+Conversation history with incremental token accounting.
+
+Each message is counted exactly once, when it is appended. The conversation
+keeps the per-message counts alongside the messages and a running total, so
+checking the context budget or dropping old messages never re-tokenizes the
+history. Counts already known (e.g. from a saved session) can be passed in,
+so a resumed history is not tokenized at all. Messages are `messages.Message`
+objects, which carry their own counts and cached provider wire forms.
+
+New messages get the cheap byte-length estimate from `tokens`, with lower and
+upper bounds; `fits` only tokenizes (the still estimated messages, once) when
+the budget lies between the bounds of the whole history.
+"""
+
+from .messages import Message
+from .tokens import TOKENS_PER_REPLY, count_message_tokens, estimate_message_tokens, has_exact_tokenizer
+
+
+class Conversation:
+    """
+    Ordered message history that caches a token count per message.
+
+    Attributes:
+        model: Model name used for token counting
+        messages: Messages in the order they are sent to the provider
+        pinned: Number of leading messages (the system prompt, then the running
+            summary once there is one) truncation never removes
+        has_summary: Whether the last pinned message is the running summary
+        exact_counts: Messages tokenized because a budget decision needed it
+        content_chars: Running total of the messages' text length
+    """
+
+    def __init__(self, model: str, messages: list[dict[str, str]] | None = None):
+        self.model = model
+        self.pinned = 0
+        self.has_summary = False
+        self.exact_counts = 0
+        self.content_chars = 0
+        self.messages: list[Message] = []
+        self._total_tokens = 0
+        self._total_lower = 0
+        self._total_upper = 0
+        for message in messages or []:
+            self.append(message["role"], message["content"])
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __getitem__(self, index: int) -> Message:
+        return self.messages[index]
+
+    @property
+    def token_count(self) -> int:
+        """Estimated input tokens for the whole history, same as `count_tokens` once exact."""
+        return self._total_tokens + TOKENS_PER_REPLY
+
+    def token_bounds(self) -> tuple[int, int]:
+        """Lower and upper bound on `token_count`."""
+        return self._total_lower + TOKENS_PER_REPLY, self._total_upper + TOKENS_PER_REPLY
+
+    def message_tokens(self, index: int) -> int:
+        """Return the cached token count of the message at `index`."""
+        return self.messages[index].counts[0]
+
+    def is_exact(self, index: int) -> bool:
+        """Whether the count of the message at `index` is exact rather than estimated."""
+        return self.messages[index].counts[3]
+
+    def _counts(self, message: Message, tokens: int | None) -> tuple[int, int, int, bool]:
+        if tokens is not None:
+            return tokens, tokens, tokens, True
+        return (*estimate_message_tokens(message, self.model), False)
+
+    def _add(self, counts: tuple[int, int, int, bool], sign: int = 1) -> None:
+        self._total_tokens += sign * counts[0]
+        self._total_lower += sign * counts[1]
+        self._total_upper += sign * counts[2]
+
+    def append(self, role: str, content: str, tokens: int | None = None) -> Message:
+        """
+        Append a message, estimating its tokens once.
+
+        Args:
+            role: Message role ('system', 'user', 'assistant' or 'model')
+            content: Message text
+            tokens: Known exact token count for `self.model` (default: estimate it)
+
+        Returns:
+            The appended message
+        """
+        message = Message(role, content)
+        message.counts = self._counts(message, tokens)
+        self.messages.append(message)
+        self._add(message.counts)
+        self.content_chars += len(content)
+        return message
+
+    def pop(self, index: int = -1) -> Message:
+        """
+        Remove and return the message at `index`, subtracting its cached count.
+
+        Args:
+            index: Position of the message to remove (default: last)
+
+        Returns:
+            The removed message
+        """
+        message = self.messages.pop(index)
+        self._add(message.counts, -1)
+        self.content_chars -= len(message.content)
+        return message
+
+    def set_summary(self, role: str, content: str, tokens: int | None = None) -> None:
+        """
+        Insert or replace the running summary right after the system prompt.
+
+        The summary is pinned, so truncation never removes it.
+
+        Args:
+            role: Role the summary is sent with (normally 'system')
+            content: Summary text
+            tokens: Known exact token count for `self.model` (default: estimate it)
+        """
+        message = Message(role, content)
+        message.counts = self._counts(message, tokens)
+        if self.has_summary:
+            index = self.pinned - 1
+            self._add(self.messages[index].counts, -1)
+            self.content_chars -= len(self.messages[index].content)
+            self.messages[index] = message
+        else:
+            self.messages.insert(self.pinned, message)
+            self.pinned += 1
+            self.has_summary = True
+        self._add(message.counts)
+        self.content_chars += len(content)
+
+    def count_exactly(self) -> None:
+        """Replace every estimated count with the tokenizer's count (no-op without an exact tokenizer)."""
+        if not has_exact_tokenizer(self.model):
+            return
+        for message in self.messages:
+            if not message.counts[3]:
+                tokens = count_message_tokens(message, self.model)
+                self._add(message.counts, -1)
+                message.counts = (tokens, tokens, tokens, True)
+                self._add(message.counts)
+                self.exact_counts += 1
+
+    def fits(self, limit: int) -> bool:
+        """
+        Whether `token_count` is at most `limit`.
+
+        Decided from the bounds when they are on one side of `limit`; otherwise
+        the estimated messages are tokenized first. Without an exact tokenizer
+        (Gemini) the calibrated estimate decides.
+        """
+        lower, upper = self.token_bounds()
+        if upper <= limit:
+            return True
+        if lower > limit:
+            return False
+        self.count_exactly()
+        return self.token_count <= limit
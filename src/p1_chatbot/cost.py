@@ -1,27 +1,62 @@
 """
 Cost estimation utilities for chatbot API usage.
+
+Prices come from the model registry (`models.py`), including models added or
+repriced in `P1_MODELS_PATH`.
 """
 from typing import Dict, Tuple
 
+from .models import BUILTIN_MODELS, get_model
+
 
+# Built-in prices, kept for callers that read the tables directly.
 MODEL_PRICING_USD_PER_1K: Dict[str, Tuple[float, float]] = {
-    "gpt-4o-mini": (0.0005, 0.0015),
-    "gemini-2.5-flash-lite": (0.00025, 0.0005),
+    name: (spec.input_usd_per_1k, spec.output_usd_per_1k) for name, spec in BUILTIN_MODELS.items()
+}
+
+# Discounted price for prompt tokens served from the provider's prompt cache.
+# Models missing here are billed at the full input rate.
+MODEL_CACHED_INPUT_USD_PER_1K: Dict[str, float] = {
+    name: spec.cached_input_usd_per_1k for name, spec in BUILTIN_MODELS.items() if spec.cached_input_usd_per_1k is not None
 }
 
-def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+
+def model_prices(model: str) -> Tuple[float, float, float]:
+    """
+    (input, output, cached input) USD per 1K tokens for a model.
+
+    Raises:
+        ValueError: If the model is not in the registry
+    """
+    spec = get_model(model)
+    if spec is None:
+        raise ValueError(f"Model '{model}' not found in pricing table.")
+    cached = spec.cached_input_usd_per_1k
+    return spec.input_usd_per_1k, spec.output_usd_per_1k, cached if cached is not None else spec.input_usd_per_1k
+
+
+def has_pricing(model: str) -> bool:
+    return get_model(model) is not None
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0) -> float:
     """
     Estimate the USD cost for a model call.
     Args:
         model: Model name (str)
-        input_tokens: Number of prompt tokens (int)
+        input_tokens: Number of prompt tokens, including cached ones (int)
         output_tokens: Number of completion tokens (int)
+        cached_input_tokens: Prompt tokens served from the provider's prompt cache (int)
     Returns:
         Estimated cost in USD (float)
     Raises:
-        ValueError: If model is not in MODEL_PRICING_USD_PER_1K
+        ValueError: If model is not in the model registry
     """
-    if model not in MODEL_PRICING_USD_PER_1K:
-        raise ValueError(f"Model '{model}' not found in pricing table.")
-    input_per_1k, output_per_1k = MODEL_PRICING_USD_PER_1K[model]
-    return (input_tokens / 1000) * input_per_1k + (output_tokens / 1000) * output_per_1k
+    input_per_1k, output_per_1k, cached_per_1k = model_prices(model)
+    cached_input_tokens = min(cached_input_tokens, input_tokens)
+    uncached_input_tokens = input_tokens - cached_input_tokens
+    return (
+        (uncached_input_tokens / 1000) * input_per_1k
+        + (cached_input_tokens / 1000) * cached_per_1k
+        + (output_tokens / 1000) * output_per_1k
+    )
@@ -0,0 +1,68 @@
+"""
+Per-turn deadlines.
+
+A turn gets one wall-clock deadline (`P1_TURN_TIMEOUT_SECONDS`), set around
+everything that serves it with `turn_deadline()` and kept in a context
+variable, so it reaches every provider call underneath, including the tasks
+the router starts (they copy the context). Provider calls pass the time left
+to the SDK as the request timeout (`timeout_option`), retries stop backing off
+once the sleep would run past the deadline (`check_backoff`), and the router
+stops waiting at the deadline itself, so rate-limit waits and stalled streams
+are bounded too.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from .config import P1_TURN_TIMEOUT_SECONDS
+
+# Shortest request timeout handed to an SDK; a request at the deadline fails fast
+MIN_REQUEST_TIMEOUT = 0.05
+
+_deadline: ContextVar[float | None] = ContextVar("p1_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The turn ran out of time before a reply (or a retry) could finish."""
+
+
+@contextmanager
+def turn_deadline(seconds: float | None = P1_TURN_TIMEOUT_SECONDS) -> Iterator[float | None]:
+    """
+    Give the code in the block `seconds` to finish (None or 0: no deadline).
+
+    Yields:
+        The deadline on the `time.monotonic()` clock, or None
+    """
+    deadline = time.monotonic() + seconds if seconds else None
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current deadline (negative once passed), or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def timeout_option() -> dict[str, float]:
+    """SDK `timeout=` keyword for the next request: the time left, or nothing (the client default)."""
+    left = remaining()
+    return {} if left is None else {"timeout": max(MIN_REQUEST_TIMEOUT, left)}
+
+
+def check_backoff(delay: float) -> None:
+    """
+    Raise if sleeping `delay` seconds before a retry would reach the deadline.
+
+    Raises:
+        DeadlineExceeded: If the retry could not start in time
+    """
+    left = remaining()
+    if left is not None and delay >= left:
+        raise DeadlineExceeded(f"Turn deadline reached; not retrying after {delay:.1f}s backoff ({max(0.0, left):.1f}s left)")
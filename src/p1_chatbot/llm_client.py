@@ -1,156 +1,343 @@
+import importlib.util
 import time
-import openai
-from openai import OpenAI
-from .config import GEMINI_API_KEY, OPENAI_API_KEY, GEMINI_MODEL, OPENAI_MODEL, RESERVED_OUTPUT_TOKENS
-import openai
-def create_chat_completion(messages: list[dict[str, str]], *, model: str, temperature: float, max_tokens: int) -> tuple[str, int | None, int | None]:
+from typing import TYPE_CHECKING, Callable, NamedTuple
+# The provider SDKs are imported inside the functions that use them, so
+# importing this module (and starting the CLI) never pays for the unused one.
+if TYPE_CHECKING:
+	from openai.types.chat import ChatCompletionMessageParam
+from .clients import get_gemini_client, get_openai_client
+from .messages import Message, wire_messages
+from .ratelimit import backoff_delay, error_retry_after, limited
+from .config import GEMINI_API_KEY, OPENAI_API_KEY, GEMINI_MODEL, OPENAI_MODEL
+from .deadline import check_backoff, timeout_option
+from .models import request_output_limit
+
+
+class ChatResult(NamedTuple):
+	"""
+	Assistant text plus the usage reported for it (cached_tokens is the prompt-cache hit count).
+
+	coalesced is True when the reply came from another caller's identical
+	in-flight request (see `singleflight`); its usage was already paid for.
+	"""
+	text: str
+	prompt_tokens: int | None
+	completion_tokens: int | None
+	cached_tokens: int = 0
+	coalesced: bool = False
+
+
+def openai_cached_tokens(usage) -> int:
+	"""Prompt tokens served from OpenAI's automatic prompt cache, 0 if not reported."""
+	details = getattr(usage, "prompt_tokens_details", None)
+	return (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+
+
+def gemini_cached_tokens(usage) -> int:
+	"""Prompt tokens served from Gemini's implicit context cache, 0 if not reported."""
+	return getattr(usage, "total_cached_tokens", None) or 0
+
+
+def to_openai_message(msg: dict[str, str]) -> "ChatCompletionMessageParam":
+	"""Convert a history message into the matching OpenAI message param (a plain TypedDict)."""
+	if isinstance(msg, Message):
+		return msg.wire("openai")  # type: ignore[return-value]
+	if msg["role"] == "system":
+		return {"role": "system", "content": msg["content"]}
+	elif msg["role"] == "user":
+		return {"role": "user", "content": msg["content"]}
+	elif msg["role"] == "assistant":
+		return {"role": "assistant", "content": msg["content"]}
+	else:
+		raise ValueError(f"Unknown role: {msg['role']}")
+
+def create_chat_completion(messages: list[dict[str, str]], *, model: str, temperature: float, max_tokens: int) -> ChatResult:
 	"""
 	Robust OpenAI chat completion with error handling and retries.
-	Returns (assistant_text, prompt_tokens, completion_tokens)
+	Concurrent identical calls share one request (see `singleflight`).
+	Within a turn deadline (see `deadline`), each attempt's timeout is the time
+	left and DeadlineExceeded is raised instead of backing off past it.
+	Returns ChatResult(assistant_text, prompt_tokens, completion_tokens, cached_tokens, coalesced)
 	"""
+	from .singleflight import SINGLE_FLIGHT, request_key
+	return SINGLE_FLIGHT.do(
+		request_key("openai", model, temperature, max_tokens, messages),
+		lambda: _create_chat_completion(messages, model=model, temperature=temperature, max_tokens=max_tokens),
+	)
+
+
+def _create_chat_completion(messages: list[dict[str, str]], *, model: str, temperature: float, max_tokens: int) -> ChatResult:
 	api_key = OPENAI_API_KEY
 	if not api_key:
 		print("[ERROR] OPENAI_API_KEY not set. Please add it to your .env file.")
-		return "", None, None
-	client = OpenAI(api_key=api_key)
+		return ChatResult("", None, None)
+	import openai
+	client = get_openai_client(api_key)
+	openai_messages = [to_openai_message(m) for m in messages]
 	retries = 5
-	backoff = 1
 	for attempt in range(1, retries + 1):
 		try:
-			from openai.types.chat import (
-				ChatCompletionSystemMessageParam,
-				ChatCompletionUserMessageParam,
-				ChatCompletionAssistantMessageParam,
-			)
-			def to_openai_message(msg):
-				if msg["role"] == "system":
-					return ChatCompletionSystemMessageParam(role="system", content=msg["content"])
-				elif msg["role"] == "user":
-					return ChatCompletionUserMessageParam(role="user", content=msg["content"])
-				elif msg["role"] == "assistant":
-					return ChatCompletionAssistantMessageParam(role="assistant", content=msg["content"])
-				else:
-					raise ValueError(f"Unknown role: {msg['role']}")
-			openai_messages = [to_openai_message(m) for m in messages]
-			completion = client.chat.completions.create(
-				model=model,
-				messages=openai_messages,
-				temperature=temperature,
-				max_tokens=max_tokens,
-			)
+			with limited("openai", model, messages, max_tokens) as reservation:
+				completion = client.chat.completions.create(
+					model=model,
+					messages=openai_messages,
+					temperature=temperature,
+					max_tokens=max_tokens,
+					**timeout_option(),
+				)
 			assistant_text = completion.choices[0].message.content or ""
+			cached_tokens = 0
 			if hasattr(completion, "usage") and completion.usage is not None:
 				prompt_tokens = completion.usage.prompt_tokens
 				completion_tokens = completion.usage.completion_tokens
+				cached_tokens = openai_cached_tokens(completion.usage)
+				reservation.settle(prompt_tokens, completion_tokens)
 			else:
 				from .tokens import count_tokens
 				prompt_tokens = count_tokens(messages, model)
 				completion_tokens = count_tokens([
 					{"role": "assistant", "content": assistant_text}
 				], model)
-			return assistant_text, prompt_tokens, completion_tokens
-		except openai.error.AuthenticationError: # type: ignore
+			return ChatResult(assistant_text, prompt_tokens, completion_tokens, cached_tokens)
+		except openai.AuthenticationError:
 			print("[ERROR] Invalid or missing OpenAI API key. Please set OPENAI_API_KEY in your .env file.")
-			return "", None, None
-		except openai.error.RateLimitError: # type: ignore
+			return ChatResult("", None, None)
+		except openai.RateLimitError as e:
 			if attempt < retries:
-				print(f"[Rate Limit] Retrying in {backoff}s... ({retries - attempt} retries left)")
-				time.sleep(backoff)
-				backoff *= 2
+				delay = backoff_delay(attempt, error_retry_after(e))
+				print(f"[Rate Limit] Retrying in {delay:.1f}s... ({retries - attempt} retries left)")
+				check_backoff(delay)
+				time.sleep(delay)
 			else:
 				print("[ERROR] Rate limit exceeded. Please try again later.")
-				return "", None, None
-		except (openai.error.Timeout, openai.error.APIConnectionError, openai.error.ServiceUnavailableError, openai.error.APIError) as e: # pyright: ignore[reportAttributeAccessIssue]
+				return ChatResult("", None, None)
+		except (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError) as e:
 			if attempt < retries:
-				print(f"[Network/API Error] {e}. Retrying in {backoff}s... ({retries - attempt} retries left)")
-				time.sleep(backoff)
-				backoff *= 2
+				delay = backoff_delay(attempt, error_retry_after(e))
+				print(f"[Network/API Error] {e}. Retrying in {delay:.1f}s... ({retries - attempt} retries left)")
+				check_backoff(delay)
+				time.sleep(delay)
 			else:
 				print("[ERROR] Network or API error. Please check your connection and try again later.")
-				return "", None, None
+				return ChatResult("", None, None)
 		except Exception as e:
 			print(f"[ERROR] Unexpected error: {e}")
-			return "", None, None
-	return "", None, None
+			return ChatResult("", None, None)
+	return ChatResult("", None, None)
 
 
 
 
 
-def get_llm_client():
+def _installed(module: str) -> bool:
+	try:
+		return importlib.util.find_spec(module) is not None
+	except ModuleNotFoundError:
+		return False
+
+
+def available_providers(warn: bool = True) -> list[tuple[str, str]]:
 	"""
-	Detect available API keys and return the appropriate client.
-	Priority: Gemini (default for our testing), fallback to OpenAI if only OpenAI key exists.
+	List the usable providers from the configured API keys without importing any SDK.
+	Priority: Gemini (default for our testing), then OpenAI. A provider whose key is
+	set but whose SDK is not installed is skipped (with a warning if `warn`).
+	Returns [(provider, model), ...] in priority order (may be empty)
 	"""
-	gemini_key = GEMINI_API_KEY
-	openai_key = OPENAI_API_KEY
-    
-	if gemini_key:
-		try:
-			from google import genai
-			from google.genai import types
-			client = genai.Client(api_key=gemini_key)
-			model = GEMINI_MODEL
-			return "gemini", client, model
-		except ImportError:
+	providers: list[tuple[str, str]] = []
+	if GEMINI_API_KEY:
+		if _installed("google.genai"):
+			providers.append(("gemini", GEMINI_MODEL))
+		elif warn:
 			print("Warning: google-genai not installed. Install with: pip install google-genai")
-			if not openai_key:
-				raise
-	if openai_key:
-		try:
-			from openai import OpenAI
-			client = OpenAI(api_key=openai_key)
-			model = OPENAI_MODEL
-			return "openai", client, model
-		except ImportError:
+	if OPENAI_API_KEY:
+		if _installed("openai"):
+			providers.append(("openai", OPENAI_MODEL))
+		elif warn:
 			print("Warning: openai not installed. Install with: pip install openai")
-			raise
+	return providers
+
+
+def select_provider() -> tuple[str, str]:
+	"""
+	Pick the provider and model from the configured API keys without importing any SDK.
+	Priority: Gemini (default for our testing), fallback to OpenAI if only OpenAI key exists
+	or google-genai is not installed.
+	Returns (provider, model)
+	"""
+	providers = available_providers()
+	if providers:
+		return providers[0]
+	if GEMINI_API_KEY or OPENAI_API_KEY:
+		raise ImportError("No provider SDK is installed for the configured API keys")
 	raise ValueError(
 		"No API key found. Please set GEMINI_API_KEY or OPENAI_API_KEY in your .env file."
 	)
 
-def call_openai(client, model: str, messages: list[dict[str, str]]) -> tuple[str, int, int]:
+def get_llm_client():
+	"""
+	Detect available API keys and return the appropriate client.
+	Priority: Gemini (default for our testing), fallback to OpenAI if only OpenAI key exists.
+	Returns (provider, client, model); only the selected provider's SDK is imported.
+	"""
+	provider, model = select_provider()
+	if provider == "gemini":
+		return provider, get_gemini_client(GEMINI_API_KEY), model
+	return provider, get_openai_client(OPENAI_API_KEY), model
+
+def call_openai(client, model: str, messages: list[dict[str, str]]) -> ChatResult:
 	"""Call OpenAI API and return the assistant's response, prompt tokens, and completion tokens."""
+	from .tokens import estimate_tokens
 	completion = client.chat.completions.create(
 		model=model,
 		messages=messages,
-		max_tokens=RESERVED_OUTPUT_TOKENS,
+		max_tokens=request_output_limit(model, estimate_tokens(messages, model)),
+		**timeout_option(),
 	)
 	assistant_text = completion.choices[0].message.content or ""
+	cached_tokens = 0
 	if hasattr(completion, "usage") and completion.usage is not None:
 		prompt_tokens = completion.usage.prompt_tokens
 		completion_tokens = completion.usage.completion_tokens
+		cached_tokens = openai_cached_tokens(completion.usage)
 	else:
 		from .tokens import count_tokens
 		prompt_tokens = count_tokens(messages, model)
 		completion_tokens = count_tokens([
 			{"role": "assistant", "content": assistant_text}
 		], model)
-	return assistant_text, prompt_tokens, completion_tokens
+	return ChatResult(assistant_text, prompt_tokens, completion_tokens, cached_tokens)
 
-def call_gemini(client, model: str, messages: list[dict[str, str]]) -> tuple[str, int, int]:
+def call_gemini(client, model: str, messages: list[dict[str, str]]) -> ChatResult:
 	"""Call Gemini API and return the assistant's response, prompt tokens, and completion tokens."""
-	conversation_history = []
-	for msg in messages:
-		conversation_history.append({
-			"role": msg["role"],
-			"content": msg["content"]
-		})
+	from .tokens import estimate_tokens
+	conversation_history = wire_messages("gemini", messages)
 	interaction = client.interactions.create(
 		model=model,
 		input=conversation_history,
 		generation_config={
-			"max_output_tokens": RESERVED_OUTPUT_TOKENS
-		}
+			"max_output_tokens": request_output_limit(model, estimate_tokens(messages, model))
+		},
+		**timeout_option(),
 	)
 	outputs = getattr(interaction, "outputs", [])
 	assistant_text = ""
 	for output in outputs:
 		if hasattr(output, "text"):
 			assistant_text = output.text
+	usage = getattr(interaction, "usage", None)
+	if usage is not None and usage.total_input_tokens is not None:
+		return ChatResult(assistant_text, usage.total_input_tokens, usage.total_output_tokens or 0, gemini_cached_tokens(usage))
+	from .tokens import count_tokens
+	prompt_tokens = count_tokens(messages, model)
+	completion_tokens = count_tokens([
+		{"role": "assistant", "content": assistant_text}
+	], model)
+	return ChatResult(assistant_text, prompt_tokens, completion_tokens)
+
+def stream_chat_completion(messages: list[dict[str, str]], *, model: str, temperature: float, max_tokens: int, on_token: Callable[[str], None]) -> ChatResult:
+	"""
+	Streaming OpenAI chat completion.
+	Calls on_token with each text delta as it arrives and requests a final usage chunk,
+	so the returned counts match the non-streaming call.
+	Retries only while nothing has been streamed yet, so the terminal never shows a reply twice.
+	Returns ChatResult(assistant_text, prompt_tokens, completion_tokens, cached_tokens)
+	"""
+	api_key = OPENAI_API_KEY
+	if not api_key:
+		print("[ERROR] OPENAI_API_KEY not set. Please add it to your .env file.")
+		return ChatResult("", None, None)
+	import openai
+	client = get_openai_client(api_key)
+	openai_messages = [to_openai_message(m) for m in messages]
+	retries = 5
+	for attempt in range(1, retries + 1):
+		parts: list[str] = []
+		try:
+			prompt_tokens = completion_tokens = None
+			cached_tokens = 0
+			with limited("openai", model, messages, max_tokens) as reservation:
+				stream = client.chat.completions.create(
+					model=model,
+					messages=openai_messages,
+					temperature=temperature,
+					max_tokens=max_tokens,
+					stream=True,
+					stream_options={"include_usage": True},
+					**timeout_option(),
+				)
+				for chunk in stream:
+					if chunk.choices:
+						delta = chunk.choices[0].delta.content
+						if delta:
+							parts.append(delta)
+							on_token(delta)
+					if chunk.usage is not None:
+						prompt_tokens = chunk.usage.prompt_tokens
+						completion_tokens = chunk.usage.completion_tokens
+						cached_tokens = openai_cached_tokens(chunk.usage)
+			assistant_text = "".join(parts)
+			reservation.settle(prompt_tokens, completion_tokens)
+			if prompt_tokens is None:
+				from .tokens import count_tokens
+				prompt_tokens = count_tokens(messages, model)
+				completion_tokens = count_tokens([
+					{"role": "assistant", "content": assistant_text}
+				], model)
+			return ChatResult(assistant_text, prompt_tokens, completion_tokens, cached_tokens)
+		except openai.AuthenticationError:
+			print("[ERROR] Invalid or missing OpenAI API key. Please set OPENAI_API_KEY in your .env file.")
+			return ChatResult("", None, None)
+		except (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError) as e:
+			if parts:
+				print(f"\n[ERROR] Stream interrupted: {e}")
+				return ChatResult("".join(parts), None, None)
+			if attempt < retries:
+				delay = backoff_delay(attempt, error_retry_after(e))
+				print(f"[Network/API Error] {e}. Retrying in {delay:.1f}s... ({retries - attempt} retries left)")
+				check_backoff(delay)
+				time.sleep(delay)
+			else:
+				print("[ERROR] Network or API error. Please check your connection and try again later.")
+				return ChatResult("", None, None)
+		except Exception as e:
+			print(f"[ERROR] Unexpected error: {e}")
+			return ChatResult("".join(parts), None, None)
+	return ChatResult("", None, None)
+
+def stream_gemini(client, model: str, messages: list[dict[str, str]], on_token: Callable[[str], None]) -> ChatResult:
+	"""
+	Stream a Gemini interaction, calling on_token with each text delta as it arrives.
+	Usage comes from the completed interaction event; local estimates are used if it is missing.
+	"""
+	from .tokens import estimate_tokens
+	stream = client.interactions.create(
+		model=model,
+		input=wire_messages("gemini", messages),
+		generation_config={
+			"max_output_tokens": request_output_limit(model, estimate_tokens(messages, model))
+		},
+		stream=True,
+		**timeout_option(),
+	)
+	parts: list[str] = []
+	usage = None
+	for event in stream:
+		event_type = getattr(event, "event_type", None)
+		if event_type == "content.delta":
+			text = getattr(event.delta, "text", None)
+			if text:
+				parts.append(text)
+				on_token(text)
+		elif event_type == "interaction.complete" and event.interaction is not None:
+			usage = event.interaction.usage
+		elif event_type == "error":
+			raise RuntimeError(getattr(event.error, "message", None) or "Gemini stream error")
+	assistant_text = "".join(parts)
+	if usage is not None and usage.total_input_tokens is not None:
+		return ChatResult(assistant_text, usage.total_input_tokens, usage.total_output_tokens or 0, gemini_cached_tokens(usage))
 	from .tokens import count_tokens
 	prompt_tokens = count_tokens(messages, model)
 	completion_tokens = count_tokens([
 		{"role": "assistant", "content": assistant_text}
 	], model)
-	return assistant_text, prompt_tokens, completion_tokens
+	return ChatResult(assistant_text, prompt_tokens, completion_tokens)
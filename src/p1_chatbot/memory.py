@@ -0,0 +1,203 @@
+"""
+Relevance-based recall of earlier turns.
+
+Instead of sending the whole retained history, each request can carry the
+pinned messages (system prompt and running summary), the few most relevant
+earlier turns and the last few messages, within a token budget. Every
+completed turn (user message and reply) goes into a `MemoryIndex`, including
+turns truncation later drops from the context, so an old answer can come back
+when the conversation returns to its topic.
+
+Turns are embedded by feature hashing: the words of the turn are hashed (with
+Python's per-process string hash; the index is rebuilt from the session log
+on resume) into `P1_MEMORY_DIM` buckets with sublinear term frequency, and
+the vector is L2-normalized. The vectors are rows of one float32 NumPy matrix that grows by
+doubling, so adding a turn is O(dim). A query is hashed the same way and
+weighted by each bucket's inverse document frequency (kept as running
+per-bucket counts). Scoring every stored turn reads only the matrix columns
+of the query's buckets, one small matrix-vector product, and `argpartition`
+picks the top k.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import TYPE_CHECKING, Iterable, NamedTuple
+
+from .config import (
+    P1_MEMORY_BUDGET_TOKENS,
+    P1_MEMORY_DIM,
+    P1_MEMORY_RECENT_MESSAGES,
+    P1_MEMORY_TOP_K,
+)
+from .conversation import Conversation
+from .messages import Message
+from .tokens import TOKENS_PER_REPLY, estimate_message_tokens
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+WORD_PATTERN = re.compile(r"\w+")
+# Too common to say anything about relevance
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in is it its me my no not of on or so "
+    "that the their them then there these they this to was we what when where which who why will with you your".split()
+)
+INITIAL_CAPACITY = 256
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Memory recall needs numpy. Install with: pip install numpy") from None
+    return numpy
+
+
+class Recall(NamedTuple):
+    """Messages to send for a turn and what recall picked."""
+    messages: list[Message]
+    tokens: int
+    recalled_turns: int
+
+
+class MemoryIndex:
+    """
+    Hashed bag-of-words vectors of every completed turn.
+
+    Attributes:
+        model: Model the turns' token counts are estimated for when missing
+        dim: Hash buckets per vector
+        turns: (user message, assistant message) per stored turn, in order
+        content_chars: Running total of the stored turns' text length
+    """
+
+    def __init__(self, model: str, dim: int = P1_MEMORY_DIM):
+        self._np = _numpy()
+        self.model = model
+        self.dim = dim
+        self.turns: list[tuple[Message, Message]] = []
+        self.content_chars = 0
+        self._vectors = self._np.zeros((INITIAL_CAPACITY, dim), dtype=self._np.float32)
+        # Stored turns with a word in each bucket, for the query's IDF weights
+        self._doc_freq = self._np.zeros(dim, dtype=self._np.float32)
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    @property
+    def nbytes(self) -> int:
+        return self._vectors.nbytes + self._doc_freq.nbytes
+
+    def _buckets(self, text: str) -> Counter:
+        return Counter(
+            hash(word) % self.dim for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS
+        )
+
+    def embed(self, text: str) -> "np.ndarray":
+        """L2-normalized hashed term-frequency vector of `text`."""
+        vector = self._np.zeros(self.dim, dtype=self._np.float32)
+        for bucket, count in self._buckets(text).items():
+            vector[bucket] = 1.0 + math.log(count)
+        norm = float(self._np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def add(self, user: Message, assistant: Message) -> None:
+        """Store a completed turn."""
+        index = len(self.turns)
+        if index == len(self._vectors):
+            grown = self._np.zeros((2 * len(self._vectors), self.dim), dtype=self._np.float32)
+            grown[:index] = self._vectors
+            self._vectors = grown
+        vector = self.embed(f"{user.content}\n{assistant.content}")
+        self._vectors[index] = vector
+        self._doc_freq += vector > 0
+        self.turns.append((user, assistant))
+        self.content_chars += len(user.content) + len(assistant.content)
+
+    def add_records(self, records: Iterable[dict]) -> None:
+        """Store the user/assistant pairs of session log records, in order."""
+        user = None
+        for record in records:
+            if record["role"] == "user":
+                user = Message("user", record["content"])
+            elif record["role"] == "assistant" and user is not None:
+                self.add(user, Message("assistant", record["content"]))
+                user = None
+
+    def search(self, query: str, k: int, exclude_last: int = 0) -> list[int]:
+        """
+        Indexes of the turns most relevant to `query`, best first.
+
+        Args:
+            query: Text to match (normally the new user message)
+            k: Max turns to return
+            exclude_last: Newest turns to leave out (they are sent anyway)
+
+        Returns:
+            Up to `k` turn indexes with a positive score
+        """
+        np = self._np
+        stored = len(self.turns) - exclude_last
+        if stored <= 0 or k <= 0:
+            return []
+        query_vector = self.embed(query)
+        # A query has few words: only the matrix columns of its buckets are read.
+        buckets = np.flatnonzero(query_vector)
+        if not len(buckets):
+            return []
+        idf = np.log((len(self.turns) + 1) / (self._doc_freq[buckets] + 1)) + 1.0
+        scores = self._vectors[:stored, buckets] @ (query_vector[buckets] * idf)
+        if k < stored:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(stored)
+        top = top[scores[top] > 0]
+        return top[np.argsort(-scores[top])].tolist()
+
+    def _tokens(self, message: Message) -> int:
+        if message.counts is None:
+            message.counts = (*estimate_message_tokens(message, self.model), False)
+        return message.counts[0]
+
+    def recall(
+        self,
+        conversation: Conversation,
+        budget: int = P1_MEMORY_BUDGET_TOKENS,
+        recent: int = P1_MEMORY_RECENT_MESSAGES,
+        top_k: int = P1_MEMORY_TOP_K,
+    ) -> Recall:
+        """
+        Build the prompt for the turn whose user message ends `conversation`.
+
+        The pinned messages and the last `recent` messages (starting on a user
+        turn, and always including the new message) come first in the budget;
+        the best-matching older turns fill what is left and are placed in
+        chronological order between them.
+
+        Args:
+            conversation: History ending with the new user message
+            budget: Max estimated prompt tokens
+            recent: Latest messages always sent
+            top_k: Max earlier turns to recall
+        """
+        pinned = conversation.messages[:conversation.pinned]
+        tail = conversation.messages[max(conversation.pinned, len(conversation) - recent):]
+        tokens = sum(self._tokens(m) for m in pinned) + TOKENS_PER_REPLY
+        tail_tokens = sum(self._tokens(m) for m in tail)
+        while len(tail) > 1 and (tail[0].role != "user" or tokens + tail_tokens > budget):
+            tail_tokens -= self._tokens(tail.pop(0))
+        tokens += tail_tokens
+
+        # Turns already in the tail are the newest stored ones.
+        in_tail = sum(1 for m in tail[:-1] if m.role == "user")
+        chosen = []
+        for index in self.search(tail[-1].content, top_k, exclude_last=in_tail):
+            user, assistant = self.turns[index]
+            cost = self._tokens(user) + self._tokens(assistant)
+            if tokens + cost <= budget:
+                chosen.append(index)
+                tokens += cost
+        recalled = [message for index in sorted(chosen) for message in self.turns[index]]
+        return Recall(pinned + recalled + tail, tokens, len(chosen))
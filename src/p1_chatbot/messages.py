@@ -0,0 +1,99 @@
+"""
+Compact message type for conversation histories.
+
+A `Conversation` holds one `Message` per turn instead of a dict: a
+`__slots__` object with an interned role string, well under half the size of
+the dict it replaces. It reads like a message dict (`m["role"]`,
+`m.get("content")`, `dict(m)`), so code written against plain message dicts
+keeps working and plain dicts can still be passed wherever a history is.
+
+A message also caches what is derived from it: its token count for the
+owning conversation's model, and its wire form per provider (the role-mapped
+{"role", "content"} dict the SDKs take). Messages are not modified once
+created, so a request payload is a list of the history's cached dicts and
+only the messages added since the previous request are converted.
+"""
+
+import sys
+from typing import Iterator
+
+# Roles each provider's API expects, where they differ from the history's OpenAI roles
+PROVIDER_ROLES = {
+    "openai": {"model": "assistant"},
+    "gemini": {"system": "user", "assistant": "model"},
+}
+
+
+class Message:
+    """
+    One history message.
+
+    Attributes:
+        role: Message role (interned, so every message shares one string per role)
+        content: Message text
+        counts: (count, lower bound, upper bound, exact) tokens for the owning
+            conversation's model, set by `Conversation`
+    """
+
+    __slots__ = ("role", "content", "counts", "_openai", "_gemini")
+
+    def __init__(self, role: str, content: str, counts: tuple[int, int, int, bool] | None = None):
+        self.role = sys.intern(role)
+        self.content = content
+        self.counts = counts
+        self._openai: dict[str, str] | None = None
+        self._gemini: dict[str, str] | None = None
+
+    def __getitem__(self, key: str) -> str:
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def get(self, key: str, default: str | None = None) -> str | None:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> tuple[str, str]:
+        return ("role", "content")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Message):
+            return self.role == other.role and self.content == other.content
+        if isinstance(other, dict):
+            return other == {"role": self.role, "content": self.content}
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content!r})"
+
+    def wire(self, provider: str) -> dict[str, str]:
+        """The message in `provider`'s roles, built on first use and then reused."""
+        if provider == "gemini":
+            if self._gemini is None:
+                self._gemini = {"role": PROVIDER_ROLES["gemini"].get(self.role, self.role), "content": self.content}
+            return self._gemini
+        if self._openai is None:
+            self._openai = {"role": PROVIDER_ROLES["openai"].get(self.role, self.role), "content": self.content}
+        return self._openai
+
+
+def wire_messages(provider: str, messages: list) -> list[dict[str, str]]:
+    """
+    Request payload for `provider`: the cached wire form of each `Message`.
+
+    Plain dicts are copied as they are (their caller already uses the
+    provider's roles).
+    """
+    return [
+        m.wire(provider) if isinstance(m, Message) else {"role": m["role"], "content": m["content"]}
+        for m in messages
+    ]
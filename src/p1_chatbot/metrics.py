@@ -0,0 +1,264 @@
+"""
+In-process latency histograms, counters and per-turn traces.
+
+The chat hot path wraps each stage of a turn (truncation, token counting,
+request serialization, network wait, time-to-first-token, retry backoff, cost
+calculation) in `METRICS.span(stage)`. A span costs two `perf_counter` calls,
+one bucket bisect and a dict update, so instrumentation stays on by default.
+
+Spans also land in the current turn's trace (a context variable, so stages
+recorded deep in the async provider layer are attributed to the right turn).
+Traces are appended to a JSONL file, and the registry renders in the Prometheus
+text format for a textfile collector or a small scrape endpoint.
+"""
+
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator
+
+from .config import P1_METRICS, P1_METRICS_PATH, P1_METRICS_PORT, P1_TRACE_PATH
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond local work to slow completions
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    """Escape a label value as the Prometheus text format requires (backslash, double quote, newline)."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{_escape_label_value(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics)."""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+class Trace:
+    """Stage timings and attributes of one chat turn."""
+
+    def __init__(self, **attrs):
+        self.started = time.time()
+        self.attrs: dict[str, object] = dict(attrs)
+        self.stages_ms: dict[str, float] = {}
+        self.closed = False
+
+    def add(self, stage: str, seconds: float) -> None:
+        if not self.closed:
+            self.stages_ms[stage] = self.stages_ms.get(stage, 0.0) + seconds * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "ts": round(self.started, 3),
+            **self.attrs,
+            "stages_ms": {k: round(v, 3) for k, v in self.stages_ms.items()},
+        }
+
+
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("p1_trace", default=None)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of counters, gauges and latency histograms.
+
+    Attributes:
+        enabled: When False every call is a no-op
+        trace_path: JSONL file finished traces are appended to ('' disables)
+    """
+
+    def __init__(self, enabled: bool = True, trace_path: str = "", buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.buckets = buckets
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._gauges: dict[tuple[str, Labels], float] = {}
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        """Add `value` to the counter `name` with the given labels."""
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Set the gauge `name` with the given labels to `value`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, stage: str, seconds: float, **labels) -> None:
+        """Record a stage duration in the histogram and the current turn's trace."""
+        if not self.enabled:
+            return
+        key = ("p1_stage_seconds", _labels({"stage": stage, **labels}))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+
+    @contextmanager
+    def span(self, stage: str, **labels) -> Iterator[None]:
+        """Time the enclosed block as `stage` (also recorded when it raises)."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def error(self, provider: str, error: BaseException) -> None:
+        """Count an error by provider and exception type."""
+        self.inc("p1_errors_total", provider=provider, type=type(error).__name__)
+
+    @contextmanager
+    def trace(self, **attrs) -> Iterator[Trace]:
+        """
+        Collect the spans of one turn and append them to the trace file on exit.
+
+        Set extra attributes (tokens, cost, cache hit, error) on `trace.attrs`
+        inside the block.
+        """
+        trace = Trace(**attrs)
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            elapsed = time.perf_counter() - start
+            self.observe("turn", elapsed)
+            trace.add("turn", elapsed)
+            trace.closed = True
+            if self.enabled and self.trace_path:
+                with self._lock, open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace.to_dict()) + "\n")
+
+    def snapshot(self) -> dict:
+        """Counters and histogram count/sum as plain data (for reports and tests)."""
+        with self._lock:
+            counters = {f"{name}{_format_labels(labels)}": value for (name, labels), value in self._counters.items()}
+            gauges = {f"{name}{_format_labels(labels)}": value for (name, labels), value in self._gauges.items()}
+            histograms = {
+                f"{name}{_format_labels(labels)}": {"count": h.count, "sum": h.sum}
+                for (name, labels), h in self._histograms.items()
+            }
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def prometheus_text(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: list[str] = []
+        with self._lock:
+            seen: set[str] = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} counter")
+                    seen.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} gauge")
+                    seen.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} histogram")
+                    seen.add(name)
+                cumulative = 0
+                for bound, count in zip(self.buckets, h.counts):
+                    cumulative += count
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{name}_bucket{_format_labels(labels, le)} {h.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Atomically write the Prometheus text to `path` (textfile-collector style)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+        """Serve GET /metrics on a daemon thread and return the server."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                found = self.path.startswith("/metrics")
+                data = registry.prometheus_text().encode() if found else b""
+                self.send_response(200 if found else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="p1-metrics", daemon=True).start()
+        return server
+
+
+METRICS = MetricsRegistry(enabled=P1_METRICS, trace_path=P1_TRACE_PATH)
+
+
+def export() -> None:
+    """Write the Prometheus file if P1_METRICS_PATH is set."""
+    if METRICS.enabled and P1_METRICS_PATH:
+        METRICS.write_prometheus(P1_METRICS_PATH)
+
+
+def serve_from_config() -> "ThreadingHTTPServer | None":
+    """Start the scrape endpoint if P1_METRICS_PORT is set."""
+    if METRICS.enabled and P1_METRICS_PORT:
+        return METRICS.serve(P1_METRICS_PORT)
+    return None
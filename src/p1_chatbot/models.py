@@ -0,0 +1,179 @@
+"""
+Model capability registry and per-session context budgets.
+
+Every model the chatbot can talk to has a `ModelSpec`: provider, context
+window, output limit, tokenizer family and prices (input, output and
+cached-input USD per 1K tokens). The built-in table covers the usual OpenAI and
+Gemini models; a JSON file at `P1_MODELS_PATH` adds models or overrides fields
+of built-in ones:
+
+    {"gpt-4o-mini": {"input_usd_per_1k": 0.00015},
+     "my-finetune": {"provider": "openai", "context_window": 128000, "max_output_tokens": 16384,
+                     "tokenizer": "o200k", "input_usd_per_1k": 0.0003, "output_usd_per_1k": 0.0012}}
+
+`ContextBudget` turns a spec into the numbers truncation works with. The
+window is the model's, capped by `EXERCISE_MAX_CONTEXT_TOKENS` (the 4096-token
+exercise budget unless configured otherwise). The output reservation starts at
+the configured max output and then follows a high percentile of the
+completion lengths seen in the session, so history is not truncated to make
+room for tokens that are never generated. Each request asks for the full max
+output when the window has room for it, and otherwise for what is left of the
+window after the prompt (`request_output_limit`), so a reply longer than the
+reservation may be cut short but the request is never rejected as too long.
+"""
+
+import json
+import math
+import os
+from collections import deque
+from typing import NamedTuple
+
+from .config import (
+    EXERCISE_MAX_CONTEXT_TOKENS,
+    P1_MAX_TOKENS,
+    P1_MODELS_PATH,
+    P1_OUTPUT_PERCENTILE,
+    TRUNCATE_MARGIN_TOKENS,
+)
+
+
+# Completion lengths kept per session, and needed before the reservation adapts
+OUTPUT_WINDOW = 50
+MIN_OUTPUT_SAMPLES = 5
+# Reservation = percentile * (1 + headroom), never below the floor
+OUTPUT_HEADROOM = 0.2
+MIN_OUTPUT_RESERVE = 64
+# Window assumed for a model missing from the registry when no exercise cap is set
+UNKNOWN_MODEL_CONTEXT_TOKENS = 8192
+
+
+class ModelSpec(NamedTuple):
+    """What the chatbot needs to know about one model."""
+    provider: str
+    context_window: int
+    max_output_tokens: int
+    tokenizer: str  # 'o200k', 'cl100k' or 'gemini'
+    input_usd_per_1k: float
+    output_usd_per_1k: float
+    cached_input_usd_per_1k: float | None = None  # None: cached input is billed at the input rate
+
+
+BUILTIN_MODELS: dict[str, ModelSpec] = {
+    "gpt-4o-mini": ModelSpec("openai", 128_000, 16_384, "o200k", 0.0005, 0.0015, 0.00025),
+    "gpt-4o": ModelSpec("openai", 128_000, 16_384, "o200k", 0.0025, 0.01, 0.00125),
+    "gpt-4.1": ModelSpec("openai", 1_047_576, 32_768, "o200k", 0.002, 0.008, 0.0005),
+    "gpt-4.1-mini": ModelSpec("openai", 1_047_576, 32_768, "o200k", 0.0004, 0.0016, 0.0001),
+    "gpt-4.1-nano": ModelSpec("openai", 1_047_576, 32_768, "o200k", 0.0001, 0.0004, 0.000025),
+    "gpt-3.5-turbo": ModelSpec("openai", 16_385, 4_096, "cl100k", 0.0005, 0.0015),
+    "gemini-2.5-flash-lite": ModelSpec("gemini", 1_048_576, 65_536, "gemini", 0.00025, 0.0005, 0.0000625),
+    "gemini-2.5-flash": ModelSpec("gemini", 1_048_576, 65_536, "gemini", 0.0003, 0.0025, 0.000075),
+    "gemini-2.5-pro": ModelSpec("gemini", 1_048_576, 65_536, "gemini", 0.00125, 0.01, 0.00031),
+}
+
+_registry: dict[str, ModelSpec] | None = None
+
+
+def load_models(path: str = P1_MODELS_PATH) -> dict[str, ModelSpec]:
+    """
+    The built-in models, extended and overridden by the JSON file at `path`.
+
+    Raises:
+        ValueError: If a new model in the file is missing a field
+    """
+    models = dict(BUILTIN_MODELS)
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for name, fields in json.load(f).items():
+                base = models.get(name)
+                try:
+                    models[name] = base._replace(**fields) if base is not None else ModelSpec(**fields)
+                except TypeError as e:
+                    raise ValueError(f"Bad entry for model '{name}' in {path}: {e}") from None
+    return models
+
+
+def get_model(model: str) -> ModelSpec | None:
+    """The registry entry for `model`, or None if it is unknown."""
+    global _registry
+    if _registry is None:
+        _registry = load_models()
+    return _registry.get(model)
+
+
+def context_window(model: str) -> int:
+    """Tokens of context available to `model` (its window, capped by the exercise budget)."""
+    spec = get_model(model)
+    window = spec.context_window if spec is not None else UNKNOWN_MODEL_CONTEXT_TOKENS
+    if EXERCISE_MAX_CONTEXT_TOKENS > 0:
+        window = min(window, EXERCISE_MAX_CONTEXT_TOKENS)
+    return window
+
+
+def output_limit(model: str) -> int:
+    """Max output tokens to request: `P1_MAX_TOKENS`, or less if the model allows less."""
+    spec = get_model(model)
+    return min(P1_MAX_TOKENS, spec.max_output_tokens) if spec is not None else P1_MAX_TOKENS
+
+
+def request_output_limit(model: str, prompt_tokens: int, max_tokens: int | None = None) -> int:
+    """
+    Max output tokens for one request: `max_tokens` (default: `output_limit`),
+    lowered so that prompt plus output fit in the context window.
+    """
+    if max_tokens is None:
+        max_tokens = output_limit(model)
+    return max(1, min(max_tokens, context_window(model) - prompt_tokens))
+
+
+class ContextBudget:
+    """
+    Context window, output reservation and truncation points for one session.
+
+    Attributes:
+        model: Model whose window and output limit apply
+        window: Context tokens available
+        max_output: Output tokens each request allows
+    """
+
+    def __init__(self, model: str, percentile: float = P1_OUTPUT_PERCENTILE):
+        self.model = model
+        self.window = context_window(model)
+        self.max_output = output_limit(model)
+        self.percentile = percentile
+        self.completions: deque[int] = deque(maxlen=OUTPUT_WINDOW)
+
+    def observe(self, completion_tokens: int | None) -> None:
+        """Record the length of a reply."""
+        if completion_tokens is not None:
+            self.completions.append(completion_tokens)
+
+    def seed(self, conversation) -> None:
+        """Record the lengths of the replies already in a (resumed) history."""
+        from .tokens import TOKENS_PER_MESSAGE
+        for index, message in enumerate(conversation):
+            if message["role"] == "assistant":
+                self.observe(conversation.message_tokens(index) - TOKENS_PER_MESSAGE)
+
+    @property
+    def reserve(self) -> int:
+        """Output tokens kept free: the max output until enough replies are seen, then their percentile plus headroom."""
+        if len(self.completions) < MIN_OUTPUT_SAMPLES:
+            return self.max_output
+        ordered = sorted(self.completions)
+        observed = ordered[min(len(ordered) - 1, max(0, round(self.percentile / 100 * len(ordered)) - 1))]
+        return min(self.max_output, max(MIN_OUTPUT_RESERVE, math.ceil(observed * (1 + OUTPUT_HEADROOM))))
+
+    @property
+    def limit(self) -> int:
+        """Max input tokens that still leave the reservation free."""
+        return self.window - self.reserve
+
+    @property
+    def threshold(self) -> int:
+        """History size at which truncation triggers."""
+        return self.limit - TRUNCATE_MARGIN_TOKENS
+
+    @property
+    def target(self) -> int:
+        """History size truncation cuts down to."""
+        return self.threshold // 2
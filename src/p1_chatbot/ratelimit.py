@@ -0,0 +1,297 @@
+"""
+Client-side rate limiting against provider RPM/TPM quotas.
+
+Each (provider, model) gets a `RateLimiter` with a requests-per-minute and a
+tokens-per-minute token bucket. Before a request is sent it reserves one
+request plus its estimated tokens (prompt estimate + max output tokens); the
+reservation may put a bucket into debt, and the caller sleeps until that debt
+is repaid, so concurrent callers are spread out in time instead of all
+hitting a 429 together. Once the response reports real usage the reservation
+is settled against it.
+
+The buckets follow the provider: `x-ratelimit-*` response headers (OpenAI)
+resize and drain them, and a 429's `Retry-After` pauses the whole limiter.
+Headers are read by the httpx response hooks in `clients`, which find the
+limiter for the request through a context variable set by `limited` /
+`alimited`.
+"""
+
+import asyncio
+import contextvars
+import email.utils
+import random
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+
+from .config import (
+    P1_GEMINI_RPM,
+    P1_GEMINI_TPM,
+    P1_OPENAI_RPM,
+    P1_OPENAI_TPM,
+    P1_RATE_LIMIT,
+)
+from .metrics import METRICS
+
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 30.0
+
+DEFAULT_LIMITS = {
+    "openai": (P1_OPENAI_RPM, P1_OPENAI_TPM),
+    "gemini": (P1_GEMINI_RPM, P1_GEMINI_TPM),
+}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_duration(value: str) -> float | None:
+    """Parse OpenAI reset durations such as '6m0s', '1.5s' or '20ms' into seconds."""
+    parts = _DURATION_PART.findall(value.strip())
+    if not parts:
+        return None
+    return sum(float(number) * _UNIT_SECONDS[unit] for number, unit in parts)
+
+
+def retry_after_seconds(headers) -> float | None:
+    """
+    Read the server's requested wait from `retry-after-ms` or `Retry-After`.
+
+    Args:
+        headers: Response headers (any case-insensitive mapping), or None
+
+    Returns:
+        Seconds to wait, or None if the response does not say
+    """
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value) if value else None
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """
+    Delay before retry number `attempt` (1-based).
+
+    Honors the server's Retry-After (plus up to 10% jitter so waiting callers do
+    not all return at once); otherwise uses capped exponential backoff with
+    full jitter.
+    """
+    if retry_after is not None:
+        return retry_after * (1 + random.random() * 0.1)
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+class TokenBucket:
+    """A per-minute quota that refills continuously and may go into debt."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` now and return how long until the bucket is out of debt."""
+        self.refill(now)
+        # A single request larger than the whole quota only waits for a full bucket.
+        amount = min(amount, self.capacity)
+        self.level -= amount
+        return max(0.0, -self.level / self.rate) if self.rate > 0 else 0.0
+
+
+class RateLimiter:
+    """
+    RPM + TPM limiter for one provider/model.
+
+    Attributes:
+        waits: Reservations that had to sleep
+        waited_s: Total time spent sleeping for the quota
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.blocked_until = 0.0
+        self.waits = 0
+        self.waited_s = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve one request and `tokens` tokens; return the seconds to wait before sending."""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self.blocked_until - now)
+            if self.requests is not None:
+                delay = max(delay, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.reserve(tokens, now))
+            if delay > 0:
+                self.waits += 1
+                self.waited_s += delay
+        if delay > 0:
+            METRICS.inc("p1_ratelimit_waits_total")
+        return delay
+
+    def acquire(self, tokens: int) -> None:
+        """Blocking `reserve` + sleep."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            with METRICS.span("ratelimit_wait"):
+                time.sleep(delay)
+
+    async def aacquire(self, tokens: int) -> None:
+        """Async `reserve` + sleep."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            with METRICS.span("ratelimit_wait"):
+                await asyncio.sleep(delay)
+
+    def settle(self, reserved: int, used: int | None) -> None:
+        """Give back (or charge) the difference between the reservation and the reported usage."""
+        if self.tokens is None or used is None:
+            return
+        with self._lock:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved - used)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every reservation for `seconds` (after a 429 with Retry-After)."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers) -> None:
+        """Adopt the provider's view of the quota from `x-ratelimit-*` headers."""
+        with self._lock:
+            now = time.monotonic()
+            for kind in ("requests", "tokens"):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if limit is None or remaining is None:
+                    continue
+                try:
+                    limit_value, remaining_value = float(limit), float(remaining)
+                except ValueError:
+                    continue
+                bucket = getattr(self, kind)
+                if bucket is None:
+                    bucket = TokenBucket(limit_value)
+                    setattr(self, kind, bucket)
+                bucket.refill(now)
+                if bucket.capacity != limit_value:
+                    bucket.capacity = limit_value
+                    bucket.rate = limit_value / 60.0
+                # Our own in-flight reservations are not in the server's count yet,
+                # so only ever lower the level.
+                bucket.level = min(bucket.level, remaining_value)
+                reset = headers.get(f"x-ratelimit-reset-{kind}")
+                if remaining_value <= 0 and reset:
+                    seconds = parse_duration(reset)
+                    if seconds:
+                        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+_limiters: dict[tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+_active: contextvars.ContextVar[RateLimiter | None] = contextvars.ContextVar("p1_rate_limiter", default=None)
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """Return the shared limiter for a provider/model, creating it with the configured quota."""
+    key = (provider, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            rpm, tpm = DEFAULT_LIMITS.get(provider, (0, 0))
+            limiter = _limiters[key] = RateLimiter(rpm, tpm)
+    return limiter
+
+
+def estimate_request_tokens(messages: list[dict[str, str]], model: str, max_tokens: int | None) -> int:
+    """Tokens a request counts against TPM: the prompt estimate plus the max output tokens."""
+    from .tokens import estimate_tokens
+    return estimate_tokens(messages, model) + (max_tokens or 0)
+
+
+class Reservation:
+    """Tokens reserved for one request; settle it with the reported usage."""
+
+    def __init__(self, limiter: RateLimiter | None, tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+
+    def settle(self, prompt_tokens: int | None, completion_tokens: int | None) -> None:
+        if self.limiter is not None and prompt_tokens is not None:
+            self.limiter.settle(self.tokens, prompt_tokens + (completion_tokens or 0))
+
+
+@contextmanager
+def limited(provider: str, model: str, messages: list[dict[str, str]], max_tokens: int | None) -> Iterator[Reservation]:
+    """Wait for quota, then bind the limiter so response headers inside the block update it."""
+    if not P1_RATE_LIMIT:
+        yield Reservation(None, 0)
+        return
+    limiter = get_rate_limiter(provider, model)
+    tokens = estimate_request_tokens(messages, model, max_tokens)
+    limiter.acquire(tokens)
+    token = _active.set(limiter)
+    try:
+        yield Reservation(limiter, tokens)
+    except BaseException:
+        limiter.settle(tokens, 0)  # a failed request uses no tokens
+        raise
+    finally:
+        _active.reset(token)
+
+
+@asynccontextmanager
+async def alimited(provider: str, model: str, messages: list[dict[str, str]], max_tokens: int | None) -> AsyncIterator[Reservation]:
+    """Async counterpart of `limited`."""
+    if not P1_RATE_LIMIT:
+        yield Reservation(None, 0)
+        return
+    limiter = get_rate_limiter(provider, model)
+    tokens = estimate_request_tokens(messages, model, max_tokens)
+    await limiter.aacquire(tokens)
+    token = _active.set(limiter)
+    try:
+        yield Reservation(limiter, tokens)
+    except BaseException:
+        limiter.settle(tokens, 0)  # a failed request uses no tokens
+        raise
+    finally:
+        _active.reset(token)
+
+
+def observe_response(status: int, headers) -> None:
+    """Feed a response's rate-limit headers to the limiter bound to the current request."""
+    limiter = _active.get()
+    if limiter is None:
+        return
+    limiter.update_from_headers(headers)
+    if status == 429:
+        limiter.pause(retry_after_seconds(headers) or BACKOFF_BASE_SECONDS)
+
+
+def error_retry_after(error: BaseException) -> float | None:
+    """Retry-After of the HTTP response attached to an SDK error, if any."""
+    response = getattr(error, "response", None)
+    return retry_after_seconds(getattr(response, "headers", None))
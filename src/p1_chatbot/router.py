@@ -0,0 +1,380 @@
+"""
+Hedged, failover-aware routing between the Gemini and OpenAI backends.
+
+The conversation is kept in OpenAI roles ('system', 'user', 'assistant');
+each backend maps them to what its API expects (Gemini gets the system prompt
+as a user turn and 'model' for assistant turns). Every request goes to the
+best-ranked backend first. If it has produced neither a response nor a first
+token within its own latency percentile, the same request is hedged to the
+next backend and whichever answers first wins; the other request is
+cancelled. A backend that fails hands the request straight to the next one,
+and after repeated failures it is skipped for a cool-down period. Per-backend
+EWMAs of latency and error rate decide the ranking.
+
+Inside a turn deadline (see `deadline`) the router stops waiting when it
+passes: a reply that was already streaming is returned as far as it got,
+otherwise `DeadlineExceeded` is raised. Both count in
+`p1_deadline_exceeded_total`. When every backend tried fails,
+`AllBackendsFailed` carries each one's error.
+"""
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, NamedTuple
+
+from .async_llm_client import acall_gemini, acreate_chat_completion, astream_chat_completion, astream_gemini
+from .config import (
+    P1_FAILOVER_COOLDOWN_SECONDS,
+    P1_FAILOVER_ERRORS,
+    P1_HEDGE,
+    P1_HEDGE_DEFAULT_MS,
+    P1_HEDGE_MIN_MS,
+    P1_HEDGE_PERCENTILE,
+)
+from .deadline import DeadlineExceeded, remaining
+from .llm_client import ChatResult
+from .messages import PROVIDER_ROLES, Message
+from .metrics import METRICS
+from .models import request_output_limit
+from .tokens import estimate_tokens
+
+
+EWMA_ALPHA = 0.2
+LATENCY_WINDOW = 100
+# Samples needed before the hedge delay follows the observed percentile
+MIN_HEDGE_SAMPLES = 5
+
+GEMINI_ROLES = PROVIDER_ROLES["gemini"]
+OPENAI_ROLES = PROVIDER_ROLES["openai"]
+
+
+def provider_messages(provider: str, messages: list[dict[str, str]]) -> list[dict[str, str]]:
+    """
+    Map a history in OpenAI roles to the roles the provider's API expects.
+
+    `Message`s are passed through: the provider call takes their cached wire
+    form, which is already in the provider's roles.
+    """
+    roles = GEMINI_ROLES if provider == "gemini" else OPENAI_ROLES
+    return [
+        {"role": roles[m["role"]], "content": m["content"]} if m["role"] in roles and not isinstance(m, Message) else m
+        for m in messages
+    ]
+
+
+def _failed(result: ChatResult) -> bool:
+    # The async provider calls report handled errors as an empty, usage-less result.
+    return not result.text and result.prompt_tokens is None
+
+
+class AllBackendsFailed(RuntimeError):
+    """
+    Every backend a request was sent to failed.
+
+    Attributes:
+        failures: (backend name, error) per failed attempt; the error is None
+            for a call that returned no reply
+    """
+
+    def __init__(self, failures: list[tuple[str, BaseException | None]]):
+        self.failures = failures
+        super().__init__("All backends failed: " + "; ".join(
+            f"{name}: {type(error).__name__}: {error}" if error is not None else f"{name}: no reply"
+            for name, error in failures
+        ))
+
+
+class Backend:
+    """
+    One provider/model the router can send requests to.
+
+    Attributes:
+        latency_ewma: Smoothed seconds to first token (or full response), None until measured
+        error_ewma: Smoothed failure rate between 0 and 1
+        down_until: monotonic time before which the backend is skipped
+    """
+
+    def __init__(self, provider: str, model: str, max_tokens: int, ready: Future | None = None):
+        self.provider = provider
+        self.model = model
+        self.max_tokens = max_tokens
+        self.ready = ready
+        self.latency_ewma: float | None = None
+        self.error_ewma = 0.0
+        self.consecutive_errors = 0
+        self.down_until = 0.0
+        self.samples: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.wins = 0
+        self.errors = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+    def available(self, now: float) -> bool:
+        """Whether the SDK is loaded without error and the backend is not cooling down."""
+        if self.ready is not None and (not self.ready.done() or self.ready.exception() is not None):
+            return False
+        return now >= self.down_until
+
+    def score(self, default_latency: float) -> float:
+        """Expected seconds to an answer, inflated by the error rate (lower is better)."""
+        latency = self.latency_ewma if self.latency_ewma is not None else default_latency
+        return latency / max(0.05, 1.0 - self.error_ewma)
+
+    def hedge_delay(self, percentile: float, floor: float, default: float) -> float:
+        """How long to wait for this backend before hedging: its latency percentile, at least `floor`."""
+        if len(self.samples) < MIN_HEDGE_SAMPLES:
+            return max(floor, default)
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return max(floor, ordered[index])
+
+    def record_latency(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        if self.latency_ewma is None:
+            self.latency_ewma = seconds
+        else:
+            self.latency_ewma += EWMA_ALPHA * (seconds - self.latency_ewma)
+
+    def record_success(self) -> None:
+        self.wins += 1
+        self.consecutive_errors = 0
+        self.error_ewma *= 1 - EWMA_ALPHA
+
+    def record_error(self, failover_errors: int, cooldown: float) -> None:
+        self.errors += 1
+        self.consecutive_errors += 1
+        self.error_ewma += EWMA_ALPHA * (1.0 - self.error_ewma)
+        if self.consecutive_errors >= failover_errors:
+            self.down_until = time.monotonic() + cooldown
+            self.consecutive_errors = 0
+            print(f"[router] {self.name} failed {failover_errors} times in a row; skipping it for {cooldown:.0f}s")
+
+    async def call(self, messages: list[dict[str, str]], on_token: Callable[[str], None] | None, temperature: float | None) -> ChatResult:
+        """Send the request in this backend's roles, streaming if `on_token` is given."""
+        backend_messages = provider_messages(self.provider, messages)
+        max_tokens = request_output_limit(self.model, estimate_tokens(messages, self.model), self.max_tokens)
+        if self.provider == "openai":
+            if on_token is not None:
+                return await astream_chat_completion(
+                    backend_messages, model=self.model, temperature=temperature, max_tokens=max_tokens, on_token=on_token
+                )
+            return await acreate_chat_completion(
+                backend_messages, model=self.model, temperature=temperature, max_tokens=max_tokens
+            )
+        if on_token is not None:
+            return await astream_gemini(
+                None, self.model, backend_messages, on_token, max_tokens=max_tokens, temperature=temperature
+            )
+        return await acall_gemini(None, self.model, backend_messages, max_tokens=max_tokens, temperature=temperature)
+
+
+class RouteResult(NamedTuple):
+    """The winning backend's reply and how the request got there."""
+    backend: Backend
+    result: ChatResult
+    hedged: bool
+    failed_over: bool
+    deadline_exceeded: bool = False  # the reply was cut off at the turn deadline
+
+
+class Router:
+    """
+    Sends each request to the best backend, hedging and failing over to the others.
+
+    Attributes:
+        backends: Candidates in preference order (the order breaks ties)
+        hedges: Requests that were hedged to a second backend
+        failovers: Requests handed to another backend after a failure
+    """
+
+    def __init__(
+        self,
+        backends: list[Backend],
+        *,
+        hedge: bool = P1_HEDGE,
+        hedge_percentile: float = P1_HEDGE_PERCENTILE,
+        hedge_min_s: float = P1_HEDGE_MIN_MS / 1000,
+        hedge_default_s: float = P1_HEDGE_DEFAULT_MS / 1000,
+        failover_errors: int = P1_FAILOVER_ERRORS,
+        cooldown_s: float = P1_FAILOVER_COOLDOWN_SECONDS,
+    ):
+        if not backends:
+            raise ValueError("Router needs at least one backend")
+        self.backends = backends
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_s = hedge_min_s
+        self.hedge_default_s = hedge_default_s
+        self.failover_errors = failover_errors
+        self.cooldown_s = cooldown_s
+        self.hedges = 0
+        self.failovers = 0
+
+    def ranked(self) -> list[Backend]:
+        """Available backends, best first; if none is available, all of them, soonest back first."""
+        now = time.monotonic()
+        available = [b for b in self.backends if b.available(now)]
+        if not available:
+            return sorted(self.backends, key=lambda b: b.down_until)
+        return sorted(available, key=lambda b: (b.score(self.hedge_default_s), self.backends.index(b)))
+
+    @property
+    def primary(self) -> Backend:
+        """The backend the next request goes to first."""
+        return self.ranked()[0]
+
+    async def complete(self, messages: list[dict[str, str]], *, temperature: float | None, on_token: Callable[[str], None] | None = None) -> RouteResult:
+        """
+        Get one reply for `messages`, hedging and failing over across backends.
+
+        With `on_token`, replies are streamed and the first backend to produce a
+        token wins; only the winner's tokens reach `on_token`. Without it, the
+        first successful response wins.
+
+        At the turn deadline, a streaming winner's text so far is returned
+        (with `deadline_exceeded` set and no usage); with nothing streamed yet,
+        DeadlineExceeded is raised.
+
+        Args:
+            messages: History in OpenAI roles
+            temperature: Sampling temperature
+            on_token: Streaming callback, or None for a single response
+
+        Returns:
+            RouteResult(backend, result, hedged, failed_over, deadline_exceeded)
+
+        Raises:
+            DeadlineExceeded: If the turn deadline passed before any reply
+            AllBackendsFailed: If every backend tried failed
+        """
+        waiting = self.ranked()
+        tasks: dict[asyncio.Task, Backend] = {}
+        started: dict[Backend, float] = {}
+        first_token = asyncio.Event()
+        winner: Backend | None = None
+        winner_result: ChatResult | None = None
+        streamed: list[str] = []
+        last_error: BaseException | None = None
+        failures: list[tuple[str, BaseException | None]] = []
+        hedged = failed_over = False
+
+        def launch() -> None:
+            backend = waiting.pop(0)
+            started[backend] = time.perf_counter()
+            callback = None
+            if on_token is not None:
+                def callback(text: str) -> None:
+                    nonlocal winner
+                    if winner is None:
+                        winner = backend
+                        backend.record_latency(time.perf_counter() - started[backend])
+                        first_token.set()
+                    if winner is backend:
+                        streamed.append(text)
+                        on_token(text)
+            tasks[asyncio.create_task(backend.call(messages, callback, temperature))] = backend
+
+        launch()
+        primary = tasks[next(iter(tasks))]
+        hedge_at = time.perf_counter() + primary.hedge_delay(self.hedge_percentile, self.hedge_min_s, self.hedge_default_s)
+        token_wait = asyncio.create_task(first_token.wait())
+        try:
+            while winner_result is None:
+                left = remaining()
+                if left is not None and left <= 0:
+                    METRICS.inc("p1_deadline_exceeded_total", outcome="partial" if streamed else "none")
+                    if not streamed:
+                        raise DeadlineExceeded("No reply within the turn deadline")
+                    return RouteResult(winner, ChatResult("".join(streamed), None, None), hedged, failed_over, True)
+                if winner is not None:
+                    # Streaming: a backend has won; let it finish on its own.
+                    task = next(t for t, b in tasks.items() if b is winner)
+                    for other in [t for t in tasks if t is not task]:
+                        other.cancel()
+                        loser = tasks.pop(other)
+                        if started[loser] <= started[winner]:
+                            # It had a head start and still lost: a lower bound on its latency.
+                            loser.record_latency(time.perf_counter() - started[loser])
+                    done, _ = await asyncio.wait({task}, timeout=left)
+                    if not done:
+                        continue
+                    tasks.pop(task)
+                    winner_result = task.result()
+                    break
+                timeout = None
+                if self.hedge and not hedged and waiting and len(tasks) == 1:
+                    timeout = max(0.0, hedge_at - time.perf_counter())
+                hedge_due = timeout is not None
+                if left is not None and (timeout is None or left < timeout):
+                    timeout, hedge_due = left, False
+                done, _ = await asyncio.wait({*tasks, token_wait}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if not hedge_due:
+                        continue  # the deadline passed; handled at the top of the loop
+                    if waiting[0].available(time.monotonic()):
+                        hedged = True
+                        self.hedges += 1
+                        METRICS.inc("p1_router_hedges_total", backend=waiting[0].name)
+                        launch()
+                    else:
+                        waiting.pop(0)
+                    continue
+                for task in done:
+                    if task is token_wait:
+                        continue
+                    backend = tasks.pop(task)
+                    error = task.exception()
+                    result = None if error is not None else task.result()
+                    if isinstance(error, DeadlineExceeded):
+                        # Out of time for retries, not a backend fault: no failover either.
+                        last_error = error
+                        continue
+                    if result is not None and not _failed(result) and winner in (None, backend):
+                        if winner is None:
+                            winner = backend
+                            backend.record_latency(time.perf_counter() - started[backend])
+                        winner_result = result
+                        break
+                    last_error = error or last_error
+                    failures.append((backend.name, error))
+                    backend.record_error(self.failover_errors, self.cooldown_s)
+                    METRICS.inc("p1_router_errors_total", backend=backend.name)
+                    if winner is backend:
+                        # The stream broke after it had started printing; nothing to hand over.
+                        if error is not None:
+                            raise error
+                        winner_result = result
+                        break
+                    if not tasks and waiting:
+                        failed_over = True
+                        self.failovers += 1
+                        METRICS.inc("p1_router_failovers_total", backend=waiting[0].name)
+                        print(f"[router] {backend.name} failed; retrying on {waiting[0].name}")
+                        launch()
+                if winner_result is None and winner is None and not tasks:
+                    if isinstance(last_error, DeadlineExceeded):
+                        METRICS.inc("p1_deadline_exceeded_total", outcome="none")
+                        raise last_error
+                    raise AllBackendsFailed(failures) from last_error
+        finally:
+            token_wait.cancel()
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark retrieved; the request already has its answer
+        winner.record_success()
+        METRICS.inc("p1_router_wins_total", backend=winner.name)
+        return RouteResult(winner, winner_result, hedged, failed_over)
+
+    def report(self) -> str:
+        """One line per backend with its wins, errors and smoothed latency."""
+        parts = []
+        for b in self.backends:
+            latency = f"{b.latency_ewma * 1000:.0f}" if b.latency_ewma is not None else "n/a"
+            parts.append(f"{b.name} wins={b.wins} errors={b.errors} latency_ewma_ms={latency} error_ewma={b.error_ewma:.2f}")
+        return f"[router] hedges={self.hedges} failovers={self.failovers} | " + " | ".join(parts)
@@ -0,0 +1,494 @@
+"""
+HTTP chat server: many concurrent sessions in one process, replies over SSE.
+
+A small HTTP/1.1 server on `asyncio.start_server` (one request per
+connection), for putting the chatbot behind another frontend:
+
+    POST /sessions                   -> {"id": ...}
+    GET  /sessions                   -> saved sessions, most recent first
+    GET  /sessions/<id>              -> session index plus in-memory state
+    POST /sessions/<id>/messages     {"content": "...", "stream": true}
+         -> text/event-stream: 'token' events, then one 'done' event with usage
+            and cost (or a JSON body with "stream": false)
+    GET  /health, GET /metrics
+
+Each session has its own history, truncation, summary and cost, and is
+persisted by `sessions` after every turn. Resident sessions are kept in LRU
+order; once their histories exceed `P1_SERVER_MEMORY_MB`, the least recently
+used idle ones are dropped from memory and reloaded from disk on their next
+request. Upstream concurrency is bounded for the whole server by the async
+layer's `P1_MAX_IN_FLIGHT` semaphore (one event loop); turns beyond
+`P1_SERVER_MAX_PENDING` are rejected with 503 so the queue cannot grow without
+bound.
+
+Usage:
+    python -m src.p1_chatbot.server --port 8080
+"""
+
+import argparse
+import asyncio
+import json
+import warnings
+from collections import OrderedDict
+
+from .cache import ResponseCache
+from .cli import build_router, load_conversation, load_memory, truncate_messages
+from .clients import aclose_all
+from .compaction import Compactor
+from .config import (
+    P1_CACHE,
+    P1_ROUTER,
+    P1_SERVER_HOST,
+    P1_SERVER_MAX_PENDING,
+    P1_SERVER_MEMORY_MB,
+    P1_SERVER_PORT,
+    P1_SUMMARY,
+    P1_SUMMARY_MODEL,
+    P1_TEMPERATURE,
+)
+from .conversation import Conversation
+from .cost import estimate_cost
+from .deadline import turn_deadline
+from .llm_client import ChatResult, available_providers, select_provider
+from .memory import MemoryIndex
+from .metrics import METRICS
+from .models import ContextBudget
+from .router import Router
+from .sessions import Session, SessionStore
+from .startup import initialize
+
+
+MAX_BODY_BYTES = 1 << 20
+# Rough per-session bookkeeping on top of the message text
+SESSION_OVERHEAD_BYTES = 2048
+
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ChatSession:
+    """
+    A resident session: its saved state plus the live history.
+
+    Attributes:
+        usd: Cost of the turns served since the session was loaded
+        busy: Whether a turn is in progress (busy sessions are never evicted)
+        pins: Requests holding the session from `ChatServer.open` until
+            `release` (pinned sessions are never evicted)
+        counted_bytes: Its share of the server's running `resident_bytes` total
+    """
+
+    def __init__(
+        self, session: Session, conversation: Conversation, compactor: Compactor | None,
+        budget: ContextBudget, memory: MemoryIndex | None = None,
+    ):
+        self.session = session
+        self.conversation = conversation
+        self.budget = budget
+        self.compactor = compactor
+        self.memory = memory
+        self.usd = 0.0
+        self.busy = False
+        self.pins = 0
+        self.unsaved_evictions = 0
+        self.counted_bytes = 0
+
+    @property
+    def resident_bytes(self) -> int:
+        """Approximate memory held by the history (and the recall index), from running totals."""
+        resident = SESSION_OVERHEAD_BYTES + self.conversation.content_chars
+        if self.memory is not None:
+            resident += self.memory.nbytes + self.memory.content_chars
+        return resident
+
+    @property
+    def evictable(self) -> bool:
+        return not self.busy and not self.pins and not (self.compactor is not None and self.compactor.busy)
+
+
+class _Load:
+    """A session being loaded from disk and the requests waiting for it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class ChatServer:
+    """Sessions, router and cache shared by every connection."""
+
+    def __init__(self, router: Router, model: str, store: SessionStore, memory_bytes: int):
+        self.router = router
+        self.model = model
+        self.store = store
+        self.memory_bytes = memory_bytes
+        self.response_cache = ResponseCache() if P1_CACHE else None
+        self.resident: OrderedDict[str, ChatSession] = OrderedDict()
+        # Sessions being loaded from disk, so concurrent requests share one load
+        self.loading: dict[str, _Load] = {}
+        self.resident_bytes = 0
+        self.pending = 0
+        self.evictions = 0
+
+    def _compactor(self) -> Compactor | None:
+        if not P1_SUMMARY:
+            return None
+        primary = self.router.backends[0]
+        return Compactor(primary.provider, P1_SUMMARY_MODEL or primary.model)
+
+    async def open(self, session_id: str) -> ChatSession:
+        """
+        Return the session pinned against eviction, loading it from disk if it was evicted.
+
+        Every successful call must be paired with `release`.
+        """
+        chat = self.resident.get(session_id)
+        if chat is None:
+            try:
+                session = self.store.get(session_id)
+            except KeyError:
+                raise HTTPError(404, f"No session {session_id!r}") from None
+            # A prefix may have resolved to a session that is already resident.
+            chat = self.resident.get(session.id)
+            if chat is None:
+                load = self.loading.get(session.id)
+                if load is None:
+                    load = self.loading[session.id] = _Load(asyncio.create_task(self._load(session)))
+                # The load pins the session once per waiter, so no eviction can
+                # slip in between it finishing and the waiters resuming.
+                load.waiters += 1
+                try:
+                    # Shielded: a disconnecting client must not cancel a load others are waiting on.
+                    chat = await asyncio.shield(load.task)
+                except asyncio.CancelledError:
+                    if load.task.done() and not load.task.cancelled() and load.task.exception() is None:
+                        self.release(load.task.result())
+                    else:
+                        load.waiters -= 1
+                    raise
+                self.resident.move_to_end(chat.session.id)
+                return chat
+        chat.pins += 1
+        self.resident.move_to_end(chat.session.id)
+        return chat
+
+    def release(self, chat: ChatSession) -> None:
+        """Drop a pin taken by `open`."""
+        chat.pins -= 1
+
+    async def _load(self, session: Session) -> ChatSession:
+        try:
+            budget = ContextBudget(self.model)
+            conversation = await asyncio.to_thread(load_conversation, session, self.model, budget)
+            memory = await asyncio.to_thread(load_memory, session, self.model)
+            compactor = self._compactor()
+            chat = ChatSession(session, conversation, compactor, budget, memory)
+            if compactor is not None:
+                compactor.adopt(conversation)
+                compactor.on_summary = lambda: self.recount(chat)
+            chat.pins = self.loading[session.id].waiters
+            self.resident[session.id] = chat
+            self.recount(chat)
+            return chat
+        finally:
+            del self.loading[session.id]
+
+    async def create(self) -> ChatSession:
+        session = self.store.new(self.model)
+        session.save()
+        chat = await self.open(session.id)
+        self.release(chat)
+        return chat
+
+    def recount(self, chat: ChatSession) -> None:
+        """Bring the session's share of the running `resident_bytes` total up to date."""
+        size = chat.resident_bytes
+        self.resident_bytes += size - chat.counted_bytes
+        chat.counted_bytes = size
+
+    def evict_idle(self) -> None:
+        """Drop least recently used idle sessions until the resident histories fit the memory cap."""
+        for session_id in list(self.resident):
+            if self.resident_bytes <= self.memory_bytes or len(self.resident) <= 1:
+                break
+            chat = self.resident[session_id]
+            if not chat.evictable:
+                continue
+            chat.session.sync_summary(chat.conversation)
+            self.resident_bytes -= chat.counted_bytes
+            del self.resident[session_id]
+            self.evictions += 1
+            METRICS.inc("p1_server_evictions_total")
+
+    async def turn(self, chat: ChatSession, content: str, on_token=None) -> dict:
+        """
+        Run one user turn on a session: truncate, answer (cache or router), account, persist.
+
+        Returns:
+            The reply with its usage, cost and backend
+        """
+        conversation = chat.conversation
+        primary = self.router.primary
+        with METRICS.trace(provider=primary.provider, model=primary.model, session=chat.session.id) as trace:
+            conversation.append("user", content)
+            evicted = []
+            try:
+                evicted = truncate_messages(conversation, chat.budget)
+                chat.unsaved_evictions += len(evicted)
+                # A copy: a background summary fold may rewrite the history mid-turn.
+                messages = list(conversation.messages)
+                if chat.memory is not None:
+                    messages = chat.memory.recall(conversation).messages
+                cached = None
+                if self.response_cache is not None:
+                    cached = self.response_cache.lookup(
+                        primary.provider, primary.model, messages, temperature=P1_TEMPERATURE, max_tokens=primary.max_tokens
+                    )
+                    METRICS.inc("p1_cache_lookups_total", result="hit" if cached is not None else "miss")
+                deadline_exceeded = False
+                if cached is not None:
+                    result, backend = ChatResult(*cached), None
+                    if on_token is not None:
+                        on_token(result.text)
+                else:
+                    with turn_deadline():
+                        route = await self.router.complete(messages, temperature=P1_TEMPERATURE, on_token=on_token)
+                    result, backend, deadline_exceeded = route.result, route.backend, route.deadline_exceeded
+                    if not result.text and result.prompt_tokens is None:
+                        raise RuntimeError("The provider returned no reply")
+                    if self.response_cache is not None:
+                        # Stored under the backend that answered, which a hedge or failover may have changed.
+                        self.response_cache.store(
+                            backend.provider, backend.model, messages, result,
+                            temperature=P1_TEMPERATURE, max_tokens=backend.max_tokens
+                        )
+            except BaseException as e:
+                METRICS.error(primary.provider, e)
+                trace.attrs["error"] = type(e).__name__
+                conversation.pop()
+                raise
+            finally:
+                # Truncated messages are gone from the history whether or not the turn succeeded.
+                if chat.compactor is not None:
+                    chat.compactor.schedule(conversation, evicted)
+            prompt_tokens = result.prompt_tokens or 0
+            completion_tokens = result.completion_tokens or 0
+            usd = 0.0
+            if backend is not None and not result.coalesced:
+                try:
+                    usd = estimate_cost(backend.model, prompt_tokens, completion_tokens, result.cached_tokens)
+                except ValueError:
+                    pass
+            chat.usd += usd
+            if backend is not None:
+                chat.budget.observe(result.completion_tokens)
+            conversation.append("assistant", result.text)
+            if chat.memory is not None:
+                chat.memory.add(conversation[-2], conversation[-1])
+            chat.session.record_turn(conversation, chat.unsaved_evictions, usd)
+            chat.unsaved_evictions = 0
+            trace.attrs.update(
+                backend=backend.name if backend is not None else "cache",
+                prompt_tokens=prompt_tokens,
+                cached_tokens=result.cached_tokens,
+                completion_tokens=completion_tokens,
+                usd=round(usd, 8),
+                cache_hit=cached is not None,
+                deadline_exceeded=deadline_exceeded,
+            )
+        return {
+            "session": chat.session.id,
+            "text": result.text,
+            "backend": backend.name if backend is not None else "cache",
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": result.cached_tokens,
+            "completion_tokens": completion_tokens,
+            "usd": usd,
+            "deadline_exceeded": deadline_exceeded,
+            "session_usd": chat.session.meta["usd"],
+            "context_tokens": conversation.token_count,
+        }
+
+    def describe(self, chat: ChatSession) -> dict:
+        return {
+            **chat.session.meta,
+            "resident": True,
+            "context_messages": len(chat.conversation),
+            "context_tokens": chat.conversation.token_count,
+        }
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one HTTP request on a connection, then close it."""
+        try:
+            method, path, body = await read_request(reader)
+            await self.dispatch(method, path, body, writer)
+        except HTTPError as e:
+            write_json(writer, e.status, {"error": str(e)})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            write_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def dispatch(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        parts = [p for p in path.split("?", 1)[0].split("/") if p]
+        if parts == ["health"]:
+            write_json(writer, 200, {
+                "status": "ok",
+                "resident_sessions": len(self.resident),
+                "resident_bytes": self.resident_bytes,
+                "pending_turns": self.pending,
+                "evictions": self.evictions,
+            })
+        elif parts == ["metrics"]:
+            write_response(writer, 200, METRICS.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+        elif parts == ["sessions"] and method == "POST":
+            chat = await self.create()
+            self.evict_idle()
+            write_json(writer, 201, {"id": chat.session.id})
+        elif parts == ["sessions"] and method == "GET":
+            write_json(writer, 200, await asyncio.to_thread(self.store.list))
+        elif len(parts) == 2 and parts[0] == "sessions" and method == "GET":
+            chat = self.resident.get(parts[1])
+            if chat is not None:
+                write_json(writer, 200, self.describe(chat))
+            else:
+                try:
+                    write_json(writer, 200, {**self.store.get(parts[1]).meta, "resident": False})
+                except KeyError:
+                    raise HTTPError(404, f"No session {parts[1]!r}") from None
+        elif len(parts) == 3 and parts[0] == "sessions" and parts[2] == "messages" and method == "POST":
+            await self.post_message(parts[1], body, writer)
+        elif parts and parts[0] in ("health", "metrics", "sessions"):
+            raise HTTPError(405, f"{method} not allowed on {path}")
+        else:
+            raise HTTPError(404, f"No route for {path}")
+
+    async def post_message(self, session_id: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = json.loads(body or b"{}")
+            content = request["content"].strip()
+        except (ValueError, KeyError, AttributeError):
+            raise HTTPError(400, 'Body must be JSON with a "content" string') from None
+        if not content:
+            raise HTTPError(400, "Empty message")
+        if self.pending >= P1_SERVER_MAX_PENDING:
+            METRICS.inc("p1_server_rejected_total")
+            raise HTTPError(503, "Too many turns in progress; retry shortly")
+        chat = await self.open(session_id)
+        if chat.busy:
+            self.release(chat)
+            raise HTTPError(409, "A turn is already in progress for this session")
+        chat.busy = True
+        self.pending += 1
+        try:
+            if not request.get("stream", True):
+                write_json(writer, 200, await self.turn(chat, content))
+                return
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+            )
+            try:
+                reply = await self.turn(chat, content, on_token=lambda text: write_event(writer, "token", {"text": text}))
+            except Exception as e:
+                write_event(writer, "error", {"error": f"{type(e).__name__}: {e}"})
+            else:
+                write_event(writer, "done", reply)
+        finally:
+            chat.busy = False
+            self.pending -= 1
+            self.release(chat)
+            self.recount(chat)
+            self.evict_idle()
+
+
+async def read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    """Parse the request line, headers and body of one HTTP/1.1 request."""
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    try:
+        method, path, _ = request_line.split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line") from None
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    return method.upper(), path, await reader.readexactly(length)
+
+
+def write_response(writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str) -> None:
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\nContent-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n"
+    )
+    if status == 503:
+        head += "Retry-After: 1\r\n"
+    writer.write(head.encode("latin-1") + b"\r\n" + body)
+
+
+def write_json(writer: asyncio.StreamWriter, status: int, payload) -> None:
+    write_response(writer, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json")
+
+
+def write_event(writer: asyncio.StreamWriter, event: str, payload: dict) -> None:
+    """Queue one server-sent event; a disconnected client just stops receiving them."""
+    if not writer.is_closing():
+        writer.write(f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+
+async def serve(host: str = P1_SERVER_HOST, port: int = P1_SERVER_PORT, memory_mb: float = P1_SERVER_MEMORY_MB) -> None:
+    """Load the providers, then serve until cancelled."""
+    provider, model = select_provider()
+    providers = available_providers(warn=False) if P1_ROUTER else [(provider, model)]
+    readies = {p: initialize(p, m, preload_encoding=p == provider) for p, m in providers}
+    await asyncio.gather(*(asyncio.wrap_future(ready) for ready in readies.values()))
+    router = build_router(providers, readies)
+    chat_server = ChatServer(router, model, SessionStore(), int(memory_mb * 1024 * 1024))
+    server = await asyncio.start_server(chat_server.handle, host, port)
+    print(f"Serving {', '.join(b.name for b in router.backends)} on http://{host}:{port} (memory cap {memory_mb:g} MB)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for chat in chat_server.resident.values():
+            if chat.compactor is not None:
+                await chat.compactor.drain()
+            chat.session.sync_summary(chat.conversation)
+        if chat_server.response_cache is not None:
+            chat_server.response_cache.close()
+        await aclose_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the chatbot over HTTP with SSE streaming.")
+    parser.add_argument("--host", default=P1_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=P1_SERVER_PORT)
+    parser.add_argument("--memory-mb", type=float, default=P1_SERVER_MEMORY_MB, help="Cap on resident session histories")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", message="Interactions usage is experimental and may change in future versions.")
+    try:
+        asyncio.run(serve(args.host, args.port, args.memory_mb))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Persistent chat sessions.
+
+Each session is an append-only JSONL log (`<id>.jsonl`) with one record per
+message: sequence number, role, content, its exact token count for the
+session's model (null if it was only estimated) and the cost of producing it. A small JSON index next to it (`<id>.json`,
+rewritten atomically after every turn) holds the session's title, totals,
+running summary and the sequence number of the oldest message still in the
+context window.
+
+Resuming never parses the whole log: the system prompt is the first line, and
+the in-context messages are read backwards from the end of the file, block by
+block, until the token budget is filled or the context start is reached. The
+stored exact token counts are handed to `Conversation` as they are and the
+others are only estimated again, so nothing is re-tokenized unless the
+session is resumed with a different model.
+"""
+
+import json
+import os
+import secrets
+import shutil
+import time
+from typing import Iterator
+
+from .config import P1_SESSION_DIR, TRUNCATE_THRESHOLD_TOKENS
+from .conversation import Conversation
+from .tokens import estimate_message_tokens
+
+
+TAIL_BLOCK_BYTES = 64 * 1024
+
+
+def _read_tail(path: str, stop_seq: int, budget: int, model: str) -> list[dict]:
+    """
+    Read message records backwards from the end of a log.
+
+    Args:
+        path: Session log
+        stop_seq: Oldest sequence number to include
+        budget: Stop before the records' token counts exceed this
+        model: Model to estimate records without a stored count for
+
+    Returns:
+        The records, oldest first
+    """
+    records: list[dict] = []
+    tokens = 0
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        partial = b""
+        while end > 0:
+            start = max(0, end - TAIL_BLOCK_BYTES)
+            f.seek(start)
+            lines = (f.read(end - start) + partial).split(b"\n")
+            # The first line of a block may continue in the previous one.
+            partial = lines.pop(0) if start > 0 else b""
+            end = start
+            for line in reversed(lines):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by an interrupted write
+                record_tokens = record["tokens"]
+                if record_tokens is None:
+                    record_tokens = estimate_message_tokens(record, model)[0]
+                if record["seq"] < stop_seq or tokens + record_tokens > budget:
+                    records.reverse()
+                    return records
+                records.append(record)
+                tokens += record_tokens
+    records.reverse()
+    return records
+
+
+class Session:
+    """
+    One saved conversation: its log and index files.
+
+    Attributes:
+        id: Session id (also the file stem)
+        meta: The index: title, model, created/updated, messages, usd,
+            context_from, summary, summary_tokens, parent
+    """
+
+    def __init__(self, directory: str, session_id: str, meta: dict):
+        self.directory = directory
+        self.id = session_id
+        self.meta = meta
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.directory, f"{self.id}.jsonl")
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.directory, f"{self.id}.json")
+
+    def save(self) -> None:
+        """Write the index now, so even a session with no turns yet can be opened again."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_meta()
+
+    def _write_meta(self) -> None:
+        tmp = f"{self.meta_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        os.replace(tmp, self.meta_path)
+
+    def _record(self, seq: int, conversation: Conversation, index: int, usd: float = 0.0) -> str:
+        message = conversation[index]
+        tokens = conversation.message_tokens(index) if conversation.is_exact(index) else None
+        return json.dumps(
+            {"seq": seq, "role": message["role"], "content": message["content"], "tokens": tokens, "usd": usd, "ts": time.time()},
+            ensure_ascii=False,
+        ) + "\n"
+
+    def record_turn(self, conversation: Conversation, evicted: int, usd: float) -> None:
+        """
+        Append the turn just completed (the last user and assistant messages).
+
+        The first call also writes the system prompt, which starts the log.
+
+        Args:
+            conversation: History ending with the new user/assistant pair
+            evicted: Messages truncation dropped from the context this turn
+            usd: Cost of the turn, stored on the assistant message
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        lines = []
+        seq = self.meta["messages"]
+        if seq == 0:
+            lines.append(self._record(0, conversation, 0))
+            self.meta["title"] = conversation[-2]["content"][:60]
+            self.meta["context_from"] = 1
+        lines.append(self._record(seq + 1, conversation, len(conversation) - 2))
+        lines.append(self._record(seq + 2, conversation, len(conversation) - 1, usd))
+        with open(self.log_path, "a+b") as f:
+            # Start on a fresh line if an interrupted write left the last one unterminated.
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    lines.insert(0, "\n")
+            f.write("".join(lines).encode("utf-8"))
+        self.meta["messages"] = seq + 2
+        self.meta["context_from"] += evicted
+        self.meta["usd"] += usd
+        self.meta["updated"] = time.time()
+        self.meta["model"] = conversation.model
+        self.sync_summary(conversation, write=False)
+        self._write_meta()
+
+    def sync_summary(self, conversation: Conversation, write: bool = True) -> None:
+        """Store the conversation's running summary in the index if it changed."""
+        if not conversation.has_summary or self.meta["messages"] == 0:
+            return
+        index = conversation.pinned - 1
+        content = conversation[index]["content"]
+        if content == self.meta.get("summary"):
+            return
+        self.meta["summary"] = content
+        self.meta["summary_tokens"] = conversation.message_tokens(index) if conversation.is_exact(index) else None
+        if write:
+            self._write_meta()
+
+    def records(self) -> Iterator[dict]:
+        """Every message record of the log, oldest first (reads the whole file)."""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by an interrupted write
+
+    def load(self, model: str, budget: int = TRUNCATE_THRESHOLD_TOKENS) -> Conversation:
+        """
+        Rebuild the in-context part of the conversation from the end of the log.
+
+        Args:
+            model: Model the history will be counted for; stored counts are
+                reused when it matches the session's model
+            budget: Max tokens of non-pinned history to load
+
+        Returns:
+            Conversation with the system prompt (and summary) pinned
+        """
+        same_model = model == self.meta["model"]
+        conversation = Conversation(model)
+        with open(self.log_path, "rb") as f:
+            system = json.loads(f.readline())
+        conversation.append(system["role"], system["content"], system["tokens"] if same_model else None)
+        conversation.pinned = 1
+        if self.meta.get("summary"):
+            conversation.set_summary("system", self.meta["summary"], self.meta["summary_tokens"] if same_model else None)
+        records = _read_tail(self.log_path, self.meta["context_from"], budget, model)
+        # Start on a user turn, as truncation does.
+        while records and records[0]["role"] != "user":
+            records.pop(0)
+        # Truncation in this run counts evictions from the first loaded message.
+        self.meta["context_from"] = records[0]["seq"] if records else self.meta["messages"] + 1
+        for record in records:
+            conversation.append(record["role"], record["content"], record["tokens"] if same_model else None)
+        return conversation
+
+
+class SessionStore:
+    """Directory of saved sessions."""
+
+    def __init__(self, directory: str = P1_SESSION_DIR):
+        self.directory = directory
+
+    def new(self, model: str) -> Session:
+        """A new, empty session; its files are created on the first completed turn."""
+        session_id = time.strftime("%Y%m%d-%H%M%S") + "-" + secrets.token_hex(2)
+        now = time.time()
+        meta = {
+            "id": session_id, "title": "", "model": model, "created": now, "updated": now,
+            "messages": 0, "usd": 0.0, "context_from": 1, "summary": None, "summary_tokens": 0, "parent": None,
+        }
+        return Session(self.directory, session_id, meta)
+
+    def list(self) -> list[dict]:
+        """Index entries of the saved sessions, most recently updated first."""
+        sessions = []
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                        sessions.append(json.load(f))
+        return sorted(sessions, key=lambda m: m["updated"], reverse=True)
+
+    def get(self, session_id: str) -> Session:
+        """
+        Open a saved session.
+
+        Args:
+            session_id: Session id, a unique prefix of one, or 'last'
+
+        Raises:
+            KeyError: If no (or more than one) session matches
+        """
+        sessions = self.list()
+        if session_id == "last":
+            matches = sessions[:1]
+        else:
+            matches = [m for m in sessions if m["id"] == session_id] or [m for m in sessions if m["id"].startswith(session_id)]
+        if len(matches) != 1:
+            raise KeyError(f"No unique session matches {session_id!r}" if matches else f"No session {session_id!r}")
+        return Session(self.directory, matches[0]["id"], matches[0])
+
+    def fork(self, session_id: str) -> Session:
+        """Copy a saved session into a new one that can diverge from it."""
+        source = self.get(session_id)
+        fork = self.new(source.meta["model"])
+        fork.meta.update(
+            {k: v for k, v in source.meta.items() if k not in ("id", "created", "updated")},
+            parent=source.id,
+        )
+        shutil.copyfile(source.log_path, fork.log_path)
+        fork._write_meta()
+        return fork
+
+    def report(self) -> str:
+        """Table of saved sessions for `--sessions`."""
+        lines = [f"{'id':22} {'updated':16} {'msgs':>5} {'usd':>9}  title"]
+        for meta in self.list():
+            updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(meta["updated"]))
+            title = meta["title"] + (f" (fork of {meta['parent']})" if meta.get("parent") else "")
+            lines.append(f"{meta['id']:22} {updated:16} {meta['messages']:5} {meta['usd']:9.6f}  {title}")
+        return "\n".join(lines)
@@ -0,0 +1,130 @@
+"""
+Single-flight coalescing of identical concurrent completions.
+
+When several callers (threads or asyncio tasks, on any loop) ask for the same
+completion while one is already in flight, only the first one (the leader)
+calls the provider; the others (followers) wait for its result. Requests are
+keyed like the response cache (`cache.make_cache_key`), so the same provider,
+model, sampling settings and normalized messages coalesce.
+
+Followers receive the leader's `ChatResult` with `coalesced=True`: the usage
+is the leader's, and callers skip cost accounting for coalesced results so
+the call is paid for once. If the leader is cancelled, a waiting follower
+takes over and makes the call itself.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import CancelledError, Future
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from .cache import make_cache_key
+from .config import P1_SINGLE_FLIGHT
+from .metrics import METRICS
+
+if TYPE_CHECKING:
+    from .llm_client import ChatResult
+
+
+class SingleFlight:
+    """
+    Registry of in-flight calls by request key.
+
+    Attributes:
+        calls: Calls that went through the registry
+        coalesced: Calls answered by another caller's request
+    """
+
+    def __init__(self, enabled: bool = P1_SINGLE_FLIGHT):
+        self.enabled = enabled
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ratio(self) -> float:
+        """Share of calls that were coalesced."""
+        return self.coalesced / self.calls if self.calls else 0.0
+
+    def _join(self, key: str) -> tuple[Future, bool]:
+        """Return the call's future and whether this caller leads it."""
+        with self._lock:
+            self.calls += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+            ratio = self.ratio
+        METRICS.inc("p1_singleflight_calls_total", role="leader" if leader else "follower")
+        METRICS.set("p1_singleflight_coalesce_ratio", ratio)
+        return future, leader
+
+    def _leave(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def do(self, key: str, call: Callable[[], "ChatResult"]) -> "ChatResult":
+        """Run `call`, or wait for the identical call already running on another thread."""
+        if not self.enabled:
+            return call()
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return future.result()._replace(coalesced=True)
+                except CancelledError:
+                    continue  # the leader gave up; take over
+            try:
+                result = call()
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                self._leave(key, future)
+
+    async def ado(self, key: str, call: Callable[[], Awaitable["ChatResult"]]) -> "ChatResult":
+        """Async `do`: await `call()`, or the identical call another task (or thread) is running."""
+        if not self.enabled:
+            return await call()
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    # Shielded: a follower being cancelled must not cancel the leader's call.
+                    result = await asyncio.shield(asyncio.wrap_future(future))
+                except asyncio.CancelledError:
+                    if future.cancelled():
+                        continue  # the leader was cancelled; take over
+                    raise
+                return result._replace(coalesced=True)
+            try:
+                result = await call()
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                self._leave(key, future)
+
+    def report(self) -> str:
+        return f"[single-flight] calls={self.calls} coalesced={self.coalesced} ratio={self.ratio:.0%}"
+
+
+SINGLE_FLIGHT = SingleFlight()
+
+
+def request_key(provider: str, model: str, temperature: float | None, max_tokens: int | None, messages: list[dict[str, str]]) -> str:
+    """Key identical completion requests share."""
+    return make_cache_key(provider, model, temperature, max_tokens, messages)
@@ -0,0 +1,119 @@
+"""
+Fast CLI startup.
+
+Importing the CLI pulls in no provider SDK and no tokenizer. The provider is
+picked from the configured API keys, the prompt is shown right away, and the
+SDK import, client construction and tiktoken encoding load run on background
+threads while the user types. The first turn only waits for whatever is still
+unfinished. `PROFILE` times each phase for `--profile-startup`.
+
+This module is imported first by the CLI so its clock starts before any other
+project import.
+"""
+
+import importlib
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Iterator
+
+
+SDK_MODULES = {"openai": "openai", "gemini": "google.genai"}
+
+
+class StartupProfile:
+    """
+    Wall-clock phases of CLI startup, on any thread.
+
+    Attributes:
+        started: perf_counter value when this module was imported
+        phases: (name, thread name, start offset s, duration s) in completion order
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: list[tuple[str, str, float, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, name: str, start: float, end: float) -> None:
+        with self._lock:
+            self.phases.append((name, threading.current_thread().name, start - self.started, end - start))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as a startup phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def mark(self, name: str) -> None:
+        """Record a point in time (zero-length phase) such as 'prompt shown'."""
+        now = time.perf_counter()
+        self.record(name, now, now)
+
+    def offset_ms(self, name: str) -> float | None:
+        """End of the named phase, in ms since startup began."""
+        for phase, _, start, duration in self.phases:
+            if phase == name:
+                return (start + duration) * 1000
+        return None
+
+    def report(self, budget_ms: float) -> str:
+        """Table of phases sorted by start time, plus the time-to-prompt verdict."""
+        lines = [f"{'phase':32} {'thread':20} {'start_ms':>9} {'ms':>9}"]
+        for name, thread, start, duration in sorted(self.phases, key=lambda p: p[2]):
+            lines.append(f"{name:32} {thread:20} {start * 1000:9.1f} {duration * 1000:9.1f}")
+        prompt_ms = self.offset_ms("prompt shown")
+        ready_ms = max(((start + duration) * 1000 for _, _, start, duration in self.phases), default=0.0)
+        if prompt_ms is not None:
+            verdict = "OK" if prompt_ms <= budget_ms else "OVER BUDGET"
+            lines.append(f"[startup] time_to_prompt_ms={prompt_ms:.1f} budget_ms={budget_ms:.0f} {verdict}")
+        lines.append(f"[startup] time_to_ready_ms={ready_ms:.1f}")
+        return "\n".join(lines)
+
+
+PROFILE = StartupProfile()
+
+
+def initialize(provider: str, model: str, profile: StartupProfile = PROFILE, *, preload_encoding: bool = True) -> Future:
+    """
+    Import the provider SDK, build its shared clients and load the tokenizer in the background.
+
+    Args:
+        provider: 'openai' or 'gemini' (from `llm_client.select_provider`)
+        model: Model name whose tiktoken encoding to preload
+        profile: Where to record the phases
+        preload_encoding: Also load the tokenizer (only needed for the model the history is counted with)
+
+    Returns:
+        Future resolving to the client the CLI passes to the provider calls
+    """
+    from .clients import get_async_openai_client, get_gemini_client
+    from .tokens import get_encoding
+
+    future: Future = Future()
+
+    def load_client() -> None:
+        try:
+            with profile.phase(f"import {SDK_MODULES[provider]}"):
+                importlib.import_module(SDK_MODULES[provider])
+            with profile.phase(f"create {provider} clients"):
+                client = get_async_openai_client() if provider == "openai" else get_gemini_client()
+            future.set_result(client)
+        except BaseException as e:
+            future.set_exception(e)
+
+    def load_encoding() -> None:
+        try:
+            with profile.phase("load tiktoken encoding"):
+                get_encoding(model)
+        except Exception:
+            pass  # counted again (and reported) on the first turn
+
+    threading.Thread(target=load_client, name=f"p1-startup-{provider}", daemon=True).start()
+    if preload_encoding:
+        threading.Thread(target=load_encoding, name="p1-startup-encoding", daemon=True).start()
+    return future
@@ -3,9 +3,65 @@ Token counting utilities for chatbot message history.
 
 This module provides token counting for both OpenAI and Gemini models.
 The counts are estimates and may differ slightly from the actual API token usage.
+
+tiktoken is imported, and its BPE file loaded, on first use; the CLI does that
+on a background thread at startup (see `startup`) instead of during the first
+turn.
+
+`estimate_message_tokens` is the cheap tier in front of tiktoken: a calibrated
+tokens-per-byte ratio per model family, with lower/upper bounds, computed from
+the UTF-8 length alone. `Conversation` uses it for every message and only
+tokenizes exactly when a budget decision falls between the bounds. Ratios come
+from `DEFAULT_CALIBRATION`, overridden per model by the file written by
+`python -m src.p1_chatbot.calibrate`. The calibrated bounds only apply to
+ASCII text; CJK text and emoji can reach one token per byte, so any other text
+gets the bounds that hold for all text (a token covers between one and
+`MAX_TOKEN_BYTES` bytes).
+
+`count_tokens_bulk` / `count_tokens_jsonl` count many conversations at once
+for offline pricing and filtering of prompt corpora: messages are encoded in
+chunks with tiktoken's multithreaded batch encoder and the counts (and
+optionally the projected cost) come back as NumPy arrays.
 """
 
-import tiktoken
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple
+
+from .config import P1_TOKEN_CALIBRATION_PATH
+from .models import get_model
+
+if TYPE_CHECKING:
+    import numpy as np
+    import tiktoken
+
+
+# Per-message formatting overhead and reply priming used by the estimates below.
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Tokens per UTF-8 byte of ASCII text (mean, low, high) per model family,
+# until calibrated. `low`/`high` are deliberately wide, meant to cover English
+# prose, code, JSON and hex digests; `calibrate` replaces them with the spread
+# measured on real traffic, widened by its `BOUND_MARGIN`.
+DEFAULT_CALIBRATION: dict[str, tuple[float, float, float]] = {
+    "o200k": (0.24, 0.08, 0.75),
+    "cl100k": (0.26, 0.08, 0.75),
+    "gemini": (0.25, 0.08, 0.75),
+}
+# Absolute slack on the calibrated bounds; ratios say little about a handful of bytes.
+SHORT_TEXT_SLACK = 4
+# Longer than any token in the o200k/cl100k vocabularies or Gemini's pieces;
+# every token covers at least one byte and at most this many.
+MAX_TOKEN_BYTES = 256
+# Conversations per batch-encoding call in the bulk API
+BULK_CHUNK_SIZE = 1024
+
+O200K_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4", "chatgpt-4o")
 
 
 def count_tokens(messages: list[dict[str, str]], model: str) -> int:
@@ -24,68 +80,308 @@ def count_tokens(messages: list[dict[str, str]], model: str) -> int:
     Returns:
         Estimated token count as an integer
     """
-    if "gemini" in model.lower():
-        return _count_tokens_gemini(messages, model)
-    else:
-        return _count_tokens_openai(messages, model)
+    num_tokens = 0
+    for message in messages:
+        num_tokens += count_message_tokens(message, model)
+    return num_tokens + TOKENS_PER_REPLY
 
 
-def _count_tokens_openai(messages: list[dict[str, str]], model: str) -> int:
+def count_message_tokens(message: dict[str, str], model: str) -> int:
     """
-    Count tokens for OpenAI models using tiktoken.
+    Estimate the tokens a single message contributes to a conversation.
+    
+    The reply priming added once per conversation by `count_tokens` is not
+    included, so summing this over a history and adding `TOKENS_PER_REPLY`
+    gives the same result as `count_tokens`.
     
     Args:
-        messages: List of message dicts with 'role' and 'content' keys
-        model: OpenAI model name
+        message: Message dict with 'role' and 'content' keys
+        model: Model name used to pick the encoding
     
     Returns:
-        Estimated token count
+        Estimated token count for the message, including per-message overhead
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
-    
-    num_tokens = 0
+    encoding = get_encoding(model)
+    role = message.get("role", "")
+    content = message.get("content", "")
+    return len(encoding.encode(f"{role}{content}")) + TOKENS_PER_MESSAGE
+
+
+def model_family(model: str) -> str:
+    """'gemini', 'o200k' or 'cl100k': the tokenizer family the estimate ratios are kept for."""
+    spec = get_model(model)
+    if spec is not None:
+        return spec.tokenizer
+    name = model.lower()
+    if "gemini" in name:
+        return "gemini"
+    return "o200k" if name.startswith(O200K_PREFIXES) else "cl100k"
+
+
+def has_exact_tokenizer(model: str) -> bool:
+    """
+    Whether tiktoken gives this model's real count.
+
+    Gemini is only approximated with cl100k, which is no more exact than the
+    calibrated estimate, so for Gemini the estimate is final.
+    """
+    return model_family(model) != "gemini"
+
+
+_calibration: dict[str, tuple[float, float, float]] | None = None
+
+
+def load_calibration(path: str = P1_TOKEN_CALIBRATION_PATH) -> dict[str, tuple[float, float, float]]:
+    """Default ratios per family, overridden by the per-model/per-family entries in `path`."""
+    calibration = dict(DEFAULT_CALIBRATION)
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for key, entry in json.load(f).items():
+                calibration[key] = (entry["mean"], entry["low"], entry["high"])
+    return calibration
+
+
+def calibration_for(model: str) -> tuple[float, float, float]:
+    """(mean, low, high) tokens per byte for `model`, falling back to its family."""
+    global _calibration
+    if _calibration is None:
+        _calibration = load_calibration()
+    return _calibration.get(model) or _calibration[model_family(model)]
+
+
+def estimate_tokens_from_bytes(
+    num_bytes: int, mean: float, low: float, high: float, ascii: bool = True
+) -> tuple[float, float, float]:
+    """
+    Token estimate and bounds for text of `num_bytes` UTF-8 bytes.
+
+    ASCII text gets the calibrated bounds (with `SHORT_TEXT_SLACK`, and never
+    wider than the universal ones); other text gets bounds that hold whatever
+    it is, since every token covers between one and `MAX_TOKEN_BYTES` bytes.
+    Linear in the byte length, so a whole batch of lengths can be estimated in
+    one array expression with the same ratios.
+
+    Returns:
+        (estimate, lower bound, upper bound), without per-message overhead
+    """
+    lower, upper = num_bytes / MAX_TOKEN_BYTES, float(num_bytes)
+    if ascii:
+        lower = max(lower, num_bytes * low - SHORT_TEXT_SLACK)
+        upper = min(upper, num_bytes * high + SHORT_TEXT_SLACK)
+    return num_bytes * mean, lower, upper
+
+
+def estimate_message_tokens(message: dict[str, str], model: str) -> tuple[int, int, int]:
+    """
+    Estimate a message's tokens from its byte length, without tokenizing.
+
+    Counted the same way as `count_message_tokens` (role + content, plus
+    per-message overhead).
+
+    Returns:
+        (estimate, lower bound, upper bound)
+    """
+    text = f"{message.get('role', '')}{message.get('content', '')}"
+    num_bytes = len(text.encode("utf-8"))
+    estimate, lower, upper = estimate_tokens_from_bytes(num_bytes, *calibration_for(model), text.isascii())
+    return (
+        round(estimate) + TOKENS_PER_MESSAGE,
+        math.floor(lower) + TOKENS_PER_MESSAGE,
+        math.ceil(upper) + TOKENS_PER_MESSAGE,
+    )
+
+
+def estimate_tokens(messages: list[dict[str, str]], model: str) -> int:
+    """
+    Cheap counterpart of `count_tokens` for pacing and request sizing.
+
+    History `Message`s contribute the count their conversation already holds
+    (exact once a budget decision needed it); other messages are estimated.
+    """
+    total = TOKENS_PER_REPLY
     for message in messages:
+        counts = getattr(message, "counts", None)
+        total += counts[0] if counts is not None else estimate_message_tokens(message, model)[0]
+    return total
 
-        role = message.get("role", "")
-        content = message.get("content", "")
-        message_text = f"{role}{content}"
-        num_tokens += len(encoding.encode(message_text))
-        
-       
-        num_tokens += 3 
-    
-    num_tokens += 3 
-    return num_tokens
+
+class BulkCounts(NamedTuple):
+    """Result of a bulk count: one row per conversation, in input order."""
+    tokens: "np.ndarray"
+    cost_usd: "np.ndarray | None"
+    seconds: float
+
+    @property
+    def tokens_per_sec(self) -> float:
+        return float(self.tokens.sum()) / self.seconds if self.seconds > 0 else 0.0
+
+    def report(self) -> str:
+        line = f"[tokens] conversations={len(self.tokens)} tokens={int(self.tokens.sum())} tokens_per_sec={self.tokens_per_sec:,.0f}"
+        if self.cost_usd is not None:
+            line += f" projected_usd={float(self.cost_usd.sum()):.6f}"
+        return line
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The bulk token API needs numpy. Install with: pip install numpy") from None
+    return numpy
+
+
+def projected_cost(tokens: "np.ndarray", model: str, output_tokens: int = 0) -> "np.ndarray":
+    """
+    USD per row for prompts of `tokens` input tokens plus `output_tokens` of output.
+
+    Same prices as `cost.estimate_cost` (no prompt-cache discount).
+
+    Raises:
+        ValueError: If the model is not in the model registry
+    """
+    from .cost import model_prices
+    input_per_1k, output_per_1k, _ = model_prices(model)
+    return tokens / 1000 * input_per_1k + output_tokens / 1000 * output_per_1k
+
+
+def count_tokens_bulk(
+    conversations: Iterable[list[dict[str, str]]],
+    model: str,
+    *,
+    with_cost: bool = False,
+    output_tokens: int = 0,
+    num_threads: int = 8,
+    chunk_size: int = BULK_CHUNK_SIZE,
+) -> BulkCounts:
+    """
+    `count_tokens` for many conversations, encoded in multithreaded batches.
+
+    The input is consumed lazily, `chunk_size` conversations at a time, so it
+    can be a generator over a file larger than memory. Counts match
+    `count_tokens` (text that looks like a special token is counted as plain
+    text instead of raising).
+
+    Args:
+        conversations: Message lists
+        model: Model name used to pick the encoding (and the price)
+        with_cost: Also return the projected cost per conversation
+        output_tokens: Output tokens per conversation assumed for the cost
+        num_threads: Threads tiktoken encodes each batch with
+        chunk_size: Conversations per batch
+
+    Returns:
+        BulkCounts(tokens, cost_usd, seconds)
+    """
+    np = _numpy()
+    encoding = get_encoding(model)
+    start = time.perf_counter()
+    chunks = []
+    iterator = iter(conversations)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        texts = [f"{m.get('role', '')}{m.get('content', '')}" for conversation in chunk for m in conversation]
+        sizes = np.fromiter((len(conversation) for conversation in chunk), dtype=np.int64, count=len(chunk))
+        lengths = np.fromiter(
+            (len(tokens) for tokens in encoding.encode_ordinary_batch(texts, num_threads=num_threads)),
+            dtype=np.int64,
+            count=len(texts),
+        )
+        owners = np.repeat(np.arange(len(chunk)), sizes)
+        counts = np.bincount(owners, weights=lengths, minlength=len(chunk)).astype(np.int64)
+        chunks.append(counts + sizes * TOKENS_PER_MESSAGE + TOKENS_PER_REPLY)
+    tokens = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+    seconds = time.perf_counter() - start
+    cost = projected_cost(tokens, model, output_tokens) if with_cost else None
+    return BulkCounts(tokens, cost, seconds)
+
+
+def iter_jsonl_conversations(path: str, field: str = "messages") -> Iterator[list[dict[str, str]]]:
+    """Stream message lists from a JSONL file: rows are message lists or objects with `field`."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                yield row if isinstance(row, list) else row[field]
+
+
+def count_tokens_jsonl(path: str, model: str, *, field: str = "messages", **kwargs) -> BulkCounts:
+    """`count_tokens_bulk` over a JSONL file, read in chunks; see `iter_jsonl_conversations`."""
+    return count_tokens_bulk(iter_jsonl_conversations(path, field), model, **kwargs)
+
+
+_encodings: dict[str, "tiktoken.Encoding"] = {}
+_encoding_lock = threading.Lock()
+
+
+def get_encoding(model: str) -> "tiktoken.Encoding":
+    """
+    Return the cached encoding for `model`, loading it on first use.
+
+    Loading is serialized, so a background preload and the first turn never
+    both read the BPE file; once loaded, lookups take no lock.
+    """
+    encoding = _encodings.get(model)
+    if encoding is None:
+        with _encoding_lock:
+            encoding = _encodings.get(model)
+            if encoding is None:
+                encoding = _encodings[model] = _load_encoding(model)
+    return encoding
 
 
-def _count_tokens_gemini(messages: list[dict[str, str]], model: str) -> int:
+def _load_encoding(model: str) -> "tiktoken.Encoding":
     """
-    Count tokens for Gemini models.
+    Resolve the tiktoken encoding used to estimate tokens for a model.
     
-    Since Gemini uses a different tokenizer, we approximate using tiktoken's
+    Gemini uses a different tokenizer, so we approximate it using tiktoken's
     cl100k_base encoding as a rough estimate. This is not perfect but provides
-    a reasonable approximation for context management.
+    a reasonable approximation for context management. Models in the registry
+    use their tokenizer family; other OpenAI models that tiktoken does not know
+    fall back to cl100k_base as well.
     
     Args:
-        messages: List of message dicts with 'role' and 'content' keys
-        model: Gemini model name
+        model: Model name
     
     Returns:
-        Estimated token count
+        The tiktoken encoding for the model
     """
-    encoding = tiktoken.get_encoding("cl100k_base")
-    
-    num_tokens = 0
-    for message in messages:
-        role = message.get("role", "")
-        content = message.get("content", "")
-        message_text = f"{role}{content}"
-        num_tokens += len(encoding.encode(message_text))
-        
-        num_tokens += 3
-    
-    num_tokens += 3
-    return num_tokens
+    import tiktoken
+    family = model_family(model)
+    if family == "gemini":
+        return tiktoken.get_encoding("cl100k_base")
+    if get_model(model) is not None:
+        return tiktoken.get_encoding(f"{family}_base")
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def main():
+    import argparse
+    from .cost import has_pricing
+    parser = argparse.ArgumentParser(description="Count (and price) the prompts in a JSONL file of conversations.")
+    parser.add_argument("path", help="JSONL file, one message list (or object with --field) per line")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--field", default="messages", help="Key holding the messages in object rows")
+    parser.add_argument("--output-tokens", type=int, default=0, help="Output tokens per row assumed for the cost")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--save", help="Write the per-row tokens (and cost_usd) arrays to this .npz file")
+    args = parser.parse_args()
+    result = count_tokens_jsonl(
+        args.path,
+        args.model,
+        field=args.field,
+        with_cost=has_pricing(args.model),
+        output_tokens=args.output_tokens,
+        num_threads=args.threads,
+    )
+    print(result.report())
+    if args.save:
+        arrays = {"tokens": result.tokens}
+        if result.cost_usd is not None:
+            arrays["cost_usd"] = result.cost_usd
+        _numpy().savez(args.save, **arrays)
+
+
+if __name__ == "__main__":
+    main()
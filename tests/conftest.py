@@ -0,0 +1,47 @@
+"""
+Shared test setup.
+
+The o200k/cl100k BPE files are downloaded on first use, so tests that count
+tokens would need network. Instead every test gets a small byte-level BPE
+(1024 tokens, trained on this repo's README and sources with tiktoken's
+educational trainer and the o200k split pattern) from
+`fixtures/tiny_bpe.tiktoken`. Counts differ from the real encodings, but the
+code under test only relies on what every byte-level BPE guarantees.
+"""
+
+import base64
+import os
+
+import pytest
+
+from src.p1_chatbot import tokens
+
+TINY_BPE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "tiny_bpe.tiktoken")
+
+O200K_PATTERN = "|".join([
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""\p{N}{1,3}""",
+    r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+    r"""\s*[\r\n]+""",
+    r"""\s+(?!\S)""",
+    r"""\s+""",
+])
+
+_tiny_encoding = None
+
+
+def tiny_encoding():
+    global _tiny_encoding
+    if _tiny_encoding is None:
+        import tiktoken
+        with open(TINY_BPE_PATH, encoding="ascii") as f:
+            ranks = {base64.b64decode(token): int(rank) for token, rank in (line.split() for line in f if line.strip())}
+        _tiny_encoding = tiktoken.Encoding("tiny_bpe", pat_str=O200K_PATTERN, mergeable_ranks=ranks, special_tokens={})
+    return _tiny_encoding
+
+
+@pytest.fixture(autouse=True)
+def offline_tokenizer(monkeypatch):
+    monkeypatch.setattr(tokens, "_encodings", {})
+    monkeypatch.setattr(tokens, "_load_encoding", lambda model: tiny_encoding())
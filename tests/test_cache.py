@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.p1_chatbot import cache
+from src.p1_chatbot.cache import ResponseCache
+
+MODEL = "gpt-4o-mini"
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=clock.time))
+    return clock
+
+
+def _messages(question: str) -> list[dict[str, str]]:
+    return [{"role": "user", "content": question}]
+
+
+def _store(c: ResponseCache, question: str) -> None:
+    c.store("openai", MODEL, _messages(question), (f"answer to {question}", 10, 5), temperature=0.0, max_tokens=100)
+
+
+def _lookup(c: ResponseCache, question: str):
+    return c.lookup("openai", MODEL, _messages(question), temperature=0.0, max_tokens=100)
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    c = ResponseCache(str(tmp_path / "cache.db"), ttl_seconds=60)
+    _store(c, "q")
+    clock.now += 59
+    assert _lookup(c, "q") == ("answer to q", 10, 5)
+    clock.now += 2
+    assert _lookup(c, "q") is None
+    assert (c.hits, c.misses) == (1, 1)
+
+
+def test_a_disk_hit_keeps_its_original_ttl(tmp_path, clock):
+    # One memory slot: "q" is pushed out to disk only, then read back into memory.
+    c = ResponseCache(str(tmp_path / "cache.db"), ttl_seconds=60, memory_entries=1)
+    _store(c, "q")
+    _store(c, "other")
+    clock.now += 50
+    assert _lookup(c, "q") is not None
+    clock.now += 11
+    assert _lookup(c, "q") is None
+
+
+def test_memory_tier_is_lru(tmp_path, clock):
+    c = ResponseCache(str(tmp_path / "cache.db"), memory_entries=2)
+    for question in ("a", "b"):
+        _store(c, question)
+    _lookup(c, "a")
+    _store(c, "c")
+    assert list(c._memory) == [cache.make_cache_key("openai", MODEL, 0.0, 100, _messages(q)) for q in ("a", "c")]
+
+
+def test_disk_tier_evicts_the_least_recently_accessed(tmp_path, clock):
+    c = ResponseCache(str(tmp_path / "cache.db"), memory_entries=1, max_entries=2)
+    _store(c, "a")
+    clock.now += 1
+    _store(c, "b")
+    clock.now += 1
+    _store(c, "c")
+    # "a" was accessed longest ago and is gone from both tiers.
+    assert _lookup(c, "a") is None
+    assert _lookup(c, "b") is not None
+    assert _lookup(c, "c") is not None
+
+
+def test_hot_temperatures_and_failed_results_are_not_cached(tmp_path, clock):
+    c = ResponseCache(str(tmp_path / "cache.db"), max_temperature=0.2)
+    c.store("openai", MODEL, _messages("q"), ("answer", 10, 5), temperature=0.9, max_tokens=100)
+    c.store("openai", MODEL, _messages("q"), ("", None, None), temperature=0.0, max_tokens=100)
+    assert _lookup(c, "q") is None
+    assert c.lookup("openai", MODEL, _messages("q"), temperature=0.9, max_tokens=100) is None
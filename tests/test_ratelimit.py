@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.p1_chatbot import ratelimit
+from src.p1_chatbot.ratelimit import RateLimiter, TokenBucket
+
+
+def _bucket(per_minute: float, level: float) -> TokenBucket:
+    bucket = TokenBucket(per_minute)
+    bucket.level, bucket.updated = level, 0.0
+    return bucket
+
+
+def test_bucket_refills_at_its_per_minute_rate_up_to_capacity():
+    bucket = _bucket(60, 0.0)
+    bucket.refill(30.0)
+    assert bucket.level == pytest.approx(30.0)
+    bucket.refill(1000.0)
+    assert bucket.level == 60
+
+
+def test_reserving_past_the_quota_waits_for_the_debt_to_refill():
+    bucket = _bucket(60, 60.0)
+    assert bucket.reserve(60, 0.0) == 0.0
+    assert bucket.reserve(30, 0.0) == pytest.approx(30.0)
+    # 30 s later the debt is paid off; the next token costs one more second.
+    assert bucket.reserve(1, 30.0) == pytest.approx(1.0)
+
+
+def test_a_request_larger_than_the_quota_only_waits_for_a_full_bucket():
+    bucket = _bucket(60, 60.0)
+    assert bucket.reserve(1000, 0.0) == 0.0
+    assert bucket.level == 0.0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=lambda: clock.now, time=lambda: clock.now))
+    return clock
+
+
+def test_limiter_spaces_requests_by_rpm(clock):
+    limiter = RateLimiter(rpm=2, tpm=0)
+    assert limiter.reserve(0) == 0.0
+    assert limiter.reserve(0) == 0.0
+    assert limiter.reserve(0) == pytest.approx(30.0)
+    assert limiter.waits == 1
+    clock.now += 60
+    assert limiter.reserve(0) == 0.0
+
+
+def test_settle_returns_unused_tokens(clock):
+    limiter = RateLimiter(rpm=0, tpm=1000)
+    assert limiter.reserve(1000) == 0.0
+    assert limiter.reserve(100) == pytest.approx(6.0)
+    limiter.settle(1000, 400)
+    assert limiter.tokens.level == pytest.approx(500.0)
+
+
+def test_pause_holds_every_reservation(clock):
+    limiter = RateLimiter(rpm=100, tpm=0)
+    limiter.pause(5.0)
+    assert limiter.reserve(0) == pytest.approx(5.0)
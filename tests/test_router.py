@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+
+from src.p1_chatbot.llm_client import ChatResult
+from src.p1_chatbot.router import AllBackendsFailed, Backend, Router
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class FakeBackend(Backend):
+    """Answers after `delay` seconds with `text` (streamed word by word), or raises `error`."""
+
+    def __init__(self, model: str, *, delay: float = 0.0, text: str = "a reply", error: Exception | None = None):
+        super().__init__("openai", model, 100)
+        self.delay = delay
+        self.text = text
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    async def call(self, messages, on_token, temperature):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        if not self.text:
+            return ChatResult("", None, None)
+        if on_token is not None:
+            for word in self.text.split():
+                on_token(word)
+        return ChatResult(self.text, 10, 5)
+
+
+def _router(*backends: FakeBackend, **kwargs) -> Router:
+    options = dict(hedge_min_s=0.01, hedge_default_s=0.05, failover_errors=3, cooldown_s=30.0)
+    return Router(list(backends), **{**options, **kwargs})
+
+
+def _complete(router: Router, **kwargs):
+    return asyncio.run(router.complete(MESSAGES, temperature=0.0, **kwargs))
+
+
+def test_a_fast_primary_is_not_hedged():
+    primary, fallback = FakeBackend("primary"), FakeBackend("fallback")
+    route = _complete(_router(primary, fallback))
+    assert route.backend is primary
+    assert not route.hedged and not route.failed_over
+    assert fallback.calls == 0
+
+
+def test_a_slow_primary_is_hedged_and_the_loser_cancelled():
+    primary = FakeBackend("primary", delay=5.0, text="slow reply")
+    fallback = FakeBackend("fallback", text="fast reply")
+    router = _router(primary, fallback)
+    start = time.perf_counter()
+    route = _complete(router)
+    assert time.perf_counter() - start < 1.0
+    assert route.backend is fallback and route.result.text == "fast reply"
+    assert route.hedged and router.hedges == 1
+    assert primary.cancelled
+
+
+def test_only_the_winning_stream_reaches_on_token():
+    primary = FakeBackend("primary", delay=5.0, text="slow reply")
+    fallback = FakeBackend("fallback", text="fast reply")
+    tokens = []
+    route = _complete(_router(primary, fallback), on_token=tokens.append)
+    assert route.backend is fallback
+    assert tokens == ["fast", "reply"]
+
+
+@pytest.mark.parametrize("failure", [
+    dict(error=RuntimeError("upstream 500")),
+    dict(text=""),  # the async layer's empty, usage-less result
+])
+def test_a_failed_backend_fails_over(failure):
+    primary, fallback = FakeBackend("primary", **failure), FakeBackend("fallback")
+    router = _router(primary, fallback, hedge=False)
+    route = _complete(router)
+    assert route.backend is fallback
+    assert route.failed_over and router.failovers == 1
+    assert primary.errors == 1 and fallback.wins == 1
+
+
+def test_all_backends_failing_raises_every_failure():
+    primary = FakeBackend("primary", error=RuntimeError("upstream 500"))
+    fallback = FakeBackend("fallback", text="")
+    with pytest.raises(AllBackendsFailed) as caught:
+        _complete(_router(primary, fallback, hedge=False))
+    assert caught.value.failures[0][0] == "openai:primary"
+    assert isinstance(caught.value.failures[0][1], RuntimeError)
+    assert caught.value.failures[1] == ("openai:fallback", None)
+
+
+def test_a_failing_backend_drops_in_the_ranking():
+    primary = FakeBackend("primary", error=RuntimeError("upstream 500"))
+    fallback = FakeBackend("fallback")
+    router = _router(primary, fallback, hedge=False)
+    _complete(router)
+    assert router.primary is fallback
+    _complete(router)
+    assert primary.calls == 1
+
+
+def test_repeated_failures_put_a_backend_on_cooldown():
+    backend = FakeBackend("only", error=RuntimeError("upstream 500"))
+    router = _router(backend, hedge=False, failover_errors=2)
+    for _ in range(2):
+        with pytest.raises(AllBackendsFailed):
+            _complete(router)
+    assert backend.down_until > time.monotonic()
+    assert not backend.available(time.monotonic())
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import pytest
+
+from src.p1_chatbot import server as server_module
+from src.p1_chatbot.llm_client import ChatResult
+from src.p1_chatbot.router import Backend, Router
+from src.p1_chatbot.server import ChatServer
+from src.p1_chatbot.sessions import SessionStore
+
+MODEL = "gpt-4o-mini"
+
+
+class SlowBackend(Backend):
+    def __init__(self, delay: float = 0.01):
+        super().__init__("openai", MODEL, 100)
+        self.delay = delay
+
+    async def call(self, messages, on_token, temperature):
+        await asyncio.sleep(self.delay)
+        return ChatResult(f"reply to {messages[-1]['content']}", 10, 5)
+
+
+class Writer:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data: bytes) -> None:
+        self.data += data
+
+    def is_closing(self) -> bool:
+        return False
+
+    @property
+    def status(self) -> int:
+        return int(self.data.split(b" ", 2)[1])
+
+
+@pytest.fixture
+def make_server(tmp_path, monkeypatch):
+    monkeypatch.setattr(server_module, "P1_CACHE", False)
+    monkeypatch.setattr(server_module, "P1_SUMMARY", False)
+
+    def make(memory_bytes: int = 1) -> ChatServer:
+        router = Router([SlowBackend()], hedge=False)
+        return ChatServer(router, MODEL, SessionStore(str(tmp_path)), memory_bytes)
+
+    return make
+
+
+async def _post(server: ChatServer, session_id: str, content: str) -> Writer:
+    writer = Writer()
+    body = json.dumps({"content": content, "stream": False}).encode("utf-8")
+    await server.post_message(session_id, body, writer)
+    return writer
+
+
+def test_concurrent_turns_survive_evictions(make_server):
+    # A cap below one session's size: every idle session is evicted as soon as possible.
+    server = make_server(memory_bytes=1)
+
+    async def main():
+        ids = [(await server.create()).session.id for _ in range(8)]
+        server.evict_idle()
+        statuses = []
+        for round_ in range(3):
+            writers = await asyncio.gather(*(_post(server, i, f"round {round_}") for i in ids))
+            statuses += [w.status for w in writers]
+        return ids, statuses
+
+    ids, statuses = asyncio.run(main())
+    assert statuses == [200] * 24
+    assert server.evictions > 0
+    assert server.resident_bytes == sum(chat.counted_bytes for chat in server.resident.values())
+    for session_id in ids:
+        records = server.store.get(session_id).records()
+        assert [r["content"] for r in records if r["role"] == "user"] == ["round 0", "round 1", "round 2"]
+
+
+def test_a_session_loaded_for_a_request_is_not_evicted_before_it_resumes(make_server):
+    server = make_server(memory_bytes=1)
+
+    async def main():
+        evicted = (await server.create()).session.id
+        other = await server.create()
+        server.evict_idle()
+        assert evicted not in server.resident
+        # Mid-turn, so the reloaded session is the only one eviction could pick.
+        other.busy = True
+        waiters = [asyncio.create_task(server.open(evicted)) for _ in range(2)]
+        # The load finishes and makes the session resident before the waiters
+        # run again; another request's eviction pass slips in between.
+        while evicted not in server.resident:
+            await asyncio.sleep(0)
+        server.evict_idle()
+        chats = await asyncio.gather(*waiters)
+        assert chats[0] is chats[1] is server.resident[evicted]
+        assert chats[0].pins == 2
+        for chat in chats:
+            server.release(chat)
+        server.evict_idle()
+        assert evicted not in server.resident
+
+    asyncio.run(main())
+
+
+def test_a_busy_session_is_not_evicted(make_server):
+    server = make_server(memory_bytes=1)
+
+    async def main():
+        busy = (await server.create()).session.id
+        turn = asyncio.create_task(_post(server, busy, "slow question"))
+        await asyncio.sleep(0)
+        for _ in range(3):
+            await server.create()
+            server.evict_idle()
+            assert busy in server.resident
+        assert (await turn).status == 200
+
+    asyncio.run(main())
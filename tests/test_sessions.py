@@ -0,0 +1,28 @@
+from src.p1_chatbot.conversation import Conversation
+from src.p1_chatbot.sessions import SessionStore
+
+MODEL = "gpt-4o-mini"
+
+
+def _turn(conversation: Conversation, session, user: str, assistant: str) -> None:
+    conversation.append("user", user)
+    conversation.append("assistant", assistant)
+    session.record_turn(conversation, 0, 0.0)
+
+
+def test_resume_skips_a_truncated_last_line(tmp_path):
+    store = SessionStore(str(tmp_path))
+    session = store.new(MODEL)
+    conversation = Conversation(MODEL, [{"role": "system", "content": "You are helpful."}])
+    _turn(conversation, session, "first question", "first answer")
+    # A crash in the middle of the next append leaves half a record behind.
+    with open(session.log_path, "a", encoding="utf-8") as f:
+        f.write('{"seq": 3, "role": "user", "content": "cut o')
+
+    resumed = store.get(session.id).load(MODEL)
+    assert [m["content"] for m in resumed] == ["You are helpful.", "first question", "first answer"]
+
+    _turn(resumed, session, "second question", "second answer")
+    resumed = store.get(session.id).load(MODEL)
+    assert [m["content"] for m in resumed][1:] == ["first question", "first answer", "second question", "second answer"]
+    assert [r["seq"] for r in session.records()] == [0, 1, 2, 3, 4]
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from src.p1_chatbot.llm_client import ChatResult
+from src.p1_chatbot.singleflight import SingleFlight
+
+
+class Upstream:
+    def __init__(self, delay: float = 0.05, error: Exception | None = None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self) -> ChatResult:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return ChatResult("answer", 10, 5)
+
+
+def test_identical_concurrent_calls_share_one_request():
+    flight, upstream = SingleFlight(enabled=True), Upstream()
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("key", upstream) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert upstream.calls == 1
+    assert [r.text for r in results] == ["answer"] * 5
+    assert sorted(r.coalesced for r in results) == [False] + [True] * 4
+    assert (flight.calls, flight.coalesced) == (5, 4)
+
+
+def test_different_keys_are_not_coalesced():
+    flight, upstream = SingleFlight(enabled=True), Upstream()
+
+    async def main():
+        return await asyncio.gather(flight.ado("a", upstream), flight.ado("b", upstream))
+
+    asyncio.run(main())
+    assert upstream.calls == 2 and flight.coalesced == 0
+
+
+def test_the_leaders_error_reaches_every_follower():
+    flight, upstream = SingleFlight(enabled=True), Upstream(error=RuntimeError("upstream 500"))
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("key", upstream) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert upstream.calls == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_a_follower_takes_over_when_the_leader_is_cancelled():
+    flight, upstream = SingleFlight(enabled=True), Upstream()
+
+    async def main():
+        leader = asyncio.create_task(flight.ado("key", upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.ado("key", upstream))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    result = asyncio.run(main())
+    assert result.text == "answer" and not result.coalesced
+    assert upstream.calls == 2
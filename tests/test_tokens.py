@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from src.p1_chatbot import tokens
+from src.p1_chatbot.calibrate import corpus_samples, fit
+from src.p1_chatbot.conversation import Conversation
+from src.p1_chatbot.tokens import (
+    DEFAULT_CALIBRATION,
+    TOKENS_PER_MESSAGE,
+    count_message_tokens,
+    estimate_message_tokens,
+)
+
+ADVERSARIAL = [
+    "The quick brown fox jumps over the lazy dog. " * 40,
+    "日本語のテキストは一文字ごとに複数のトークンになることがある。" * 20,
+    "🙂🚀🧪🦀👩‍💻" * 50,
+    "".join(chr(c) for c in range(0x100, 0x500)),
+    "\x00\x01\x02\x7f\x1b[31m" * 60,
+    " " * 4000,
+    "\n\n\t\t" * 500,
+    "=" * 3000,
+    "-" * 80 + "\n" + "|" + " " * 78 + "|\n" * 20,
+    "4f3a9c0de1b27765" * 100,
+]
+NON_ASCII = [content for content in ADVERSARIAL if not content.isascii()]
+
+# Calibration traffic; TYPICAL below is held out from it.
+CORPUS = [
+    "Can you help me plan a three day trip to Lisbon? I like museums, food markets and walking tours, "
+    "and I would rather avoid long bus rides.",
+    "My landlord says the deposit will be returned within thirty days, but it has been six weeks. "
+    "What should I write in a polite reminder email?",
+    "Rewrite this paragraph so it sounds less formal: We regret to inform you that the requested "
+    "feature will not be available in the upcoming release.",
+    "Explain the difference between a process and a thread to someone who has just started learning "
+    "programming, with one short example for each.",
+    "The meeting moved to Thursday at 3pm. Please bring the quarterly numbers and the draft of the "
+    "hiring plan so we can review both.",
+    "import json\n\nwith open('data.json') as f:\n    rows = json.load(f)\nfor row in rows:\n    print(row['name'], row['score'])\n",
+    "async def fetch(session, url):\n    async with session.get(url) as response:\n"
+    "        response.raise_for_status()\n        return await response.json()\n",
+    "class Stack:\n    def __init__(self):\n        self.items = []\n\n    def push(self, item):\n        self.items.append(item)\n",
+    '{"user": "alice", "orders": [{"id": 17, "total": 42.5}, {"id": 18, "total": 9.99}], "active": true}',
+    '{"model": "gpt-4o-mini", "temperature": 0.2, "max_tokens": 500, "messages": [{"role": "user", "content": "hi"}]}',
+]
+
+TYPICAL = [
+    "The quick brown fox jumps over the lazy dog. " * 40,
+    "def fits(self, limit: int) -> bool:\n    lower, upper = self.token_bounds()\n    return upper <= limit\n" * 20,
+    '{"id": 1234, "role": "user", "content": "What is the capital of France?", "tags": ["geo", "quiz"]}\n' * 20,
+    "Please summarize the attached meeting notes and list every action item with its owner. " * 10,
+    "日本語のテキストは一文字ごとに複数のトークンになることがある。" * 20,
+    "🙂🚀🧪🦀👩‍💻" * 50,
+]
+
+
+@pytest.fixture
+def default_calibration(monkeypatch):
+    monkeypatch.setattr(tokens, "_calibration", dict(DEFAULT_CALIBRATION))
+
+
+@pytest.fixture
+def calibrated(tmp_path, monkeypatch):
+    """Bounds fitted by `calibrate` on CORPUS, counted with the test tokenizer (see conftest)."""
+    path = tmp_path / "corpus.jsonl"
+    path.write_text("".join(json.dumps({"text": text}) + "\n" for text in CORPUS), encoding="utf-8")
+    calibration = dict(DEFAULT_CALIBRATION)
+    for model in ("gpt-4o-mini", "gpt-4-turbo"):
+        entry = fit(corpus_samples(str(path), model)[model])
+        calibration[model] = (entry["mean"], entry["low"], entry["high"])
+    monkeypatch.setattr(tokens, "_calibration", calibration)
+
+
+@pytest.mark.parametrize("content", NON_ASCII, ids=range(len(NON_ASCII)))
+def test_non_ascii_text_gets_bounds_that_hold_for_any_text(content):
+    message = {"role": "user", "content": content}
+    num_bytes = len(f"user{content}".encode("utf-8"))
+    estimate, lower, upper = estimate_message_tokens(message, "gpt-4o-mini")
+    assert lower <= estimate <= upper
+    # One token per byte is the most a byte-level tokenizer can produce.
+    assert upper >= num_bytes + TOKENS_PER_MESSAGE
+
+
+@pytest.mark.parametrize("model", ["gpt-4o-mini", "gpt-4-turbo"])
+@pytest.mark.parametrize("content", TYPICAL, ids=range(len(TYPICAL)))
+def test_calibrated_bounds_contain_the_exact_count(model, content, calibrated):
+    exact = count_message_tokens({"role": "user", "content": content}, model)
+    _, lower, upper = estimate_message_tokens({"role": "user", "content": content}, model)
+    assert lower <= exact <= upper
+
+
+def test_fits_never_accepts_an_overflowing_history(default_calibration):
+    conversation = Conversation("gpt-4o-mini", [{"role": "user", "content": "日本語" * 500}])
+    # 4500 bytes of CJK text could be up to 4500 tokens: the bounds cannot settle a
+    # 2000 token limit, so `fits` has to count (or, without tiktoken, keep the estimate).
+    lower, upper = conversation.token_bounds()
+    assert lower <= 2000 < upper
+
+
+def test_fits_skips_tokenizing_when_the_bounds_settle_it(monkeypatch, default_calibration):
+    def no_tokenizer(model):
+        raise AssertionError("fits() tokenized although the bounds settled it")
+
+    monkeypatch.setattr(tokens, "_encodings", {})
+    monkeypatch.setattr(tokens, "_load_encoding", no_tokenizer)
+    sentence = "Could you explain how the context window budget is computed for this model? "
+    conversation = Conversation(
+        "gpt-4o-mini",
+        [{"role": "user" if i % 2 == 0 else "assistant", "content": sentence * 4} for i in range(20)],
+    )
+    # About 6 KB of prose: past the point where one-token-per-byte bounds stop settling a 5000 token limit.
+    assert sum(len(m["content"]) for m in conversation.messages) > 6000
+    assert conversation.fits(5000)
+    assert not conversation.fits(400)
+    assert conversation.exact_counts == 0